@@ -0,0 +1,81 @@
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+
+
+# Render many figures in parallel with a non-interactive backend.
+#
+# A figure spec is a dict:
+#   {'function' : name of a plotter.py function or any picklable callable,
+#    'args'     : list of positional arguments,
+#    'kwargs'   : dict of keyword arguments}
+# make_spec() builds one.  Each spec is rendered in a worker process
+# inside its own rcParams context and every figure it opened is closed
+# afterwards, so long batches neither leak figures nor leak the
+# figure sizes plotter.py sets globally.
+#
+# Example, one weekly rolling average plot per region and year:
+#   specs = [make_spec('plot_demand', [data[r][y]], [r], 'Date', 'MW',
+#               r, '{}_{}'.format(r, y), n_pixels=2000)
+#            for r in regions for y in years]
+#   render_figures(specs)
+
+
+
+def make_spec(function, *args, **kwargs):
+    return {'function' : function, 'args' : list(args), 'kwargs' : kwargs}
+
+
+# Run in each worker before any spec, switch to a headless backend
+def _init_worker(backend):
+    matplotlib.use(backend, force=True)
+    import matplotlib.pyplot as plt
+    plt.switch_backend(backend)
+
+
+# Render a single spec, returning None on success or the traceback string.
+# Only the figures the spec opened are closed.
+def _render_spec(spec):
+    import matplotlib.pyplot as plt
+    import plotter
+
+    before = set(plt.get_fignums())
+    try:
+        function = spec['function']
+        if not callable(function):
+            function = getattr(plotter, function)
+        with matplotlib.rc_context():
+            function(*spec.get('args', []), **spec.get('kwargs', {}))
+        return None
+    except Exception:
+        return traceback.format_exc()
+    finally:
+        for num in set(plt.get_fignums()) - before:
+            plt.close(num)
+
+
+# Render all figure specs using a pool of n_workers processes.
+# n_workers = None uses all cores, n_workers = 1 renders serially
+# in a single worker, so this process's backend and open figures
+# are never touched.
+# Returns a list with one entry per spec: None if it rendered, else
+# the traceback of the failure.  Failures are also printed.
+def render_figures(specs, n_workers=None, backend='Agg', chunksize=1):
+    if n_workers == None:
+        n_workers = os.cpu_count() or 1
+    if len(specs) == 0:
+        return []
+
+    # plotter.py saves everything to plots/
+    os.makedirs('plots', exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=min(n_workers, len(specs)),
+            initializer=_init_worker, initargs=(backend,)) as pool:
+        results = list(pool.map(_render_spec, specs, chunksize=chunksize))
+
+    for i, result in enumerate(results):
+        if result != None:
+            print("render_figures: failed to render spec {} ({})\n{}".format(
+                i, specs[i]['function'], result))
+    return results
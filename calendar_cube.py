@@ -0,0 +1,208 @@
+import numpy as np
+from collections import OrderedDict
+import hourly_store
+
+
+# A calendar index (year, month, season, ISO week, hour of day)
+# computed once per hourly series, and a grouped aggregation
+# "cube" on top of it returning count, sum, mean and quantiles
+# for any combination of calendar keys in one pass.
+#
+# Example, monthly means and medians for each year:
+#   cube = aggregate(stamps, values, ('year', 'month'), quantiles=[0.5])
+#   cube.to_dict('mean')[(2016, 7)]
+
+
+
+SEASONS = ['Winter', 'Spring', 'Summer', 'Fall'] # season index 0 - 3
+MONTHS = ['January', 'February', 'March',
+        'April', 'May', 'June', 'July',
+        'August', 'September',
+        'October', 'November', 'December']
+
+
+
+class CalendarIndex :
+    """ Calendar fields for an array of hour stamps (hours since
+    1970-01-01T00Z, see hourly_store).  All fields are integer arrays:
+    year, month (1 - 12), day (1 - 31), season (0 - 3, see SEASONS),
+    week (ISO week 1 - 53), iso_year and hour (0 - 23). """
+
+    KEYS = ['year', 'month', 'day', 'season', 'week', 'iso_year', 'hour']
+
+    def __init__(self, stamps):
+
+        stamps = np.asarray(stamps, dtype=np.int64)
+        self.stamps = stamps
+        hours = stamps.astype('datetime64[h]')
+        days = hours.astype('datetime64[D]')
+        months = days.astype('datetime64[M]')
+        years = months.astype('datetime64[Y]')
+
+        self.year = years.astype(np.int64) + 1970
+        self.month = months.astype(np.int64) % 12 + 1
+        self.day = (days - months).astype(np.int64) + 1
+        self.season = (self.month - 1) // 3
+        self.hour = stamps % 24
+
+        # ISO week: the week containing the Thursday belongs to
+        # the Thursday's year.  1970-01-01 was a Thursday.
+        day_num = days.astype(np.int64)
+        weekday = (day_num + 3) % 7 # Monday = 0
+        thursday = day_num - weekday + 3
+        self.iso_year = thursday.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+        jan_1 = (self.iso_year - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+        self.week = (thursday - jan_1) // 7 + 1
+
+
+    def __len__(self):
+        return len(self.stamps)
+
+
+    def __getitem__(self, key):
+        assert(key in self.KEYS), "Unknown calendar key {}, choose from {}".format(key, self.KEYS)
+        return getattr(self, key)
+
+
+
+# Calendar for a HourlyStore, computed once and reused until
+# the store's stamps change
+def calendar_for_store(store):
+    cached = getattr(store, '_calendar', None)
+    if cached != None and cached[0] == store.version:
+        return cached[1]
+    calendar = CalendarIndex(store['stamp'].copy())
+    store._calendar = (store.version, calendar)
+    return calendar
+
+
+
+# Stamps and values for a sequence of hours.  HourlyRecords views
+# use the store columns directly (and the store's cached calendar),
+# anything else with .stamp and .value attributes is converted.
+def series_arrays(hourly_data):
+    if isinstance(hourly_data, hourly_store.HourlyRecords):
+        start, stop = hourly_data.start, hourly_data.start + len(hourly_data)
+        calendar = calendar_for_store(hourly_data.store)
+        if start != 0 or stop != len(hourly_data.store):
+            calendar = CalendarIndex(calendar.stamps[start:stop])
+        return calendar, hourly_data.store['value'][start:stop]
+    stamps = np.array([hour.stamp for hour in hourly_data], dtype=np.int64)
+    values = np.array([hour.value for hour in hourly_data], dtype=np.float64)
+    return CalendarIndex(stamps), values
+
+
+
+class AggregationCube :
+    """ Result of aggregate().  One entry per group in every array:
+    groups[key]  : key values of each group, in sorted order
+    n_hours      : hours in the group, including NaN values
+    count        : non-NaN values used
+    sum, mean    : of the values used
+    quantiles[q] : linear interpolation like np.percentile(x, 100*q) """
+
+    def __init__(self, keys, groups, codes, inverse):
+        self.keys = keys
+        self.groups = groups
+        self._codes = codes
+        self._inverse = inverse
+        self.n_hours = None
+        self.count = None
+        self.sum = None
+        self.mean = None
+        self.quantiles = OrderedDict()
+
+
+    def __len__(self):
+        return len(self._codes)
+
+
+    # OrderedDict group -> stat, the group is the key value for a
+    # single key, else a tuple of key values.  stat is 'n_hours',
+    # 'count', 'sum', 'mean' or a quantile value like 0.5
+    def to_dict(self, stat='mean'):
+        vals = self.quantiles[stat] if stat in self.quantiles else getattr(self, stat)
+        rtn = OrderedDict()
+        for i in range(len(self)):
+            group = tuple(int(self.groups[key][i]) for key in self.keys)
+            rtn[group[0] if len(group) == 1 else group] = vals[i]
+        return rtn
+
+
+    # Stat of each hour's group, one entry per hour that was aggregated
+    def per_hour(self, stat='mean'):
+        vals = self.quantiles[stat] if stat in self.quantiles else getattr(self, stat)
+        return vals[self._inverse]
+
+
+
+# Group values by any combination of CalendarIndex keys in one pass.
+# calendar : a CalendarIndex, or an array of hour stamps
+# values   : array of values, NaN values are skipped
+# keys     : tuple of CalendarIndex.KEYS, () aggregates everything
+# quantiles: quantiles in [0, 1] to compute per group
+# mask     : optional boolean array, False hours are left out entirely
+def aggregate(calendar, values, keys=('year',), quantiles=(), mask=None):
+    if not isinstance(calendar, CalendarIndex):
+        calendar = CalendarIndex(calendar)
+    values = np.asarray(values, dtype=np.float64)
+    assert(len(values) == len(calendar)), "values and calendar must have the same length"
+    keys = tuple(keys)
+
+    if mask is None:
+        mask = np.ones(len(values), dtype=bool)
+    else:
+        mask = np.asarray(mask, dtype=bool)
+
+    # Encode the key combination of each hour as one integer
+    code = np.zeros(len(values), dtype=np.int64)
+    radix = []
+    for key in keys:
+        col = calendar[key]
+        low = int(col.min()) if len(col) > 0 else 0
+        span = int(col.max()) - low + 1 if len(col) > 0 else 1
+        code = code * span + (col - low)
+        radix.append((key, low, span))
+
+    codes, inverse = np.unique(code[mask], return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    # Decode the key values of each group
+    groups = OrderedDict()
+    remainder = codes.copy()
+    for key, low, span in reversed(radix):
+        groups[key] = remainder % span + low
+        remainder = remainder // span
+    groups = OrderedDict((key, groups[key]) for key in keys)
+
+    cube = AggregationCube(keys, groups, codes, inverse)
+    n_groups = len(codes)
+    vals = values[mask]
+    finite = np.isfinite(vals)
+
+    cube.n_hours = np.bincount(inverse, minlength=n_groups)
+    cube.count = np.bincount(inverse[finite], minlength=n_groups)
+    cube.sum = np.bincount(inverse[finite], weights=vals[finite], minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cube.mean = cube.sum / cube.count
+
+    if len(quantiles) > 0:
+        # Sort once by group then value, each group is then contiguous
+        grp = inverse[finite]
+        order = np.lexsort((vals[finite], grp))
+        ordered = vals[finite][order]
+        starts = np.concatenate(([0], np.cumsum(cube.count)[:-1]))
+        for q in quantiles:
+            assert(0. <= q <= 1.), "quantiles must be in [0, 1], you gave {}".format(q)
+            pos = q * (cube.count - 1)
+            low = np.floor(pos).astype(np.int64)
+            high = np.ceil(pos).astype(np.int64)
+            frac = pos - low
+            result = np.full(n_groups, np.nan)
+            ok = cube.count > 0
+            lo_val = ordered[starts[ok] + low[ok]]
+            hi_val = ordered[starts[ok] + high[ok]]
+            result[ok] = lo_val + (hi_val - lo_val) * frac[ok]
+            cube.quantiles[q] = result
+
+    return cube
@@ -0,0 +1,195 @@
+import os
+import json
+import zlib
+import numpy as np
+from collections import OrderedDict
+import hourly_store
+
+
+# Chunked columnar files for per hour results, in place of pickled
+# DataFrames.  Each region is two files in one directory:
+#   {region}.cols : the column chunks, each one zlib compressed blob
+#   {region}.json : column dtypes and for every chunk of chunk_hours
+#                   hours its stamp range and, per column, the blob
+#                   offset and size and the min / max value
+# Readers load only the requested columns of the chunks overlapping
+# the requested time range (and value ranges), nothing else is read
+# or decompressed.
+#
+# Example:
+#   export_demand('results', [dem_ciso, dem_erco])
+#   cols = read_region('results', 'CISO', ['demand', 'outlier'],
+#           start='20180101T00Z', end='20190101T00Z')
+
+
+
+# DemandData per hour fields exported by default, see
+# DemandData.get_hourly_values()
+DEMAND_FIELDS = ['demand', 'missing', 'outlier', 'deltas_valid', 'delta_previous', 'delta_following',
+        'daily_avg', 'centered_average', 'centered_iqr_average',
+        'demand_estimate', 'demand_estimate_outlier']
+
+
+
+def _paths(path, region):
+    return os.path.join(path, '{}.cols'.format(region)), os.path.join(path, '{}.json'.format(region))
+
+
+
+# min and max of a chunk as plain numbers, None if it has no values
+def _min_max(values):
+    if values.dtype.kind == 'f':
+        values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return None, None
+    return values.min().item(), values.max().item()
+
+
+
+# Write columns (OrderedDict name -> array, including an int64 'stamp'
+# column of hours, see hourly_store) for one region
+def write_region(path, region, columns, chunk_hours=8760, compress=True):
+    assert('stamp' in columns), "columns need the 'stamp' hours"
+    columns = OrderedDict((name, np.ascontiguousarray(values)) for name, values in columns.items())
+    n_rows = len(columns['stamp'])
+    for name, values in columns.items():
+        assert(len(values) == n_rows), "Column {} has {} rows, stamp has {}".format(name, len(values), n_rows)
+
+    os.makedirs(path, exist_ok=True)
+    data_path, meta_path = _paths(path, region)
+    meta = OrderedDict([
+        ('region', region),
+        ('n_rows', n_rows),
+        ('chunk_hours', chunk_hours),
+        ('compress', compress),
+        ('columns', OrderedDict((name, values.dtype.str) for name, values in columns.items())),
+        ('chunks', []),
+    ])
+
+    offset = 0
+    with open(data_path, 'wb') as f:
+        for start in range(0, n_rows, chunk_hours):
+            stop = min(start + chunk_hours, n_rows)
+            chunk = OrderedDict([('rows', [start, stop]),
+                    ('stamp', list(_min_max(columns['stamp'][start:stop]))), ('blobs', OrderedDict())])
+            for name, values in columns.items():
+                blob = values[start:stop].tobytes()
+                if compress:
+                    blob = zlib.compress(blob, 1)
+                f.write(blob)
+                chunk['blobs'][name] = [offset, len(blob)] + list(_min_max(values[start:stop]))
+                offset += len(blob)
+            meta['chunks'].append(chunk)
+
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return data_path
+
+
+
+# The per hour fields of a DemandData, computing derived fields
+# which are not up to date
+def demand_columns(demand_data, fields=None):
+    columns = OrderedDict([('stamp', demand_data.store['stamp'].copy())])
+    for field in (DEMAND_FIELDS if fields == None else fields):
+        columns[field] = demand_data.get_hourly_values(field)
+    return columns
+
+
+
+# Write the per hour fields of several DemandData, one file pair per region
+def export_demand(path, demand_datas, fields=None, chunk_hours=8760, compress=True):
+    for demand_data in demand_datas:
+        write_region(path, demand_data.region, demand_columns(demand_data, fields), chunk_hours, compress)
+    print("Outdir: {}, {} regions".format(path, len(demand_datas)))
+
+
+
+def read_meta(path, region):
+    with open(_paths(path, region)[1]) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+
+# Regions stored in path
+def list_regions(path):
+    return sorted(f[:-5] for f in os.listdir(path) if f.endswith('.json'))
+
+
+
+# Does a chunk with min / max stats possibly hold values in [lo, hi]
+def _overlaps(stats_min, stats_max, lo, hi):
+    if stats_min == None:
+        return False
+    return (lo == None or stats_max >= lo) and (hi == None or stats_min <= hi)
+
+
+
+# Read some columns of one region.
+# columns     : names, None for all.  'stamp' is always returned.
+# start, end  : anything hourly_store.to_stamp() accepts, the hours
+#               start <= t < end are returned
+# value_range : optional dict column -> (lo, hi), only hours with
+#               lo <= value <= hi are returned, chunks whose min / max
+#               rule them out are skipped.  None leaves a side open.
+# Returns an OrderedDict name -> array.
+def read_region(path, region, columns=None, start=None, end=None, value_range=None):
+    meta = read_meta(path, region)
+    dtypes = meta['columns']
+    if columns == None:
+        columns = list(dtypes.keys())
+    value_range = value_range or {}
+    names = ['stamp'] + [c for c in list(columns) + list(value_range.keys()) if c != 'stamp']
+    names = list(OrderedDict.fromkeys(names))
+    for name in names:
+        assert(name in dtypes), "{} has no column {}, choose from {}".format(region, name, list(dtypes.keys()))
+
+    lo = None if start == None else hourly_store.to_stamp(start)
+    hi = None if end == None else hourly_store.to_stamp(end) - 1
+    chunks = [chunk for chunk in meta['chunks']
+            if _overlaps(chunk['stamp'][0], chunk['stamp'][1], lo, hi) and
+            all(_overlaps(chunk['blobs'][c][2], chunk['blobs'][c][3], r[0], r[1]) for c, r in value_range.items())]
+
+    parts = OrderedDict((name, []) for name in names)
+    with open(_paths(path, region)[0], 'rb') as f:
+        for chunk in chunks:
+            for name in names:
+                offset, size = chunk['blobs'][name][:2]
+                f.seek(offset)
+                blob = f.read(size)
+                if meta['compress']:
+                    blob = zlib.decompress(blob)
+                parts[name].append(np.frombuffer(blob, dtype=np.dtype(dtypes[name])))
+
+    out = OrderedDict((name, np.concatenate(p) if len(p) > 0 else np.zeros(0, dtype=np.dtype(dtypes[name])))
+            for name, p in parts.items())
+    keep = np.ones(len(out['stamp']), dtype=bool)
+    if lo != None:
+        keep &= out['stamp'] >= lo
+    if hi != None:
+        keep &= out['stamp'] <= hi
+    for name, (r_lo, r_hi) in value_range.items():
+        if r_lo != None:
+            keep &= out[name] >= r_lo
+        if r_hi != None:
+            keep &= out[name] <= r_hi
+    wanted = ['stamp'] + [c for c in columns if c != 'stamp']
+    return OrderedDict((name, out[name][keep]) for name in wanted)
+
+
+
+# read_region() for several regions (None for all in path)
+# Returns an OrderedDict region -> columns.
+def read_regions(path, regions=None, columns=None, start=None, end=None, value_range=None):
+    if regions == None:
+        regions = list_regions(path)
+    return OrderedDict((region, read_region(path, region, columns, start, end, value_range)) for region in regions)
+
+
+
+# Columns as a DataFrame indexed by UTC date_time
+def to_frame(columns):
+    import pandas as pd
+    index = pd.DatetimeIndex(columns['stamp'].astype('datetime64[h]').astype('datetime64[ns]'), name='date_time')
+    return pd.DataFrame(OrderedDict((name, values) for name, values in columns.items() if name != 'stamp'),
+            index=index.tz_localize('UTC'))
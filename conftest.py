@@ -0,0 +1,2 @@
+# Presence of this file puts the repository root on sys.path
+# so the tests can import the analysis modules directly.
@@ -0,0 +1,183 @@
+import os
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Pairwise-complete correlation matrices for an hours x regions
+# array, optionally between each region at time t and every region
+# at time t + lag.  NaN marks a missing hour.
+#
+# Every correlation only uses the hours where both series are
+# present, like pandas DataFrame.corr(), but all pairs are computed
+# together from six matrix products of the masked data:
+#   n, sum x, sum y, sum x^2, sum y^2, sum xy  (each regions x regions)
+# The hours are split into blocks, so memory is bounded by the block
+# size, blocks can run on several threads, and the sums of later
+# chunks (e.g. one year at a time) can be added with
+# CorrelationAccumulator.
+#
+# Example:
+#   corrs = correlation_matrix(values, lags=[0, 1, 24])
+#   corrs[24][i, j] # region i at t with region j at t + 24 hours
+
+
+
+# Add the six sums of x rows against y rows to sums.  x and y are
+# hours x regions blocks of the same length, shifted by the lag.
+def _add_block_sums(sums, x, y):
+    mx = np.isfinite(x)
+    my = np.isfinite(y)
+    x0 = np.where(mx, x, 0.)
+    y0 = np.where(my, y, 0.)
+    mx = mx.astype(np.float64)
+    my = my.astype(np.float64)
+    sums['n'] += mx.T @ my
+    sums['sx'] += x0.T @ my
+    sums['sy'] += mx.T @ y0
+    sums['sxx'] += (x0 * x0).T @ my
+    sums['syy'] += mx.T @ (y0 * y0)
+    sums['sxy'] += x0.T @ y0
+
+
+
+def _empty_sums(n_x, n_y):
+    return OrderedDict((name, np.zeros((n_x, n_y))) for name in ['n', 'sx', 'sy', 'sxx', 'syy', 'sxy'])
+
+
+
+# Pearson correlations from the six sums, NaN where fewer than
+# min_periods hours are shared or a series is constant
+def _correlation_from_sums(sums, min_periods=2):
+    n = sums['n']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sums['sxy'] - sums['sx'] * sums['sy'] / n
+        var_x = sums['sxx'] - sums['sx'] ** 2 / n
+        var_y = sums['syy'] - sums['sy'] ** 2 / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[n < max(min_periods, 2)] = np.nan
+    return np.clip(corr, -1., 1.)
+
+
+
+# Ranks of each column over its non-missing hours, ties get their
+# average rank, missing hours stay NaN
+def rank_columns(data):
+    data = np.asarray(data, dtype=np.float64)
+    ranks = np.full(data.shape, np.nan)
+    for j in range(data.shape[1]):
+        valid = np.isfinite(data[:, j])
+        vals = data[valid, j]
+        order = np.argsort(vals, kind='stable')
+        sorted_vals = vals[order]
+        # Average rank of each run of tied values
+        starts = np.concatenate(([True], sorted_vals[1:] != sorted_vals[:-1]))
+        run = np.cumsum(starts) - 1
+        first = np.nonzero(starts)[0]
+        last = np.concatenate((first[1:], [len(vals)])) - 1
+        col = np.empty(len(vals))
+        col[order] = (first[run] + last[run]) / 2. + 1.
+        ranks[valid, j] = col
+    return ranks
+
+
+
+class CorrelationAccumulator :
+    """ Streaming pairwise-complete Pearson correlations.  Feed
+    consecutive chunks of hours (hours x regions arrays) to update(),
+    the last max(lags) hours of each chunk are kept so lagged pairs
+    across chunk boundaries are counted.  result() returns an
+    OrderedDict lag -> regions x regions correlation matrix.
+
+    shift is subtracted from every column before summing to keep
+    the sums well conditioned, by default the column means of
+    the first chunk. """
+
+    def __init__(self, n_regions, lags=(0,), shift=None, block_hours=8760, n_workers=1):
+        self.n_regions = n_regions
+        self.lags = [int(lag) for lag in lags]
+        assert(min(self.lags) >= 0), "Use non-negative lags, a negative lag is the transpose of the positive one"
+        self.shift = shift
+        self.block_hours = block_hours
+        self.n_workers = n_workers
+        self.sums = OrderedDict((lag, _empty_sums(n_regions, n_regions)) for lag in self.lags)
+        self._tail = np.zeros((0, n_regions))
+
+
+    # Sums for rows [start, stop) of data paired with rows shifted by lag
+    def _block(self, data, lag, start, stop):
+        sums = _empty_sums(self.n_regions, self.n_regions)
+        stop = min(stop, len(data) - lag)
+        if stop > start:
+            _add_block_sums(sums, data[start:stop], data[start+lag:stop+lag])
+        return sums
+
+
+    def update(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float64)
+        assert(chunk.ndim == 2 and chunk.shape[1] == self.n_regions), \
+                "Chunks must be hours x {} regions".format(self.n_regions)
+        if self.shift is None:
+            with np.errstate(invalid='ignore'):
+                self.shift = np.nan_to_num(np.nanmean(chunk, axis=0)) if len(chunk) > 0 else np.zeros(self.n_regions)
+        chunk = chunk - self.shift
+
+        # Rows from the previous chunk only start pairs with lags
+        # reaching into this chunk, they were not paired yet
+        data = np.concatenate((self._tail, chunk))
+        n_old = len(self._tail)
+
+        tasks = []
+        for lag in self.lags:
+            first = max(0, n_old - lag)
+            for start in range(first, len(data), self.block_hours):
+                tasks.append((lag, start, start + self.block_hours))
+
+        if self.n_workers == 1:
+            results = [self._block(data, *task) for task in tasks]
+        else:
+            n_workers = self.n_workers or os.cpu_count() or 1
+            with ThreadPoolExecutor(max_workers=n_workers) as pool:
+                results = list(pool.map(lambda task: self._block(data, *task), tasks))
+        for (lag, start, stop), sums in zip(tasks, results):
+            for name in sums.keys():
+                self.sums[lag][name] += sums[name]
+
+        max_lag = max(self.lags)
+        self._tail = data[len(data) - max_lag:] if max_lag > 0 else data[:0]
+
+
+    def result(self, min_periods=2):
+        return OrderedDict((lag, _correlation_from_sums(sums, min_periods)) for lag, sums in self.sums.items())
+
+
+
+# Pairwise-complete correlation matrices of an hours x regions array
+# method      : 'pearson' or 'spearman'.  Spearman ranks each column
+#               over all of its non-missing hours, pandas re-ranks each
+#               pair over the shared hours, so they differ slightly
+#               when the gaps differ between columns.
+# lags        : hours, result[lag][i, j] pairs column i at t with
+#               column j at t + lag
+# block_hours : hours per matrix product block
+# n_workers   : threads computing blocks, None for one per CPU
+# Returns an OrderedDict lag -> regions x regions matrix
+def correlation_matrix(data, lags=(0,), method='pearson', min_periods=2, block_hours=8760, n_workers=1):
+    assert(method in ['pearson', 'spearman']), "method must be 'pearson' or 'spearman', you gave {}".format(method)
+    data = np.asarray(data, dtype=np.float64)
+    if method == 'spearman':
+        data = rank_columns(data)
+    acc = CorrelationAccumulator(data.shape[1], lags, block_hours=block_hours, n_workers=n_workers)
+    acc.update(data)
+    return acc.result(min_periods)
+
+
+
+# correlation_matrix for a DataFrame, returning DataFrames labeled
+# with its columns.  A single lag returns one DataFrame.
+def corr_frame(df, lags=(0,), method='pearson', min_periods=2, n_workers=1):
+    import pandas as pd
+    corrs = correlation_matrix(df.values, lags, method, min_periods, n_workers=n_workers)
+    frames = OrderedDict((lag, pd.DataFrame(corr, index=df.columns, columns=df.columns))
+            for lag, corr in corrs.items())
+    return list(frames.values())[0] if len(frames) == 1 else frames
@@ -2,34 +2,108 @@ from hourly_data_container import HourlyDataContainer
 import csv
 import numpy as np
 import helpers as helpers
+import time_helpers
+import calendar_cube
+import hourly_store
+from quantile_sketch import QuantileSketch
+from hourly_store import HourlyStore, HourlyRecords
 from collections import OrderedDict
 
 
 class DemandData :
     """ A class to store the hour-by-hour info for 
     electric demand.  It will contain info and flags indicating
-    relevant info for each hour of demand data """
-
-
-    def __init__(self, region):
+    relevant info for each hour of demand data
+
+    Derived fields are computed lazily.  Each entry of DERIVED_FIELDS
+    is: name : [method computing it, fields it depends on].
+    Asking for a field with ensure(), get_hourly_values() or the
+    hourly_demand / hourly_demand_avgs attributes computes it, and
+    whatever it depends on, only if it is not already up to date.
+    Calling a compute method directly, changing its settings or
+    changing demand values invalidates everything downstream. """
+
+    DERIVED_FIELDS = OrderedDict([
+        ('deltas',            ['_compute_all_deltas', ['demand']]),
+        ('outliers',          ['find_hourly_outliers', ['deltas']]),
+        ('daily_averages',    ['compute_daily_averages', ['outliers']]),
+        ('centered_averages', ['compute_hour_centered_averages', ['demand']]),
+        ('hourly_demand',     ['set_hourly_demand', ['outliers']]),
+        ('demand_estimates',  ['set_24_hourly_demand', ['hourly_demand', 'centered_averages']]),
+    ])
+
+    # Stamps label the end of each hour (EIA convention), and the
+    # value column name, for mem_format.export_mem
+    HOUR_ENDING = True
+    MEM_VALUE_NAME = 'demand (MW)'
+
+    # Per hour boolean attributes stored as bits of the store's flags column
+    FLAG_BITS = {
+        'missing'                 : hourly_store.MISSING,
+        'outlier'                 : hourly_store.OUTLIER,
+        'deltas_valid'            : hourly_store.DELTAS_VALID,
+        'demand_estimate_outlier' : hourly_store.ESTIMATE_OUTLIER,
+    }
+
+    # Per hour HourlyDataContainer attributes and the derived field setting them
+    HOURLY_FIELDS = {
+        'deltas_valid'            : 'deltas',
+        'delta_previous'          : 'deltas',
+        'delta_following'         : 'deltas',
+        'outlier'                 : 'outliers',
+        'daily_avg'               : 'daily_averages',
+        'centered_average'        : 'centered_averages',
+        'centered_iqr_average'    : 'centered_averages',
+        'demand_estimate'         : 'demand_estimates',
+        'demand_estimate_outlier' : 'demand_estimates',
+    }
+
+
+    def __init__(self, region, records=None):
 
         self.region = region
-        self.hourly_data = []
+        self.store = HourlyStore(hourly_store.HOURLY_COLUMNS)
         self.demand_position = 2 # Position of reported demand use
         self.uct_time_position = 1 # Position of UCT time in Dan's current EIA930_BALANCE_[year]_[monts].csv data 
 
         self.n_hours_surrounding = 24 # Default to do 24 hrs prior and post for running avgs
-        self.hourly_demand = OrderedDict() # Can be filled later with set_hourly_demand
-        self.hourly_demand_avgs = OrderedDict() # Can be filled later with set_hourly_demand
+        self._hourly_demand = OrderedDict() # Filled by set_hourly_demand
+        self._hourly_demand_avgs = OrderedDict() # Filled by set_hourly_demand
+
+        # Settings used when derived fields are computed lazily,
+        # calling the compute methods with new values updates them
+        self.iqr_val = 25 # compute_hour_centered_averages
+        self.outlier_percentiles = [5, 95] # find_hourly_outliers
+        self.outlier_multiplier = 1.5 # find_hourly_outliers
+        self.quantile_backend = 'exact' # find_hourly_outliers, 'exact' or 'sketch'
+        self.sketch_seed = 0 # find_hourly_outliers, QuantileSketch compactions, fixed so flags are reproducible
+        self.estimate_cut = 0.5 # set_24_hourly_demand, relative difference flagged
+        self.time_slice_choice = 0 # set_hourly_demand
+        self.include_outliers = False # set_hourly_demand
+
+        # Results kept so append() can extend derived fields to new hours
+        self.outlier_bounds = None # [lower, upper] from find_hourly_outliers
+        self.time_slice_map = None # month -> time slice from set_24_hourly_demand
+        self.delta_sketch = None # QuantileSketch of delta_previous, quantile_backend 'sketch'
+
+        # Names of the DERIVED_FIELDS which are up to date
+        self._valid = set()
 
         print (self.region)
 
+        # Build from records directly instead of data/{region}.csv,
+        # this is the entry point for live feeds, see append()
+        if records != None:
+            self.append(records)
+            self._compute_all_deltas()
+            print ("Length of hourly data: %i" % len(self.hourly_data))
+            return
+
         with open("data/{}.csv".format(self.region), 'r') as f:
             info = list(csv.reader(f, delimiter=","))
 
-        # Continue the hour notation at previous entry
-        # and increment by 1 unless it's the first entry
-        hour = 0
+        times = []
+        demands = []
         for line in info:
 
             # Ensure demand is listed in expected column and
@@ -43,114 +117,330 @@ class DemandData :
                     break
                 continue
 
+            times.append(line[self.uct_time_position])
+            demands.append(line[self.demand_position])
 
-            # Initialize an HourlyDataContainer for this hour
-            self.hourly_data.append( HourlyDataContainer(hour, 
-                line[self.uct_time_position],
-                line[self.demand_position]) )
-            hour += 1
+        self.store.append(*self._parse_records(times, demands))
 
         # For all hourly data, make delta comparisons
         # Skip first and last hours
-        for i in range(1, len(self.hourly_data)-1):
-            self.hourly_data[i].compute_deltas(self.hourly_data[i-1], self.hourly_data[i+1])
+        self._compute_all_deltas()
 
         print ("Length of hourly data: %i" % len(self.hourly_data))
 
 
+    # Convert lists of UTC strings and demand strings to hour stamps,
+    # demand values and missing flags.  'MISSING' and 'EMPTY' are missing.
+    def _parse_records(self, times, demands):
+        missing = np.array([d == 'MISSING' or d == 'EMPTY' for d in demands], dtype=bool)
+        values = np.array([np.nan if m else float(d) for d, m in zip(demands, missing)])
+        return hourly_store.uct_to_stamps(times), values, missing
+
+
+    # One HourlyDataContainer per hour, created when accessed
+    @property
+    def hourly_data(self):
+        return HourlyRecords(self.store, HourlyDataContainer)
+
+
+    # Time lookups on the hours, binary searches returning views,
+    # see HourlyRecords.slice(), year() and loc()
+    def slice(self, start=None, end=None):
+        return self.hourly_data.slice(start, end)
+
+    def year(self, y):
+        return self.hourly_data.year(y)
+
+    def loc(self, ts):
+        return self.hourly_data.loc(ts)
+
+
+    # Make sure the requested DERIVED_FIELDS, and everything they
+    # depend on, are up to date computing only what is stale.
+    def ensure(self, *fields):
+        for field in fields:
+            if field == 'demand' or field in self._valid:
+                continue
+            assert(field in self.DERIVED_FIELDS), "Unknown derived field {}, choose from {}".format(field, list(self.DERIVED_FIELDS.keys()))
+            method, dependencies = self.DERIVED_FIELDS[field]
+            self.ensure(*dependencies)
+            getattr(self, method)()
+
+
+    # Mark field as stale along with every field depending on it
+    def invalidate(self, field='demand'):
+        self._valid.discard(field)
+        for name, info in self.DERIVED_FIELDS.items():
+            if field in info[1]:
+                self.invalidate(name)
+
+
+    # Called by each compute method once it has finished
+    def _mark_computed(self, field):
+        self.invalidate(field)
+        self._valid.add(field)
+
+
+    # Return an array of a per hour HourlyDataContainer attribute,
+    # e.g. 'demand' or 'centered_iqr_average', computing it if needed
+    def get_hourly_values(self, field):
+        if field in self.HOURLY_FIELDS:
+            self.ensure(self.HOURLY_FIELDS[field])
+        if field == 'demand':
+            field = 'value'
+        if field in self.store:
+            return self.store[field].copy()
+        for name, bit in self.FLAG_BITS.items():
+            if field == name:
+                return self.store.flag(bit)
+        return np.array([getattr(d, field) for d in self.hourly_data])
+
+
+    # Change the demand of hour i, this invalidates all derived fields
+    def set_demand(self, i, demand):
+        self.store['value'][i] = demand
+        self.invalidate('demand')
+
+
+    # 24 hour demand profiles for each time slice, see set_hourly_demand
+    @property
+    def hourly_demand(self):
+        self.ensure('hourly_demand')
+        return self._hourly_demand
+
+    @hourly_demand.setter
+    def hourly_demand(self, hourly_demand):
+        self._hourly_demand = hourly_demand
+        self._mark_computed('hourly_demand')
+
+    # Mean of each 24 hour demand profile, see set_hourly_demand
+    @property
+    def hourly_demand_avgs(self):
+        self.ensure('hourly_demand')
+        return self._hourly_demand_avgs
+
+    @hourly_demand_avgs.setter
+    def hourly_demand_avgs(self, hourly_demand_avgs):
+        self._hourly_demand_avgs = hourly_demand_avgs
+        self._mark_computed('hourly_demand')
+
+
+    # Extend the series with new hours from a live feed.
+    # records is an iterable of (uct_time, demand) pairs in the same
+    # format as the csv columns, e.g. ('20200101T05Z', '12345') or
+    # ('20200101T06Z', 'MISSING').  Records which are not newer than
+    # the current last hour are skipped so overlapping feed pulls are safe.
+    #
+    # Only the derived fields touched by the new hours are updated,
+    # and only those which were already computed:
+    #  * deltas of the previous last hour, which now has a following hour
+    #  * outlier flags, using the thresholds from the last find_hourly_outliers
+    #  * 24 hour trailing averages from the previous last hour onwards
+    #  * centered averages within n_hours_surrounding of the end
+    #  * demand estimates for those same hours
+    # so the cost per appended hour does not grow with the series length.
+    # The 24 hour profiles from set_hourly_demand are kept as fitted.
+    # Returns the number of hours appended.
+    def append(self, records):
+
+        times = []
+        demands = []
+        for uct_time, demand in records:
+            times.append(uct_time)
+            demands.append(demand)
+        if len(times) == 0:
+            return 0
+        stamps, values, missing = self._parse_records(times, demands)
+
+        # Keep only hours newer than everything before them
+        newest = np.maximum.accumulate(stamps)
+        keep = np.ones(len(stamps), dtype=bool)
+        keep[1:] = stamps[1:] > newest[:-1]
+        if len(self.store) > 0:
+            keep &= stamps > self.store['stamp'][-1]
+        if not keep.any():
+            return 0
+
+        n_old = self.store.append(stamps[keep], values[keep], missing[keep])
+        n_new = len(self.store)
+
+        # Previous last hour is the first one which gains a following hour
+        first_changed = max(1, n_old - 1)
+        self._compute_deltas(first_changed)
+
+        if self.delta_sketch != None:
+            self._sketch_deltas(first_changed)
+
+        if 'outliers' in self._valid and self.outlier_bounds != None:
+            self._flag_outliers(first_changed)
+
+        if 'daily_averages' in self._valid:
+            self._compute_daily_averages(first_changed)
+
+        # Hours within n_hours_surrounding of the old end gain a full window
+        first_centered = max(0, n_old - self.n_hours_surrounding)
+        if 'centered_averages' in self._valid:
+            self._compute_hour_centered_averages(first_centered, self.iqr_val)
+
+        if 'demand_estimates' in self._valid and self.time_slice_map != None:
+            self._set_24_hourly_demand(first_centered)
+
+        return n_new - n_old
+
+
+    def _compute_all_deltas(self):
+        self._compute_deltas(1)
+        self.delta_sketch = None
+        self._mark_computed('deltas')
+
+
+    # Delta comparisons for all hours from start onwards which
+    # have a following hour.  Comparisons are only valid if the
+    # previous and following hours are not missing.
+    def _compute_deltas(self, start=1):
+        start = max(1, start)
+        stop = len(self.store) - 1
+        if stop <= start:
+            return
+        demand = self.store['value']
+        missing = self.store.flag(hourly_store.MISSING)
+        valid = ~missing[start-1:stop-1] & ~missing[start+1:stop+1]
+        self.store['delta_previous'][start:stop] = np.where(valid,
+                demand[start:stop] - demand[start-1:stop-1], np.nan)
+        self.store['delta_following'][start:stop] = np.where(valid,
+                demand[start:stop] - demand[start+1:stop+1], np.nan)
+        self.store.set_flag(hourly_store.DELTAS_VALID, valid, start)
+
+
     # Currently using a modified IQR method with much broader range.
     # This currently only targets single hour outliers where the
     # delta is large compared to the previous and following hour.
     # Skip analyzing previous or following if they are 'missing'
-    def find_hourly_outliers(self):
-
-        x = [d.delta_previous for d in self.hourly_data if not d.missing]
+    # percentiles and multiplier = None use the previous settings,
+    # self.outlier_percentiles and self.outlier_multiplier.
+    # With self.quantile_backend = 'sketch' the percentiles come from
+    # self.delta_sketch, which append() keeps up to date, so refitting
+    # the thresholds on a live feed does not re-read the series.
+    def find_hourly_outliers(self, percentiles=None, multiplier=None):
+        if percentiles != None:
+            self.outlier_percentiles = list(percentiles)
+        if multiplier != None:
+            self.outlier_multiplier = multiplier
+        assert(self.quantile_backend in ['exact', 'sketch']), "quantile_backend={}, use 'exact' or 'sketch'".format(self.quantile_backend)
+        self.ensure('deltas')
+
+        if self.quantile_backend == 'sketch':
+            if self.delta_sketch == None:
+                self.delta_sketch = QuantileSketch(seed=self.sketch_seed)
+                self._sketch_deltas(0)
+            x = self.delta_sketch
+        else:
+            x = self.store['delta_previous'][~self.store.flag(hourly_store.MISSING)]
+            x = x[np.isfinite(x)]
         if len(x) > 0:
-            q05 = np.percentile(x, 5)
-            q95 = np.percentile(x, 95)
+            if self.quantile_backend == 'sketch':
+                q05, q95 = x.percentile(self.outlier_percentiles)
+            else:
+                q05, q95 = np.percentile(x, self.outlier_percentiles)
             iqr = q95 - q05
             
-            cut_off = iqr * 1.5
+            cut_off = iqr * self.outlier_multiplier
             lower = q05 - cut_off
             upper = q95 + cut_off
 
-            for d in self.hourly_data:
-                if ((d.delta_previous < lower or d.delta_previous > upper) and 
-                        (d.delta_following < lower or d.delta_following > upper) and
-                        d.deltas_valid):
-                    d.outlier = True
+            self.outlier_bounds = [lower, upper]
+            self._flag_outliers(0)
+        self._mark_computed('outliers')
+
+
+    # Add the delta_previous of hours from start onwards to
+    # self.delta_sketch.  Deltas are only set once an hour has a
+    # following hour, so each is added once.
+    def _sketch_deltas(self, start=0):
+        x = self.store['delta_previous'][start:][~self.store.flag(hourly_store.MISSING)[start:]]
+        self.delta_sketch.update(x)
+
+
+    # Flag hours from start onwards using self.outlier_bounds
+    def _flag_outliers(self, start=0):
+        lower, upper = self.outlier_bounds
+        delta_previous = self.store['delta_previous'][start:]
+        delta_following = self.store['delta_following'][start:]
+        outlier = (((delta_previous < lower) | (delta_previous > upper)) &
+                ((delta_following < lower) | (delta_following > upper)) &
+                self.store.flag(hourly_store.DELTAS_VALID)[start:])
+        self.store.set_flag(hourly_store.OUTLIER, outlier, start)
 
 
     # Calculate the 24 hour running average for each hour.
     # This should give insight into how large of an effect multi-day
-    # weather patters are. Missing data is treated as a gap in data
-    # instead of -99.99. 
+    # weather patters are. Missing data is treated as a gap in data. 
     # Skip outliers.
     def compute_daily_averages(self):
+        self.ensure('outliers')
+        self._compute_daily_averages(0)
+        self._mark_computed('daily_averages')
 
-        twenty_four_hours = []
-        for d in self.hourly_data:
-            # Add new value
-            if len(twenty_four_hours) < 24:
-                to_append = d.demand if not d.outlier else -99.99
-                twenty_four_hours.append(to_append)
-            total = 0.
-            n_good_hours = 0
-            if len(twenty_four_hours) == 24:
-                for h in twenty_four_hours:
-                    if h != -99.99:
-                        total += h
-                        n_good_hours += 1
-                # Pop off oldest hourly value
-                twenty_four_hours.pop(0)
-            if n_good_hours > 0:
-                d.daily_avg = total / n_good_hours
-            else:
-                d.daily_avg = 0.
-            if len(twenty_four_hours) >= 24:
-                print ("Error, len == %i" % len(twenty_four_hours))
 
+    # The trailing 24 hours for hour i are hours i-23 ... i.
+    # The first 23 hours do not have a full window and get 0.
+    def _compute_daily_averages(self, start=0):
 
+        n_hours = len(self.store)
+        first = max(start, 23)
+        self.store['daily_avg'][start:first] = 0.
+        if first >= n_hours:
+            return
 
-    def compute_hour_centered_averages(self, iqr_val=25):
+        good = ~(self.store.flag(hourly_store.MISSING) | self.store.flag(hourly_store.OUTLIER))
+        vals = np.where(good, self.store['value'], 0.)[first-23:]
+        windows = np.lib.stride_tricks.sliding_window_view(vals, 24)
+        counts = np.lib.stride_tricks.sliding_window_view(good[first-23:], 24).sum(axis=1)
+        totals = windows.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.store['daily_avg'][first:] = np.where(counts > 0, totals / counts, 0.)
 
-        n_hours = len(self.hourly_data)
 
-        # Make list of all hours with missing as -99.99
-        running_hours = []
-        for d in self.hourly_data:
-            if not d.missing:
-                running_hours.append(d.demand)
-            else:
-                running_hours.append(-99.99)
+
+    # iqr_val = None uses the previous setting, self.iqr_val
+    def compute_hour_centered_averages(self, iqr_val=None):
+        if iqr_val != None:
+            self.iqr_val = iqr_val
+        self._compute_hour_centered_averages(0, self.iqr_val)
+        self._mark_computed('centered_averages')
+
+
+    def _compute_hour_centered_averages(self, start=0, iqr_val=25):
+
+        n_hours = len(self.store)
+        n_surrounding = self.n_hours_surrounding
+        demand = self.store['value']
+        missing = self.store.flag(hourly_store.MISSING)
+        centered_average = self.store['centered_average']
+        centered_iqr_average = self.store['centered_iqr_average']
 
         # Loop over list and compute avgs and iqr avgs
-        assert(n_hours == len(running_hours))
-        for i in range(len(running_hours)):
+        for i in range(start, n_hours):
             # fill with dummy val if we don't have full range requested
-            if i < self.n_hours_surrounding or i > n_hours - self.n_hours_surrounding:
-                self.hourly_data[i].set_centered_average(0.)
-                self.hourly_data[i].set_centered_iqr_average(0.)
+            if i < n_surrounding or i > n_hours - n_surrounding:
+                centered_average[i] = 0.
+                centered_iqr_average[i] = 0.
                 continue
 
             # demand for the hours surrounding the current hour giving 2 * self.n_hours_surrounding total
             # +1 extends to n past the current hour
-            surrounding_vals = running_hours[i - self.n_hours_surrounding : i + self.n_hours_surrounding] 
-            assert(len(surrounding_vals) == 2*self.n_hours_surrounding)
+            surrounding = slice(i - n_surrounding, i + n_surrounding)
 
             # Remove missing values
-            new_vals = []
-            for val in surrounding_vals:
-                if val != -99.99:
-                    new_vals.append(val) 
+            new_vals = demand[surrounding][~missing[surrounding]]
 
             if len(new_vals)>0:
                 avg, iqr_avg = helpers.check_avgs(new_vals, iqr_val)
-                self.hourly_data[i].set_centered_average(avg)
-                self.hourly_data[i].set_centered_iqr_average(iqr_avg)
+                centered_average[i] = avg
+                centered_iqr_average[i] = iqr_avg
             else:
-                self.hourly_data[i].set_centered_average(0.)
-                self.hourly_data[i].set_centered_iqr_average(0.)
+                centered_average[i] = 0.
+                centered_iqr_average[i] = 0.
 
 
     # Create average 24 hour demand curves for different time slices
@@ -158,199 +448,152 @@ class DemandData :
     # 1 = seasonal
     # 2 = monthly w/ +/- 1 month for averaging
     # 3 = monthly
-    def set_hourly_demand(self, time_slice_choice=0, include_outliers=False):
+    # None for either argument uses the previous setting,
+    # self.time_slice_choice and self.include_outliers
+    def set_hourly_demand(self, time_slice_choice=None, include_outliers=None):
+        if time_slice_choice != None:
+            self.time_slice_choice = time_slice_choice
+        if include_outliers != None:
+            self.include_outliers = include_outliers
+        time_slice_choice = self.time_slice_choice
+        include_outliers = self.include_outliers
         assert(time_slice_choice in [0, 1, 2, 3]), "time_slice_choice=%i, 0 = only annual, 1 = seasonal, 2 = monthly w/ +/- 1 month for averaging, 3 = monthly" % time_slice_choice
+        self.ensure('outliers')
 
         time_slices = helpers.get_time_slice_thresholds(time_slice_choice)
-        hourly_demand_entries = OrderedDict()
-
-        # Initialize to zeros
-        for time_slice in time_slices.keys() :
-            self.hourly_demand[time_slice] = np.zeros(24)
-            hourly_demand_entries[time_slice] = np.zeros(24)  # For averaging
-
-        # Fill and get number of entries
-        for d in self.hourly_data:
-            if d.missing: continue
-            if d.outlier: 
-                if not include_outliers:
-                    continue
-            for time_slice in time_slices.keys() :
-                if d.month >= time_slices[time_slice][0] and d.month <= time_slices[time_slice][1]:
-                    self.hourly_demand[time_slice][d.daily_hour-1] += d.demand
-                    hourly_demand_entries[time_slice][d.daily_hour-1] += 1
-
-        # Average
+        hourly_demand = OrderedDict()
+        hourly_demand_avgs = OrderedDict()
+
+        use = ~self.store.flag(hourly_store.MISSING)
+        if not include_outliers:
+            use &= ~self.store.flag(hourly_store.OUTLIER)
+        months = hourly_store.stamps_to_months(self.store['stamp'])
+        # daily_hour - 1 for python list indexing, so hour 0 is entry 23
+        hour_index = (hourly_store.stamps_to_hours(self.store['stamp']) - 1) % 24
+        demand = self.store['value']
+
+        # Sum and average by hour for each time slice
         for time_slice in time_slices.keys() :
-            for i in range(len(self.hourly_demand[time_slice])):
-                self.hourly_demand[time_slice][i] = self.hourly_demand[time_slice][i] / hourly_demand_entries[time_slice][i]
+            in_slice = use & (months >= time_slices[time_slice][0]) & (months <= time_slices[time_slice][1])
+            totals = np.bincount(hour_index[in_slice], weights=demand[in_slice], minlength=24)
+            entries = np.bincount(hour_index[in_slice], minlength=24)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                hourly_demand[time_slice] = totals / entries
 
         # Set time_slice specific averages
         for time_slice in time_slices.keys() :
-            self.hourly_demand_avgs[time_slice] = np.average(self.hourly_demand[time_slice])
+            hourly_demand_avgs[time_slice] = np.average(hourly_demand[time_slice])
+
+        self._hourly_demand = hourly_demand
+        self._hourly_demand_avgs = hourly_demand_avgs
+        self._mark_computed('hourly_demand')
 
 
 
     # Use self.hourly_demand[time_slices][24 hours] to set info for each demand hour
-    # for expected usage
-    def set_24_hourly_demand(self):
-        assert(len(self.hourly_demand) > 0), "You must first call set_hourly_demand to build the self.hourly_demand dict"
-
-        time_slice_map = {}
-        if 'Annual' in self.hourly_demand.keys():
-            for i in range(1, 13):
-                time_slice_map[i] = 'Annual'
-        elif 'Winter' in self.hourly_demand.keys():
-            time_slice_map[1] = 'Winter'
-            time_slice_map[2] = 'Winter'
-            time_slice_map[3] = 'Winter'
-            time_slice_map[4] = 'Spring'
-            time_slice_map[5] = 'Spring'
-            time_slice_map[6] = 'Spring'
-            time_slice_map[7] = 'Summer'
-            time_slice_map[8] = 'Summer'
-            time_slice_map[9] = 'Summer'
-            time_slice_map[10] = 'Fall'
-            time_slice_map[11] = 'Fall'
-            time_slice_map[12] = 'Fall'
-        elif 'January' in self.hourly_demand.keys():
-            time_slice_map[1] = 'January'
-            time_slice_map[2] = 'February'
-            time_slice_map[3] = 'March'
-            time_slice_map[4] = 'April'
-            time_slice_map[5] = 'May'
-            time_slice_map[6] = 'June'
-            time_slice_map[7] = 'July'
-            time_slice_map[8] = 'August'
-            time_slice_map[9] = 'September'
-            time_slice_map[10] = 'October'
-            time_slice_map[11] = 'November'
-            time_slice_map[12] = 'December'
-        else:
+    # for expected usage.  Hours whose demand differs from the estimate
+    # by more than estimate_cut (relative) are flagged, None uses the
+    # previous setting, self.estimate_cut
+    def set_24_hourly_demand(self, estimate_cut=None):
+        if estimate_cut != None:
+            self.estimate_cut = estimate_cut
+        self.ensure('hourly_demand', 'centered_averages')
+        assert(len(self._hourly_demand) > 0), "set_hourly_demand did not build the self.hourly_demand dict"
+
+        time_slice_map = helpers.get_time_slice_map(self.hourly_demand.keys())
+        if time_slice_map == None:
             print ("Did not align..., set_24_hourly_demand in demand_data.py")
             return
 
-        # For each hour, map the month to the time slice name.
-        # Grab the associated self.hourly_demand for that time slice and set it.
-        for d in self.hourly_data:
-            val = self.hourly_demand[time_slice_map[d.month]][d.daily_hour-1]
-            val -= self.hourly_demand_avgs[time_slice_map[d.month]]
-            val += d.centered_iqr_average
-            d.set_demand_estimate(val)
-
-            if d.hour<self.n_hours_surrounding: continue # b/c no 48 hour centered avg for the first and last day
-            if d.hour>(365*24)-self.n_hours_surrounding: continue
-            if ((d.demand - d.demand_estimate)/d.demand)<-0.5 or \
-                    ((d.demand - d.demand_estimate)/d.demand)>0.5:
-                d.set_demand_estimate_outlier(True)
+        self.time_slice_map = time_slice_map
+        self._set_24_hourly_demand(0)
+        self._mark_computed('demand_estimates')
+
+
+    # Profile values for arrays of hour stamps: the time slice's
+    # 24 hour profile at the hour less the slice average, the part
+    # of a demand estimate added to the centered IQR average
+    def _profile_offsets(self, stamps):
+        names = list(self._hourly_demand.keys())
+        profiles = np.array([self._hourly_demand[name] for name in names])
+        profiles = profiles - np.array([self._hourly_demand_avgs[name] for name in names])[:, None]
+        slot = np.array([names.index(self.time_slice_map[m]) for m in range(1, 13)])
+        months = hourly_store.stamps_to_months(stamps)
+        # daily_hour - 1 for python list indexing, so hour 0 is entry 23
+        hour_index = (hourly_store.stamps_to_hours(stamps) - 1) % 24
+        return profiles[slot[months - 1], hour_index]
+
+
+    # Hours from start onwards whose estimates are scored, those
+    # with a full centered window, see _compute_hour_centered_averages.
+    # Positions in the series, so every year is scored.
+    def _scored_hours(self, start=0):
+        n_hours = len(self.store)
+        n_surrounding = self.n_hours_surrounding
+        position = np.arange(start, n_hours)
+        return (position >= n_surrounding) & (position <= n_hours - n_surrounding)
+
+
+    # Hours whose relative difference from the estimate is beyond self.estimate_cut
+    def _estimate_outliers(self, demand, estimates):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            diff = (demand - estimates) / demand
+        return (diff < -self.estimate_cut) | (diff > self.estimate_cut)
+
+
+    # For each hour from start onwards, map the month to the time slice
+    # and set the estimate from that slice's profile and the centered
+    # IQR average.  Hours near the end are rescored by append().
+    def _set_24_hourly_demand(self, start=0):
+        stamps = self.store['stamp'][start:]
+        estimates = self._profile_offsets(stamps) + self.store['centered_iqr_average'][start:]
+        self.store['demand_estimate'][start:] = estimates
+        outliers = self._estimate_outliers(self.store['value'][start:], estimates)
+        self.store.set_flag(hourly_store.ESTIMATE_OUTLIER, outliers & self._scored_hours(start), start)
+
+
+    # Streaming scoring of hours which are not in the series yet,
+    # e.g. a live feed checked before append(), against the fitted
+    # profiles.  stamps are hourly_store.to_stamp() values and
+    # centered_iqr_averages those of the new hours, None uses the
+    # latest one in the series.
+    # Returns arrays of the demand estimates and estimate outlier flags.
+    def score_demand(self, stamps, demand, centered_iqr_averages=None):
+        self.ensure('demand_estimates')
+        stamps = np.array([hourly_store.to_stamp(t) for t in np.atleast_1d(stamps)], dtype=np.int64)
+        demand = np.asarray(demand, dtype=np.float64)
+        if centered_iqr_averages is None:
+            last = self.store['centered_iqr_average'][self._scored_hours()]
+            centered_iqr_averages = last[-1] if len(last) > 0 else np.nan
+        estimates = self._profile_offsets(stamps) + centered_iqr_averages
+        return estimates, self._estimate_outliers(demand, estimates)
 
     # Calculate the annaul averages for each year in our data.
-    # Some means will not include a full year
+    # Some means will not include a full year.
+    # Returns OrderedDict year -> [n_hours, sum, mean]
     def calculate_annaul_averages(self):
-        years = OrderedDict()
-        # Get list of all years
-        # First value in list tracks number of hours for that year
-        # in the data
-        for hour in self.hourly_data:
-            if not hour.datetime.year in years.keys():
-                years[hour.datetime.year] = [1, []]
-            else:
-                years[hour.datetime.year][0] += 1
-
-
-        # Loop over all hours and add their demand to the appropriate year
-        for hour in self.hourly_data:
-            for year, vals in years.items():
-                if hour.datetime.year == year:
-                    vals[1].append(hour.value)
-
-        # Add mean values
-        for year, vals in years.items():
-            vals.append(np.mean(vals[1]))
-            if vals[0] < 8760:
-                print("WARNING: you are using calculate_annaul_averages with \
-                        partial data for year {}".format(year))
-        
-        return years
+        return time_helpers.calculate_annaul_averages(self.hourly_data)
 
     # Adjust demand based on annual averages derived from
     # calculate_annaul_averages()
     def normalize_to_annual_averages(self, annual_info):
-        for hour in self.hourly_data:
-            hour.set_demand(hour.value / annual_info[hour.datetime.year][2])
+        time_helpers.normalize_to_annual_averages(annual_info, self.hourly_data)
+        self.invalidate('demand')
 
 
     # Calculate the seasonal averages for the whole data range
     def calculate_seasonal_averages(self):
-        seasons = OrderedDict()
-        seasons['Winter'] = [1, 2, 3]
-        seasons['Spring'] = [4, 5, 6]
-        seasons['Summer'] = [7, 8, 9]
-        seasons['Fall'] = [10, 11, 12]
-
-        data_dict = helpers.get_years_in_data(self.hourly_data)
-        for year in data_dict.keys():
-            data_dict[year] = OrderedDict()
-            for season in seasons.keys():
-                data_dict[year][season] = []
-
-        # Loop over all hours and add their demand to the appropriate year and season
-        for hour in self.hourly_data:
-            for season, months in seasons.items():
-                if hour.month in months:
-                    data_dict[hour.datetime.year][season].append(hour.value)
-                    break
-        
-        # Replace lists with mean value before returning
-        for year, seasons in data_dict.items():
-            for season in seasons.keys():
-                data_dict[year][season] = float(np.mean(data_dict[year][season]))
-        return data_dict
+        return time_helpers.calculate_seasonal_averages(self.hourly_data)
 
     # Calculate the monthly averages for the whole data range
     def calculate_monthly_averages(self):
-        months = OrderedDict()
-        months[1] = 'January'
-        months[2] = 'February'
-        months[3] = 'March'
-        months[4] = 'April'
-        months[5] = 'May'
-        months[6] = 'June'
-        months[7] = 'July'
-        months[8] = 'August'
-        months[9] = 'September'
-        months[10] = 'October'
-        months[11] = 'November'
-        months[12] = 'December'
-
-        data_dict = helpers.get_years_in_data(self.hourly_data)
-        for year in data_dict.keys():
-            data_dict[year] = OrderedDict()
-            for month, name in months.items():
-                data_dict[year][name] = []
-
-        # Loop over all hours and add their demand to the appropriate year and season
-        for hour in self.hourly_data:
-            data_dict[hour.datetime.year][months[hour.datetime.month]].append(hour.value)
-        
-        # Replace lists with mean value before returning
-        for year, months_names in data_dict.items():
-            for month in months_names.keys():
-                data_dict[year][month] = float(np.mean(data_dict[year][month]))
-        return data_dict
+        return time_helpers.calculate_monthly_averages(self.hourly_data)
             
     # Remove partial years from data
     def remove_partial_years(self):
-        years = OrderedDict()
-        # Get list of all years
-        # First value in list tracks number of hours for that year
-        # in the data
-        for hour in self.hourly_data:
-            if not hour.datetime.year in years.keys():
-                years[hour.datetime.year] = 1
-            else:
-                years[hour.datetime.year] += 1
-
-        # Remove years with less than full hourly data
-        self.hourly_data = [hour for hour in self.hourly_data if years[hour.datetime.year] >= 8760]
+        # Count hours per year, then drop years with less than full hourly data
+        years = calendar_cube.calendar_for_store(self.store).year
+        unique_years, inverse, counts = np.unique(years, return_inverse=True, return_counts=True)
+        self.store.keep(counts[inverse] >= 8760)
+        self.invalidate('demand')
 
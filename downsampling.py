@@ -0,0 +1,108 @@
+import numpy as np
+
+
+# Tools to reduce long hourly series to roughly one point per
+# horizontal pixel before handing them to matplotlib.  All methods
+# return the sorted indices of the points to keep so callers can
+# apply them to any parallel containers (datetimes, objects, ...).
+
+
+
+# Convert x values to floats usable for triangle areas.
+# datetime64 values (and lists of datetime.datetime) are viewed
+# as their integer representation in seconds.
+def _numeric_x(x):
+    x = np.asarray(x)
+    if x.dtype == object:
+        x = x.astype('datetime64[s]')
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[s]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+# Largest-Triangle-Three-Buckets (Steinarsson 2013).
+# Keep the first and last point.  Split the remaining points into
+# n_out - 2 buckets and from each keep the point forming the largest
+# triangle with the previously kept point and the mean of the next bucket.
+# Non-finite y values (missing data) are never selected.
+def lttb_indices(x, y, n_out):
+    x = _numeric_x(x)
+    y = np.asarray(y, dtype=np.float64)
+    assert(len(x) == len(y)), "x and y must have the same length"
+
+    valid = np.flatnonzero(np.isfinite(y) & np.isfinite(x))
+    if n_out >= len(valid) or len(valid) < 3:
+        return valid
+    assert(n_out >= 3), "lttb_indices needs n_out >= 3, you gave %i" % n_out
+
+    xv = x[valid]
+    yv = y[valid]
+    n = len(xv)
+
+    # Bucket edges for the interior points 1 ... n-2
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    # Mean of every bucket, the last "bucket" is the final point
+    counts = np.diff(edges)
+    x_means = np.add.reduceat(xv[:n-1], edges[:-1]) / counts
+    y_means = np.add.reduceat(yv[:n-1], edges[:-1]) / counts
+    x_means = np.append(x_means, xv[-1])
+    y_means = np.append(y_means, yv[-1])
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0] = 0
+    a = 0
+    for b in range(n_out - 2):
+        start, stop = edges[b], edges[b+1]
+        xa, ya = xv[a], yv[a]
+        xc, yc = x_means[b+1], y_means[b+1]
+        # Twice the triangle area, the factor 1/2 does not change the argmax
+        area = np.abs((xa - xc) * (yv[start:stop] - ya) -
+                      (xa - xv[start:stop]) * (yc - ya))
+        a = start + int(np.argmax(area))
+        kept[b+1] = a
+    kept[-1] = n - 1
+    return valid[kept]
+
+
+# Min/max envelope.  Split the points into n_buckets equal buckets and
+# keep the minimum and maximum of each, ordered in time.  This preserves
+# every spike, which LTTB may smooth over, at the cost of 2 points per bucket.
+def min_max_indices(y, n_buckets):
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(y))
+    if 2 * n_buckets >= len(valid):
+        return valid
+    assert(n_buckets >= 1), "min_max_indices needs n_buckets >= 1, you gave %i" % n_buckets
+
+    yv = y[valid]
+    size = int(np.ceil(len(yv) / n_buckets))
+    n_buckets = int(np.ceil(len(yv) / size))
+
+    # Pad the final bucket so every bucket is a row of a 2D array
+    padded_low = np.full(n_buckets * size, np.inf)
+    padded_high = np.full(n_buckets * size, -np.inf)
+    padded_low[:len(yv)] = yv
+    padded_high[:len(yv)] = yv
+    offsets = np.arange(n_buckets) * size
+    lows = offsets + np.argmin(padded_low.reshape(n_buckets, size), axis=1)
+    highs = offsets + np.argmax(padded_high.reshape(n_buckets, size), axis=1)
+
+    return valid[np.unique(np.concatenate((lows, highs)))]
+
+
+# Return the indices to keep for a pixel budget of n_pixels.
+# method = 'lttb' keeps n_pixels points
+# method = 'minmax' keeps up to 2 * n_pixels points
+def downsample_indices(x, y, n_pixels, method='lttb'):
+    assert(method in ['lttb', 'minmax']), "method=%s, choose 'lttb' or 'minmax'" % method
+    if method == 'lttb':
+        return lttb_indices(x, y, n_pixels)
+    return min_max_indices(y, n_pixels)
+
+
+# Downsample parallel x and y sequences, returning lists
+# so datetimes and other objects pass through untouched.
+def downsample(x, y, n_pixels, method='lttb'):
+    idx = downsample_indices(x, y, n_pixels, method)
+    return [x[i] for i in idx], [y[i] for i in idx]
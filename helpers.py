@@ -1,10 +1,15 @@
 import numpy as np
 from collections import OrderedDict
+from quantile_sketch import QuantileSketch
 
 
-# Return high and low IQR threshold for given val
+# Return high and low IQR threshold for given val.
+# x is the values or a quantile_sketch.QuantileSketch of them.
 def percentiles(x, val):
-    q_a, q_b = np.percentile(x, val), np.percentile(x, 100-val)
+    if isinstance(x, QuantileSketch):
+        q_a, q_b = x.percentile([val, 100-val])
+        return [q_a, q_b]
+    q_a, q_b = np.percentile(x, [val, 100-val])
     return [q_a, q_b]
 
 # An ordered dict with the months and their start and stop month
@@ -51,16 +56,37 @@ def get_time_slice_thresholds(time_slice_choice=0):
         time_slices['December'] = [12, 12]
     return time_slices
 
-# Print "normal" average and average based only on values within defined IQR range
+# Month (1 - 12) -> name of the time slice from
+# get_time_slice_thresholds() used for its demand estimates,
+# None if the names are not recognized
+def get_time_slice_map(time_slice_names):
+    if 'Annual' in time_slice_names:
+        return {month : 'Annual' for month in range(1, 13)}
+    if 'Winter' in time_slice_names:
+        return {month : month_num_to_season_str(month) for month in range(1, 13)}
+    if 'January' in time_slice_names:
+        return {month : month_num_to_month_str(month) for month in range(1, 13)}
+    return None
+
+# Print "normal" average and average based only on values within defined IQR range.
+# x is the values or a quantile_sketch.QuantileSketch of them, for which
+# the IQR average is estimated from the sketch.
 def check_avgs(x, val, name='', verbose=False):
     q_vals = percentiles(x, val)
-    x_iqr = [val for val in x if (val > q_vals[0] and val < q_vals[1])]
-    if len(x_iqr) == 0:
-        return np.average(x), 0.
+    if isinstance(x, QuantileSketch):
+        avg, iqr_avg = x.mean(), x.mean(q_vals[0], q_vals[1])
+        if np.isnan(iqr_avg):
+            return avg, 0.
+    else:
+        x = np.asarray(x)
+        x_iqr = x[(x > q_vals[0]) & (x < q_vals[1])]
+        if len(x_iqr) == 0:
+            return np.average(x), 0.
+        avg, iqr_avg = np.average(x), np.average(x_iqr)
     if verbose:
         print ("%15s Average: %.1f     IQR %i Average: %.1f    IQR Low: %.1f   IQR High: %.1f" 
-                % (name, np.average(x), val, np.average(x_iqr), q_vals[0], q_vals[1]))
-    return np.average(x), np.average(x_iqr)
+                % (name, avg, val, iqr_avg, q_vals[0], q_vals[1]))
+    return avg, iqr_avg
 
 # Loop check_avgs for 5 seasonal scenarios
 def check_seasonal_avgs(hourly_data, val, time_slice_choice=0):
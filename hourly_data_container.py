@@ -1,22 +1,27 @@
 import numpy as np
-import datetime
-from simple_container import SimpleContainer
+import hourly_store
+from simple_container import SimpleContainer, RowView
 
 
 class HourlyDataContainer(SimpleContainer):
-    """ Class that contains a single hour's electric demand.  
+    """ Class that contains a single hour's electric demand.
     It will contain info and flags as well
 
+    Like SimpleContainer the values are kept in slots, or in a row
+    of a hourly_store.HourlyStore for a view().  Values which are
+    missing or not computed yet are NaN.
+
     # Info
     self.hour
     self.daily_hour
-    self.raw_demand # no substitutions or corrections
+    self.original_value # no substitutions or corrections
     self.demand
 
     # Flags
     self.outlier
     self.missing
-    
+    self.deltas_valid
+
     # Comparisons with previous and following points
     self.delta_previous
     self.delta_following
@@ -29,58 +34,104 @@ class HourlyDataContainer(SimpleContainer):
     self.demand_estimate_outlier
     """
 
+    __slots__ = ('_hour',)
+    COLUMNS = hourly_store.HOURLY_COLUMNS
+
     def __init__(self, hour, uct_time, demand):
 
-        self.hour = hour
-
-        ## Set local hour in region, value is reported in this format: "07/01/2015 1:00:00 AM" 
-        #hour_info = local_hour.split(' ')
-        #pm_adjust = 0 if hour_info[2] == 'AM' else 12
-        #self.daily_hour = int(hour_info[1].split(':')[0]) + pm_adjust #- 1 # -1 for python list indexing
-        self.datetime = datetime.datetime.strptime(uct_time, '%Y%m%dT%HZ')
-        self.uct_string = uct_time
-        self.daily_hour = self.datetime.hour
-        self.demand = demand
-        # Set missing data to a default value
-        if self.demand == 'MISSING' or self.demand == 'EMPTY':
-            self.missing = True
-            self.demand = -99.99
-        else:
-            self.missing = False
+        # Set missing data to NaN
+        missing = demand == 'MISSING' or demand == 'EMPTY'
+        demand = np.nan if missing else float(demand)
 
-        self.demand = float(self.demand)
+        SimpleContainer.__init__(self, uct_time, demand)
+        self._hour = hour
+        self.missing = missing
 
-        SimpleContainer.__init__(self, uct_time, self.demand)
+    def _get(self, name):
+        if name == 'hour':
+            return self._hour
+        return SimpleContainer._get(self, name)
 
-        # Defaults, these will be computed later
-        self.outlier = False # Innocent until proven guilty
-        self.deltas_valid = False # Must pass check before True
-        self.delta_previous = -99.99
-        self.delta_following = -99.99
-        self.daily_avg = -99.99
-        self.centered_average = -99.99
-        self.centered_iqr_average = -99.99
-        self.demand_estimate = -99.99
-        self.demand_estimate_outlier = False
+    def _put(self, name, val):
+        if name == 'hour':
+            self._hour = val
+        else:
+            SimpleContainer._put(self, name, val)
 
     # Print all values
     def __str__(self):
-        return ("HourlyDataContainer: hour %i, raw_demand %s, demand %.1f, missing %s, outlier %s, deltas_valid %s, delta_prev %.1f, delta_follow %.1f" % \
-                (self.hour, self.raw_demand, self.demand, self.missing, self.outlier, self.deltas_valid, self. delta_previous, self.delta_following))
+        return ("HourlyDataContainer: hour %i, raw_demand %.1f, demand %.1f, missing %s, outlier %s, deltas_valid %s, delta_prev %.1f, delta_follow %.1f" % \
+                (self.hour, self.original_value, self.demand, self.missing, self.outlier, self.deltas_valid, self. delta_previous, self.delta_following))
+
+    @property
+    def hour(self):
+        return int(self._get('hour'))
+
+    @property
+    def daily_hour(self):
+        return int(self._get('stamp') % 24)
+
+    @property
+    def demand(self):
+        return self._get('value')
 
     # To reset demand
     def set_demand(self, new_demand):
-        self.demand = new_demand
-        self.set_value(new_demand)
-    def set_value(self, new_demand):
-        self.demand = new_demand
         self.set_value(new_demand)
 
+    @property
+    def outlier(self):
+        return self._get_flag(hourly_store.OUTLIER)
+
+    @outlier.setter
+    def outlier(self, is_outlier):
+        self._set_flag(hourly_store.OUTLIER, is_outlier)
+
+    @property
+    def deltas_valid(self):
+        return self._get_flag(hourly_store.DELTAS_VALID)
+
+    @deltas_valid.setter
+    def deltas_valid(self, valid):
+        self._set_flag(hourly_store.DELTAS_VALID, valid)
+
+    @property
+    def demand_estimate_outlier(self):
+        return self._get_flag(hourly_store.ESTIMATE_OUTLIER)
+
+    @property
+    def delta_previous(self):
+        return self._get('delta_previous')
+
+    @property
+    def delta_following(self):
+        return self._get('delta_following')
+
+    @property
+    def daily_avg(self):
+        return self._get('daily_avg')
+
+    @daily_avg.setter
+    def daily_avg(self, val):
+        self._put('daily_avg', val)
+
+    @property
+    def centered_average(self):
+        return self._get('centered_average')
+
+    @property
+    def centered_iqr_average(self):
+        return self._get('centered_iqr_average')
+
+    @property
+    def demand_estimate(self):
+        return self._get('demand_estimate')
+
     # Compute demand deltas by comparing to previous and following hours
     def compute_deltas(self, previous_data, following_data):
-        
-        assert(type(previous_data) == type(self))
-        assert(type(following_data) == type(self))
+
+        assert(isinstance(previous_data, HourlyDataContainer))
+        assert(isinstance(following_data, HourlyDataContainer))
 
         # Check sequential
         assert(previous_data.hour + 1 == self.hour)
@@ -91,10 +142,12 @@ class HourlyDataContainer(SimpleContainer):
             self.deltas_valid = True
         else:
             self.deltas_valid = False
+            self._put('delta_previous', np.nan)
+            self._put('delta_following', np.nan)
             return
 
-        self.delta_previous = self.demand - previous_data.demand
-        self.delta_following = self.demand - following_data.demand
+        self._put('delta_previous', self.demand - previous_data.demand)
+        self._put('delta_following', self.demand - following_data.demand)
         return
 
 
@@ -104,35 +157,40 @@ class HourlyDataContainer(SimpleContainer):
         self.outlier = is_outlier
         return
 
-        
+
     def set_centered_average(self, val):
 
         assert(type(val) == float or type(val) == np.float64)
-        self.centered_average = val
+        self._put('centered_average', val)
         return
 
 
     def set_centered_iqr_average(self, val):
 
         assert(type(val) == float or type(val) == np.float64)
-        self.centered_iqr_average = val
+        self._put('centered_iqr_average', val)
         return
 
 
     def set_demand_estimate(self, val):
 
         assert(type(val) == float or type(val) == np.float64)
-        self.demand_estimate = val
+        self._put('demand_estimate', val)
         return
 
 
     def set_demand_estimate_outlier(self, outlier=True):
 
         assert(type(outlier) == type(True))
-        self.demand_estimate_outlier = outlier
+        self._set_flag(hourly_store.ESTIMATE_OUTLIER, outlier)
         return
 
 
 
+class HourlyView(RowView, HourlyDataContainer):
+    """ HourlyDataContainer viewing a store row, see SimpleContainer.view() """
+
+    __slots__ = ('_store', '_i')
 
 
+HourlyDataContainer.VIEW = HourlyView
@@ -0,0 +1,294 @@
+import datetime
+import numpy as np
+from collections import OrderedDict
+
+
+# Columnar storage for an hourly series.  Every hour is a row
+# in a set of NumPy columns and the SimpleContainer /
+# HourlyDataContainer objects are small slotted views onto a row.
+#
+# Time is a single integer per hour: hours since 1970-01-01T00Z (UTC).
+# Missing values are NaN, and the per hour booleans are bits
+# in the 'flags' column.
+
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Bits of the 'flags' column
+MISSING = 1
+OUTLIER = 2
+DELTAS_VALID = 4
+ESTIMATE_OUTLIER = 8
+
+# Columns needed by SimpleContainer
+SIMPLE_COLUMNS = OrderedDict([
+    ('stamp', np.int64),
+    ('value', np.float64),
+    ('original_value', np.float64),
+    ('flags', np.uint8),
+])
+
+# Columns needed by HourlyDataContainer
+HOURLY_COLUMNS = OrderedDict(list(SIMPLE_COLUMNS.items()) + [
+    ('hour', np.int64),
+    ('delta_previous', np.float64),
+    ('delta_following', np.float64),
+    ('daily_avg', np.float64),
+    ('centered_average', np.float64),
+    ('centered_iqr_average', np.float64),
+    ('demand_estimate', np.float64),
+])
+
+
+
+# Convert a UTC string in the EIA format, e.g. 20150701T05Z, to an hour stamp
+def uct_to_stamp(uct_time):
+    return datetime_to_stamp(datetime.datetime.strptime(uct_time, '%Y%m%dT%HZ'))
+
+
+# Convert a list of UTC strings in the EIA format to an array of hour stamps
+def uct_to_stamps(uct_times):
+    iso = ['{}-{}-{}T{}'.format(t[0:4], t[4:6], t[6:8], t[9:11]) for t in uct_times]
+    return np.array(iso, dtype='datetime64[h]').astype(np.int64)
+
+
+def datetime_to_stamp(dt):
+    return (dt - EPOCH) // datetime.timedelta(hours=1)
+
+
+def stamp_to_datetime(stamp):
+    return EPOCH + datetime.timedelta(hours=int(stamp))
+
+
+def stamp_to_uct(stamp):
+    return stamp_to_datetime(stamp).strftime('%Y%m%dT%HZ')
+
+
+# Hour stamp for a datetime, datetime64, EIA UTC string or
+# an integer stamp (returned unchanged)
+def to_stamp(ts):
+    if isinstance(ts, str):
+        return uct_to_stamp(ts)
+    if isinstance(ts, datetime.datetime):
+        return datetime_to_stamp(ts)
+    if isinstance(ts, datetime.date):
+        return datetime_to_stamp(datetime.datetime(ts.year, ts.month, ts.day))
+    if isinstance(ts, np.datetime64):
+        return int(ts.astype('datetime64[h]').astype(np.int64))
+    return int(ts)
+
+
+# Month (1 - 12) for an array of hour stamps
+def stamps_to_months(stamps):
+    months = np.asarray(stamps).astype('datetime64[h]').astype('datetime64[M]').astype(np.int64)
+    return months % 12 + 1
+
+
+# Hour of the day (0 - 23) for an array of hour stamps
+def stamps_to_hours(stamps):
+    return np.asarray(stamps) % 24
+
+
+# Year for an array of hour stamps
+def stamps_to_years(stamps):
+    return np.asarray(stamps).astype('datetime64[h]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+
+class HourlyStore :
+    """ Growable columnar storage for an hourly series.
+
+    Columns are NumPy arrays with spare capacity so appending
+    an hour is amortized O(1).  store[name] returns a view of
+    the filled part of a column. """
+
+
+    def __init__(self, columns=HOURLY_COLUMNS, capacity=0):
+
+        self.columns = columns
+        self.n = 0
+        self.version = 0 # Incremented whenever rows are added or removed
+        self._data = OrderedDict()
+        for name, dtype in columns.items():
+            self._data[name] = self._empty(name, dtype, capacity)
+
+
+    # Derived float columns start as NaN, everything else as 0
+    def _empty(self, name, dtype, size):
+        if dtype == np.float64:
+            return np.full(size, np.nan)
+        return np.zeros(size, dtype=dtype)
+
+
+    def __len__(self):
+        return self.n
+
+
+    def __getitem__(self, name):
+        return self._data[name][:self.n]
+
+
+    def __contains__(self, name):
+        return name in self._data
+
+
+    # Ensure room for n_more rows, doubling the capacity when growing
+    def reserve(self, n_more):
+        needed = self.n + n_more
+        capacity = len(self._data['stamp'])
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, 2 * capacity, 16)
+        for name, dtype in self.columns.items():
+            new = self._empty(name, dtype, new_capacity)
+            new[:self.n] = self._data[name][:self.n]
+            self._data[name] = new
+
+
+    # Append hours.  stamps and values are array-like of equal length,
+    # values which are NaN or listed in missing are flagged MISSING.
+    # Returns the row index of the first new hour.
+    def append(self, stamps, values, missing=None):
+        stamps = np.asarray(stamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        assert(len(stamps) == len(values)), "stamps and values must have the same length"
+        if missing is None:
+            missing = np.isnan(values)
+        else:
+            missing = np.asarray(missing, dtype=bool) | np.isnan(values)
+            values = np.where(missing, np.nan, values)
+
+        start = self.n
+        self.reserve(len(stamps))
+        stop = start + len(stamps)
+        self._data['stamp'][start:stop] = stamps
+        self._data['value'][start:stop] = values
+        self._data['original_value'][start:stop] = values
+        self._data['flags'][start:stop] = np.where(missing, MISSING, 0)
+        if 'hour' in self._data:
+            first = self._data['hour'][start-1] + 1 if start > 0 else 0
+            self._data['hour'][start:stop] = np.arange(first, first + len(stamps))
+        self.n = stop
+        self.version += 1
+        return start
+
+
+    # Keep only the rows where mask is True, in place
+    def keep(self, mask):
+        mask = np.asarray(mask, dtype=bool)
+        assert(len(mask) == self.n)
+        for name in self.columns.keys():
+            self._data[name] = self._data[name][:self.n][mask].copy()
+        self.n = int(mask.sum())
+        self.version += 1
+
+
+    # True if the stamps are strictly increasing, which the
+    # time lookups rely on.  Cached until rows change.
+    def is_sorted(self):
+        if getattr(self, '_sorted', None) == None or self._sorted[0] != self.version:
+            stamps = self['stamp']
+            self._sorted = (self.version, bool(np.all(stamps[1:] > stamps[:-1])))
+        return self._sorted[1]
+
+
+    # Row where stamp would be inserted in rows [start, stop),
+    # by binary search
+    def searchsorted(self, stamp, side='left', start=0, stop=None):
+        assert(self.is_sorted()), "Time lookups need the hours in increasing time order"
+        stop = self.n if stop == None else stop
+        return start + int(np.searchsorted(self['stamp'][start:stop], stamp, side))
+
+
+    # Boolean array of a flag bit
+    def flag(self, bit):
+        return (self['flags'] & bit) != 0
+
+
+    # Set a flag bit for rows [start, start + len(values))
+    def set_flag(self, bit, values, start=0):
+        flags = self['flags'][start:start+len(values)]
+        flags &= ~np.uint8(bit)
+        flags |= np.where(values, bit, 0).astype(np.uint8)
+
+
+    # Bytes used by the filled part of the columns
+    def nbytes(self):
+        return sum(self[name].nbytes for name in self.columns.keys())
+
+
+
+class HourlyRecords :
+    """ A read only sequence of record views onto a HourlyStore,
+    this is what DemandData.hourly_data and RenewablesData.hourly_data
+    return.  Records are created when accessed so they cost no memory
+    while not in use, and changes made through them go to the store.
+    Slicing with step 1 returns another HourlyRecords without copying. """
+
+
+    def __init__(self, store, record_class, start=0, stop=None):
+        self.store = store
+        self.record_class = record_class
+        self.start = start
+        self.stop = stop
+
+
+    def _stop(self):
+        return len(self.store) if self.stop == None else min(self.stop, len(self.store))
+
+
+    def __len__(self):
+        return max(0, self._stop() - self.start)
+
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            return HourlyRecords(self.store, self.record_class,
+                    self.start + start, self.start + max(start, stop))
+        n = len(self)
+        if i < 0:
+            i += n
+        if i < 0 or i >= n:
+            raise IndexError("HourlyRecords index out of range")
+        return self.record_class.view(self.store, self.start + i)
+
+
+    def __iter__(self):
+        view = self.record_class.view
+        for i in range(self.start, self._stop()):
+            yield view(self.store, i)
+
+
+    # Time lookups, all binary searches on the stamp column.
+    # Times can be anything hourly_store.to_stamp() accepts.
+
+    # Hours in [start, end), either bound can be None for open ended
+    def slice(self, start=None, end=None):
+        lo, hi = self.start, self._stop()
+        if start != None:
+            lo = self.store.searchsorted(to_stamp(start), 'left', lo, hi)
+        if end != None:
+            hi = self.store.searchsorted(to_stamp(end), 'left', lo, hi)
+        return HourlyRecords(self.store, self.record_class, lo, hi)
+
+
+    # Hours of calendar year y
+    def year(self, y):
+        return self.slice(datetime.datetime(y, 1, 1), datetime.datetime(y + 1, 1, 1))
+
+
+    # Position of the hour at time ts in this sequence, KeyError if absent
+    def index(self, ts):
+        stamp = to_stamp(ts)
+        i = self.store.searchsorted(stamp, 'left', self.start, self._stop())
+        if i == self._stop() or self.store['stamp'][i] != stamp:
+            raise KeyError("No hour at {}".format(ts))
+        return i - self.start
+
+
+    # Record of the hour at time ts, KeyError if absent
+    def loc(self, ts):
+        return self[self.index(ts)]
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import mem_format
+from datetime import datetime
+
+
+# Build long synthetic demand (or capacity factor) histories by
+# repeating an exact N year window of hourly data, as used for
+# multi-decade capacity expansion inputs.
+#
+# Frames use the SEM layout: year, month, day, hour (1 - 24)
+# columns followed by any number of value columns.
+#
+# Example, 1980 - 2018 from the 4 years starting 2015-08-01:
+#   df = mem_format.read_mem_csv('US_demand_unnormalized.csv')
+#   window = cut_years(df, datetime(2015, 8, 1), 4)
+#   write_looped_file(window, 'looped.csv', 1980, 2018)
+
+
+
+def is_leap(years):
+    years = np.asarray(years)
+    return (years % 4 == 0) & ((years % 100 != 0) | (years % 400 == 0))
+
+
+
+# datetime64[h] of the start of each row's hour
+def sem_datetimes(df):
+    return mem_format.mem_datetimes(df, hour_ending=False)
+
+
+
+# Rows of df from start up to, not including, the same date
+# and hour n_years later.  df must be in time order.
+def cut_years(df, start, n_years):
+    assert(not (start.month == 2 and start.day == 29)), "Start the window on a date which exists every year"
+    end = start.replace(year=start.year + n_years)
+    times = sem_datetimes(df)
+    assert(np.all(times[1:] > times[:-1])), "cut_years needs rows in increasing time order"
+    lo, hi = np.searchsorted(times, np.array([start, end], dtype='datetime64[h]'))
+    window = df.iloc[lo:hi].reset_index(drop=True)
+
+    expected = (end - start).days * 24
+    if len(window.index) != expected:
+        print("WARNING: cut_years found {} hours between {} and {}, expected {}".format(
+                len(window.index), start, end, expected))
+    return window
+
+
+
+# Copy of window with all years moved by shift years.  Feb 29
+# is dropped when it lands in a non-leap year and Feb 28 is
+# repeated as Feb 29 when a non-leap year lands in a leap year.
+def shift_years(window, shift):
+    years = window['year'].values
+    new_years = years + shift
+    feb_28 = (window['month'].values == 2) & (window['day'].values == 28)
+    feb_29 = (window['month'].values == 2) & (window['day'].values == 29)
+
+    keep = ~(feb_29 & ~is_leap(new_years))
+    shifted = window[keep].copy()
+    shifted['year'] = new_years[keep]
+
+    add = feb_28 & is_leap(new_years) & ~is_leap(years)
+    if np.any(add):
+        extra = window[add].copy()
+        extra['year'] = new_years[add]
+        extra['day'] = 29
+        shifted = pd.concat([shifted, extra])
+        shifted = shifted.iloc[np.argsort(sem_datetimes(shifted), kind='stable')]
+    return shifted.reset_index(drop=True)
+
+
+
+# Write window, a cut_years() output, repeated back to back to
+# cover first_year through last_year inclusive.  Only one shifted
+# copy of the window is in memory at a time, it is appended to
+# the output in chunks of chunk_rows rows.  Returns the number
+# of rows written.
+def write_looped_file(window, path, first_year, last_year, chunk_rows=100000):
+    assert(len(window.index) > 0), "Empty window"
+    times = sem_datetimes(window)
+    start = times[0].astype(datetime)
+    n_years = int(round((times[-1] - times[0] + 1).astype(np.int64) / (365.2425 * 24)))
+    assert(n_years > 0), "The window must cover at least one year"
+
+    # Shifts, in time order, whose copy reaches into the requested years
+    first_shift = (first_year - start.year - n_years) // n_years * n_years
+    shifts = [s for s in range(first_shift, last_year - start.year + 1, n_years)
+            if start.year + s <= last_year and start.year + s + n_years >= first_year]
+
+    n_written = 0
+    with open(path, 'w', newline='') as out:
+        for shift in shifts:
+            block = shift_years(window, shift)
+            years = block['year'].values
+            block = block[(years >= first_year) & (years <= last_year)]
+            for i in range(0, len(block.index), chunk_rows):
+                block.iloc[i:i+chunk_rows].to_csv(out, index=False, header=(n_written == 0))
+                n_written += len(block.index[i:i+chunk_rows])
+    return n_written
+
+
+
+# Positions i where row i does not follow row i-1 by exactly one hour
+def find_gaps(df):
+    hours = sem_datetimes(df).astype(np.int64)
+    return np.nonzero(np.diff(hours) != 1)[0] + 1
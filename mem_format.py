@@ -0,0 +1,198 @@
+import numpy as np
+from collections import OrderedDict
+
+
+# Conversion to and from the MEM / SEM input format:
+#   year, month, day, hour, value columns...
+# with hours counted 1 - 24.  MEM hour h of a day is the hour
+# starting at h-1:00 and ending at h:00, so hour 24 ends at
+# midnight of the next day.
+#
+# Time labels elsewhere come in two conventions, chosen with
+# hour_ending:
+#   hour_ending=True  : the label is the end of the hour, like the
+#                       EIA UTC times in DemandData and the cleaned
+#                       demand files ('2015-07-03 00:00' <-> 2015,7,2,24)
+#   hour_ending=False : the label is the start of the hour, like
+#                       RenewablesData and sem_time ('2015-07-02 23:00'
+#                       <-> 2015,7,2,24)
+#
+# All conversions work on whole arrays.  pandas is only needed
+# for the DataFrame helpers.
+#
+# Example:
+#   export_mem(demand_data, 'ERCO_for_MEM.csv')
+#   df = read_mem_csv('US_demand_unnormalized.csv')
+
+
+
+ONE_HOUR = np.timedelta64(1, 'h')
+
+
+
+# year, month, day, hour (1 - 24) integer arrays for an array of
+# datetime64 (or anything np.datetime64 accepts) hour labels
+def to_mem(times, hour_ending=True):
+    start = np.asarray(times).astype('datetime64[h]')
+    if hour_ending:
+        start = start - ONE_HOUR
+    days = start.astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    years = months.astype('datetime64[Y]')
+    return years.astype(np.int64) + 1970, \
+            months.astype(np.int64) % 12 + 1, \
+            (days - months).astype(np.int64) + 1, \
+            (start - days).astype(np.int64) + 1
+
+
+
+# datetime64[h] hour labels for year, month, day, hour (1 - 24) arrays
+def from_mem(year, month, day, hour, hour_ending=True):
+    year = np.asarray(year, dtype=np.int64)
+    month = np.asarray(month, dtype=np.int64)
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (np.asarray(day, dtype=np.int64) - 1)
+    start = days.astype('datetime64[h]') + (np.asarray(hour, dtype=np.int64) - 1)
+    return start + ONE_HOUR if hour_ending else start
+
+
+
+# Hour start datetime64[h] for SEM style UTC strings, 'YYYYmmddTHHZ'
+# with HH from 01 to 24.  Whole array version of
+# uncertainty_tools.sem_time followed by strptime.
+def sem_strings_to_datetimes(uct_times):
+    chars = np.asarray(uct_times).astype('S12')
+    digits = np.frombuffer(chars.tobytes(), dtype=np.uint8).reshape(-1, 12).astype(np.int64) - ord('0')
+    number = lambda a, b: digits[:, a:b].dot(10 ** np.arange(b - a - 1, -1, -1))
+    return from_mem(number(0, 4), number(4, 6), number(6, 8), number(9, 11), hour_ending=False)
+
+
+
+# datetime64[h] for the year, month, day, hour columns of a DataFrame
+def mem_datetimes(df, hour_ending=True):
+    return from_mem(df['year'].values, df['month'].values, df['day'].values,
+            df['hour'].values, hour_ending)
+
+
+
+# Lines to skip before the header of a MEM input file.  Lines
+# above 'BEGIN_DATA' are comments and the line after it is the
+# header, files without the marker start with the header.
+def data_start(path):
+    skip = 0
+    with open(path) as f:
+        for line in f:
+            skip += 1
+            if line.startswith('BEGIN_DATA'):
+                return skip
+    return 0
+
+
+
+# Read a MEM input file as a DataFrame
+def read_mem_csv(path):
+    import pandas as pd
+    return pd.read_csv(path, skiprows=data_start(path))
+
+
+
+# Column names of a MEM input file
+def mem_columns(path):
+    import pandas as pd
+    return list(pd.read_csv(path, skiprows=data_start(path), nrows=0).columns)
+
+
+
+# Read a MEM input file as DataFrames of chunk_rows hours, with
+# only the time columns and value columns usecols if given
+def read_mem_chunks(path, chunk_rows=2000, usecols=None, dtype=None):
+    import pandas as pd
+    if usecols != None:
+        usecols = ['year', 'month', 'day', 'hour'] + [c for c in usecols if c not in ['year', 'month', 'day', 'hour']]
+    return pd.read_csv(path, skiprows=data_start(path), usecols=usecols, dtype=dtype, chunksize=chunk_rows)
+
+
+
+# Format a column as strings, NaN as na_rep
+def _format_column(values, fmt, na_rep):
+    values = np.asarray(values)
+    if values.dtype.kind in 'iub':
+        return values.astype(str)
+    out = np.char.mod(fmt, values)
+    out[np.isnan(values)] = na_rep
+    return out
+
+
+
+# Write hour labels and value columns in MEM format.
+# times       : datetime64 hour labels, see hour_ending
+# columns     : OrderedDict column name -> array
+# fmt         : printf format of the values, a str or a dict per column
+# comments    : lines written above a 'BEGIN_DATA' marker, None for
+#               a plain CSV starting with the header
+# Rows are formatted a chunk at a time and each chunk is one write.
+def write_mem_csv(path, times, columns, hour_ending=True, fmt='%.10g', na_rep='NA',
+        comments=None, chunk_rows=100000):
+    years, months, days, hours = to_mem(times, hour_ending)
+    for name, values in columns.items():
+        assert(len(values) == len(years)), "Column {} has {} values for {} hours".format(name, len(values), len(years))
+
+    with open(path, 'w', newline='') as f:
+        if comments != None:
+            for line in comments:
+                f.write(line + '\n')
+            f.write('BEGIN_DATA\n')
+        f.write(','.join(['year', 'month', 'day', 'hour'] + list(columns.keys())) + '\n')
+
+        for start in range(0, len(years), chunk_rows):
+            stop = start + chunk_rows
+            cols = [years[start:stop].astype(str), months[start:stop].astype(str),
+                    days[start:stop].astype(str), hours[start:stop].astype(str)]
+            for name, values in columns.items():
+                col_fmt = fmt[name] if isinstance(fmt, dict) else fmt
+                cols.append(_format_column(values[start:stop], col_fmt, na_rep))
+            f.write('\n'.join(map(','.join, zip(*[col.tolist() for col in cols]))) + '\n')
+
+
+
+# Hour labels and value columns of a DemandData, RenewablesData
+# or DataFrame.  Returns (times, columns, hour_ending).
+# value_fields : DataFrame column names, or a dict of output name ->
+#                DataFrame column name.  Ignored for DemandData and
+#                RenewablesData, which export their current values.
+def mem_series(source, value_fields=None, date_time_field='date_time', hour_ending=None):
+    if hasattr(source, 'store'):
+        times = source.store['stamp'].astype('datetime64[h]')
+        if hour_ending == None:
+            hour_ending = source.HOUR_ENDING
+        return times, OrderedDict([(source.MEM_VALUE_NAME.format(source=source),
+                source.store['value'].copy())]), hour_ending
+
+    import pandas as pd
+    times = pd.to_datetime(source[date_time_field], utc=True).dt.tz_localize(None).values
+    if value_fields == None:
+        value_fields = [c for c in source.columns if c != date_time_field]
+    if not isinstance(value_fields, dict):
+        value_fields = OrderedDict((name, name) for name in value_fields)
+    columns = OrderedDict((out, source[name].values.astype(np.float64)) for out, name in value_fields.items())
+    return times, columns, True if hour_ending == None else hour_ending
+
+
+
+# Export a DemandData, RenewablesData or DataFrame to a MEM file,
+# see mem_series() and write_mem_csv() for the options
+def export_mem(source, path, value_fields=None, date_time_field='date_time', hour_ending=None, **kwargs):
+    times, columns, hour_ending = mem_series(source, value_fields, date_time_field, hour_ending)
+    write_mem_csv(path, times, columns, hour_ending, **kwargs)
+    print("Outfile: {}".format(path))
+
+
+
+# (UTC string, value) records of one column of a MEM file, the
+# input DemandData(region, records) takes
+def read_mem_records(path, value_field, hour_ending=True):
+    df = read_mem_csv(path)
+    stamps = mem_datetimes(df, hour_ending)
+    uct = np.datetime_as_string(stamps, unit='h')
+    uct = np.char.add(np.char.replace(uct, '-', ''), 'Z')
+    return list(zip(uct.tolist(), df[value_field].values.tolist()))
@@ -0,0 +1,268 @@
+import os
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+# Tools for the multiple imputation (MICE) output files.
+#
+# A MICE master file stacks every imputation chain in one CSV with
+# an 'imp_index' column numbering the chain.  split_chains() reads
+# it once, in chunks, and writes one CSV per chain.
+#
+# lag_frame() builds the lagged regional demand columns the
+# imputation regresses on, e.g. CISO ~ CISO_Lag1 + TIDC + TIDC_Lag1.
+#
+# impute_chains() runs the multiple imputation itself: every chain
+# fills the missing and screened hours by chained regressions of
+# each region on the other regions and the lagged values of all
+# regions.  Chains run in parallel processes, each with its own
+# seeded random stream, and are stored in one float32 .npy file.
+#
+# Example, the overimputation files:
+#   split_chains(base+'all_overimpute_..._MASTER_v12_2day_0_mice.csv',
+#           base+'imp_0_chain_{chain}.csv')
+
+
+
+# Write one group of rows to its chain file, adding the
+# header when the file is new
+def _write_group(out, group, header):
+    group.to_csv(out, index=False, header=header, na_rep='NA')
+    return len(group.index)
+
+
+
+# Split a MICE master file by chain in a single pass.
+# master_path  : the stacked MICE output
+# out_pattern  : output path with a {chain} field, e.g. 'imp_0_chain_{chain}.csv'
+# column       : column numbering the chains
+# chunk_rows   : rows read at a time, memory holds at most two chunks
+# n_writers    : threads writing chain files in parallel, default one per CPU
+# Values are copied as text so numbers are written exactly as read.
+# Returns an OrderedDict chain -> rows written, in order of appearance.
+def split_chains(master_path, out_pattern, column='imp_index', chunk_rows=200000, n_writers=None):
+    assert('{chain}' in out_pattern), "out_pattern needs a {chain} field"
+    if n_writers == None:
+        n_writers = os.cpu_count() or 1
+
+    reader = pd.read_csv(master_path, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+    files = OrderedDict()
+    counts = OrderedDict()
+    pending = []
+    try:
+        with ThreadPoolExecutor(max_workers=n_writers) as pool:
+            for chunk in reader:
+                assert(column in chunk.columns), "{} has no {} column".format(master_path, column)
+
+                # Finish the previous chunk's writes before queuing more so
+                # rows stay in order and at most two chunks are in memory
+                for chain, future in pending:
+                    counts[chain] = counts.get(chain, 0) + future.result()
+                pending = []
+
+                # One stable sort groups the rows of every chain
+                chains, first, inverse, sizes = np.unique(chunk[column].values,
+                        return_index=True, return_inverse=True, return_counts=True)
+                grouped = chunk.iloc[np.argsort(inverse.reshape(-1), kind='stable')]
+                starts = np.concatenate(([0], np.cumsum(sizes)))
+                for i in np.argsort(first):
+                    chain = chains[i]
+                    header = chain not in files
+                    if header:
+                        files[chain] = open(out_pattern.format(chain=chain), 'w', newline='')
+                    group = grouped.iloc[starts[i]:starts[i+1]]
+                    pending.append((chain, pool.submit(_write_group, files[chain], group, header)))
+
+            for chain, future in pending:
+                counts[chain] = counts.get(chain, 0) + future.result()
+    finally:
+        for out in files.values():
+            out.close()
+    return counts
+
+
+
+# Lagged copies of hours x regions values without copying per lag.
+# The values are copied once into a NaN padded buffer and every lag
+# is a view into it, so lag L of column j at hour t is values[t-L, j]
+# and hours before the start (or after the end, for negative lags,
+# i.e. leads) are NaN instead of wrapping around like np.roll.
+# Returns an OrderedDict lag -> hours x regions view.
+def lag_views(values, lags, dtype=np.float64):
+    values = np.asarray(values)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+    n_hours = values.shape[0]
+    before = max(max(lags), 0)
+    after = max(-min(lags), 0)
+    buffer = np.full((before + n_hours + after, values.shape[1]), np.nan, dtype=dtype)
+    buffer[before:before + n_hours] = values
+    return OrderedDict((lag, buffer[before - lag:before - lag + n_hours]) for lag in lags)
+
+
+
+# Name of a lagged column, 'CISO', 'CISO_Lag1' or 'CISO_Lead1'
+def lag_name(name, lag):
+    if lag == 0:
+        return name
+    return '{}_{}{}'.format(name, 'Lag' if lag > 0 else 'Lead', abs(lag))
+
+
+
+# hours x (regions * lags) feature matrix filled in one preallocated
+# array, the columns of each region grouped together in lags order.
+# float32 halves the memory for many regions and lags.
+def lag_matrix(values, lags=(0, 1), dtype=np.float64):
+    views = lag_views(values, lags, dtype)
+    first = next(iter(views.values()))
+    n_hours, n_regions = first.shape
+    out = np.empty((n_hours, n_regions, len(lags)), dtype=dtype)
+    for i, view in enumerate(views.values()):
+        out[:, :, i] = view
+    return out.reshape(n_hours, n_regions * len(lags))
+
+
+
+# Lagged features of every column of df as the DataFrame the
+# imputation takes, columns named by lag_name() and keeping df's index
+def lag_frame(df, lags=(0, 1), dtype=np.float64):
+    matrix = lag_matrix(df.values, lags, dtype)
+    columns = [lag_name(name, lag) for name in df.columns for lag in lags]
+    return pd.DataFrame(matrix, index=df.index, columns=columns, copy=False)
+
+
+
+# Columns of the chained regression features for region j:
+# every other region now and every region at each lag
+def _feature_columns(views, j):
+    cols = [np.delete(views[0], j, axis=1)]
+    cols += [views[lag] for lag in views.keys() if lag != 0]
+    return np.concatenate(cols, axis=1)
+
+
+
+# One chain of multiple imputation by chained equations.
+# values : hours x regions, NaN where missing
+# impute : hours x regions bool, the hours to fill (missing or screened)
+# The data are standardized, missing hours start as random observed
+# values of their region, then each iteration regresses every region
+# on its features over its observed hours and redraws its imputed
+# hours from the posterior predictive of a Bayesian linear
+# regression (R mice 'norm').  Hours outside the series count as
+# the mean for the lagged features.
+def impute_chain(values, impute, lags=(1, -1), n_iter=10, seed=None):
+    rng = np.random.default_rng(seed)
+    values = np.array(values, dtype=np.float64)
+    impute = np.asarray(impute, dtype=bool) | np.isnan(values)
+    n_hours, n_regions = values.shape
+    observed = ~impute
+    assert(np.all(observed.sum(axis=0) > 1)), "Every region needs observed hours to impute from"
+
+    mean = np.array([values[observed[:, j], j].mean() for j in range(n_regions)])
+    std = np.array([values[observed[:, j], j].std() for j in range(n_regions)])
+    std[std == 0.] = 1.
+
+    # Padded with 0 (the mean) so lagged features exist everywhere,
+    # the lag views see every update of filled
+    all_lags = [0] + [lag for lag in lags if lag != 0]
+    before = max(max(all_lags), 0)
+    buffer = np.zeros((before + n_hours + max(-min(all_lags), 0), n_regions))
+    filled = buffer[before:before + n_hours]
+    filled[:] = (values - mean) / std
+    for j in range(n_regions):
+        obs = filled[observed[:, j], j]
+        filled[impute[:, j], j] = rng.choice(obs, size=impute[:, j].sum())
+    views = OrderedDict((lag, buffer[before - lag:before - lag + n_hours]) for lag in all_lags)
+
+    for it in range(n_iter):
+        for j in range(n_regions):
+            if not np.any(impute[:, j]):
+                continue
+            x = _feature_columns(views, j)
+            x = np.concatenate((np.ones((n_hours, 1)), x), axis=1)
+            x_obs = x[observed[:, j]]
+            y_obs = filled[observed[:, j], j]
+
+            # Small ridge keeps collinear regions solvable
+            xtx = x_obs.T @ x_obs
+            xtx[np.diag_indices_from(xtx)] += 1e-6 * len(y_obs)
+            chol = np.linalg.cholesky(xtx)
+            beta = np.linalg.solve(xtx, x_obs.T @ y_obs)
+            resid = y_obs - x_obs @ beta
+            dof = max(len(y_obs) - x.shape[1], 1)
+            sigma = np.sqrt(resid @ resid / rng.chisquare(dof))
+            beta = beta + sigma * np.linalg.solve(chol.T, rng.standard_normal(len(beta)))
+
+            x_mis = x[impute[:, j]]
+            filled[impute[:, j], j] = x_mis @ beta + sigma * rng.standard_normal(len(x_mis))
+
+    out = filled * std + mean
+    out[observed] = values[observed]
+    return out
+
+
+
+# Run one chain, for the process pool
+def _run_chain(args):
+    values, impute, lags, n_iter, seed = args
+    return impute_chain(values, impute, lags, n_iter, seed)
+
+
+
+# Several independent imputation chains.
+# values    : hours x regions, NaN where missing
+# impute    : optional hours x regions bool of screened hours to
+#             re-impute, missing hours are always imputed
+# n_chains  : number of chains, each seeded from seed by SeedSequence
+#             so results do not depend on n_workers
+# n_workers : processes running chains, default one per CPU, 1 runs
+#             the chains in this process
+# out_path  : optional .npy file, the chains are written into it as
+#             they finish and the memory mapped file is returned
+# Returns a n_chains x hours x regions array of dtype.
+def impute_chains(values, impute=None, n_chains=20, lags=(1, -1), n_iter=10, seed=0,
+        n_workers=None, out_path=None, dtype=np.float32):
+    values = np.asarray(values, dtype=np.float64)
+    if impute is None:
+        impute = np.zeros(values.shape, dtype=bool)
+    seeds = np.random.SeedSequence(seed).spawn(n_chains)
+    tasks = [(values, impute, lags, n_iter, s) for s in seeds]
+
+    shape = (n_chains,) + values.shape
+    if out_path != None:
+        chains = np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype, shape=shape)
+    else:
+        chains = np.empty(shape, dtype=dtype)
+
+    if n_workers == None:
+        n_workers = os.cpu_count() or 1
+    if n_workers == 1:
+        results = map(_run_chain, tasks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=min(n_workers, n_chains))
+        results = pool.map(_run_chain, tasks)
+    try:
+        for i, chain in enumerate(results):
+            chains[i] = chain
+    finally:
+        if n_workers != 1:
+            pool.shutdown()
+
+    if out_path != None:
+        chains.flush()
+        print("Outfile: {}, {} chains".format(out_path, n_chains))
+    return chains
+
+
+
+# impute_chains() for a DataFrame of region columns, e.g. a MICE
+# master file, with flagged an optional same shape bool frame or
+# array of screened hours.  Chain i as a frame:
+#   pd.DataFrame(chains[i], index=df.index, columns=regions)
+def impute_frame(df, regions, flagged=None, **kwargs):
+    values = df[regions].values.astype(np.float64)
+    if flagged is not None:
+        flagged = np.asarray(flagged, dtype=bool)
+    return impute_chains(values, flagged, **kwargs)
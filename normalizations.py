@@ -0,0 +1,163 @@
+import os
+import numpy as np
+from collections import OrderedDict
+import calendar_cube
+
+
+# Registry of the annual, monthly and 24hr x 52week normalizations
+# for each energy ('demand', 'wind', 'solar', ...) and region.
+#
+# Each normalization is saved once as a plain typed .npy array (no
+# pickled objects) and loaded memory mapped.  Loaded arrays are kept
+# per registry, so every loader sharing registry(directory) reads a
+# file once and later lookups only cost a dict access.
+#
+#   annual        : structured array (year, n_hours, sum, mean), sorted by year
+#   monthly       : structured array (year, mean[12]), sorted by year
+#   24hr_x_52week : float64 52 x 24 table, see time_helpers.get_24hr_x_52week_info()
+#
+# Files are named normalization_{kind}_{energy}[_{region}].npy, the
+# names time_helpers always used.
+#
+# Example:
+#   norms = registry()
+#   norms.compute(renewables.hourly_data, 'wind')
+#   full = norms.annual_means('wind', years) * norms.table('wind')[weeks, hours]
+
+
+
+KINDS = ['annual', 'monthly', '24hr_x_52week']
+
+ANNUAL_DTYPE = np.dtype([('year', np.int64), ('n_hours', np.int64), ('sum', np.float64), ('mean', np.float64)])
+MONTHLY_DTYPE = np.dtype([('year', np.int64), ('mean', np.float64, (12,))])
+
+
+
+# Structured annual array from calculate_annaul_averages() output,
+# year -> [n_hours, sum, mean]
+def annual_array(annual_info):
+    years = sorted(annual_info.keys())
+    return np.array([(year,) + tuple(annual_info[year]) for year in years], dtype=ANNUAL_DTYPE)
+
+
+
+# Structured monthly array from calculate_monthly_averages() output,
+# year -> month name -> mean
+def monthly_array(monthly_vals):
+    years = sorted(monthly_vals.keys())
+    return np.array([(year, [monthly_vals[year].get(m, np.nan) for m in calendar_cube.MONTHS])
+            for year in years], dtype=MONTHLY_DTYPE)
+
+
+
+# OrderedDict year -> [n_hours, sum, mean] from an annual array, the
+# calculate_annaul_averages() form
+def annual_dict(annual):
+    return OrderedDict((int(row['year']), [int(row['n_hours']), float(row['sum']), float(row['mean'])])
+            for row in annual)
+
+
+
+class NormalizationRegistry :
+    """ Normalization arrays saved in and loaded from one directory,
+    see the module description. """
+
+    def __init__(self, directory='.'):
+        self.directory = directory
+        self._loaded = {}
+
+
+    def path(self, kind, energy, region=''):
+        assert(kind in KINDS), "Unknown normalization kind {}, use one of {}".format(kind, KINDS)
+        name = 'normalization_{}_{}'.format(kind, energy)
+        if region != '':
+            name += '_{}'.format(region)
+        return os.path.join(self.directory, name + '.npy')
+
+
+    def exists(self, kind, energy, region=''):
+        return os.path.exists(self.path(kind, energy, region))
+
+
+    def save(self, kind, energy, array, region=''):
+        path = self.path(kind, energy, region)
+        if self.directory != '':
+            os.makedirs(self.directory, exist_ok=True)
+        np.save(path, np.asarray(array), allow_pickle=False)
+        self._loaded.pop(path, None)
+        return path
+
+
+    # Memory mapped array, cached until the file changes.  Files from
+    # before the registry held a pickled OrderedDict, those are
+    # converted and rewritten once.
+    def load(self, kind, energy, region=''):
+        path = self.path(kind, energy, region)
+        assert(os.path.exists(path)), "No {} normalization for {} {}, compute it first: {}".format(
+                kind, energy, region, path)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._loaded.get(path)
+        if cached != None and cached[0] == mtime:
+            return cached[1]
+
+        try:
+            array = np.load(path, mmap_mode='r', allow_pickle=False)
+        except ValueError:
+            print("Converting pickled normalization {} to a typed array".format(path))
+            legacy = np.load(path, allow_pickle=True).item()
+            self.save(kind, energy, annual_array(legacy) if kind == 'annual' else monthly_array(legacy), region)
+            return self.load(kind, energy, region)
+
+        self._loaded[path] = (mtime, array)
+        return array
+
+
+    # Compute and save every normalization of hourly_data.
+    # Returns the paths written.
+    def compute(self, hourly_data, energy, region=''):
+        import time_helpers
+        paths = [
+            self.save('annual', energy, annual_array(time_helpers.calculate_annaul_averages(hourly_data)), region),
+            self.save('monthly', energy, monthly_array(time_helpers.calculate_monthly_averages(hourly_data)), region),
+            self.save('24hr_x_52week', energy, time_helpers.get_24hr_x_52week_info(hourly_data, energy), region),
+        ]
+        return paths
+
+
+    # compute() only if some normalization is not saved yet
+    def ensure(self, hourly_data, energy, region=''):
+        if not all(self.exists(kind, energy, region) for kind in KINDS):
+            self.compute(hourly_data, energy, region)
+
+
+    # Annual means for an array of years, NaN for years without one
+    def annual_means(self, energy, years, region=''):
+        annual = self.load('annual', energy, region)
+        years = np.asarray(years, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(annual['year'], years), len(annual) - 1)
+        return np.where(annual['year'][idx] == years, annual['mean'][idx], np.nan)
+
+
+    # Monthly means for arrays of years and months (1 - 12)
+    def monthly_means(self, energy, years, months, region=''):
+        monthly = self.load('monthly', energy, region)
+        years = np.asarray(years, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(monthly['year'], years), len(monthly) - 1)
+        means = monthly['mean'][idx, np.asarray(months, dtype=np.int64) - 1]
+        return np.where(monthly['year'][idx] == years, means, np.nan)
+
+
+    # The 52 x 24 week and hour table
+    def table(self, energy, region=''):
+        return self.load('24hr_x_52week', energy, region)
+
+
+
+_REGISTRIES = {}
+
+# The shared registry of a directory
+def registry(directory='.'):
+    key = os.path.abspath(directory)
+    if key not in _REGISTRIES:
+        _REGISTRIES[key] = NormalizationRegistry(directory)
+    return _REGISTRIES[key]
@@ -4,6 +4,9 @@
 for YEAR in {2002..2019}; do
     for MONTH in 01 02 03 04 05 06 07 08 09 10 11 12; do
         curl mis.nyiso.com/public/csv/palIntegrated/${YEAR}${MONTH}01palIntegrated_csv.zip --output nyiso_${YEAR}${MONTH}.zip
+        # The master file notebook reads the extracted directories, where the
+        # DST fixes are made by hand.  nyiso_tools.build_master_file(...,
+        # archives=True) can read the zip files directly instead.
         mkdir nyiso_${YEAR}${MONTH}
         unzip nyiso_${YEAR}${MONTH}.zip -d nyiso_${YEAR}${MONTH}
     done
@@ -0,0 +1,236 @@
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Build the NYISO state wide demand master file from the daily
+# palIntegrated CSVs fetched by nyiso_dem/NYISO_download_and_unzip.sh
+# (one directory nyiso_YYYYMM per month, one YYYYMMDD*.csv per day).
+#
+# Every daily file is read by a pool of threads, then all rows are
+# processed together: local time + EST/EDT tag to UTC, duplicate
+# region entries resolved, regions summed per hour, missing hours
+# inserted and gaps linearly interpolated.
+#
+# The daily files can also be read straight out of the monthly
+# nyiso_YYYYMM.zip archives without extracting them, see read_archives().
+#
+# Example, from inside nyiso_dem/:
+#   build_master_file('.', 2004, 2019, 'demand_summary_2004-2020.csv')
+#   build_master_file('.', 2004, 2019, 'demand_summary_2004-2020.csv',
+#           archives=True, cache_dir='zip_cache')
+
+
+# Hours to add to the local time for each Time Zone tag
+UTC_OFFSETS = {'EST' : 5, 'EDT' : 4}
+
+DEMAND = 'nyiso demand (MW)'
+
+
+
+# Daily files for years start_year through end_year, skipping
+# the '_OLD' copies kept for reference
+def daily_files(base_dir, start_year, end_year):
+    files = []
+    for year in range(start_year, end_year + 1):
+        for month in range(1, 13):
+            for f in sorted(glob(os.path.join(base_dir, 'nyiso_{}{:02}'.format(year, month), '{}*.csv'.format(year)))):
+                if '_OLD' in f:
+                    continue
+                files.append(f)
+    return files
+
+
+
+# Monthly archives for years start_year through end_year
+def archive_files(base_dir, start_year, end_year):
+    files = []
+    for year in range(start_year, end_year + 1):
+        for month in range(1, 13):
+            f = os.path.join(base_dir, 'nyiso_{}{:02}.zip'.format(year, month))
+            if os.path.exists(f):
+                files.append(f)
+    return files
+
+
+
+# fname is a path or an open file object
+def _read_daily(fname):
+    return pd.read_csv(fname, usecols=['Time Stamp', 'Time Zone', 'Name', 'Integrated Load'],
+            dtype={'Time Stamp': str, 'Time Zone': str, 'Name': str, 'Integrated Load': np.float64})
+
+
+
+# Cache file for an archive, keyed on its name, size and
+# modification time so a re-downloaded archive is parsed again
+def _cache_path(cache_dir, zip_path):
+    info = os.stat(zip_path)
+    name = os.path.basename(zip_path)
+    return os.path.join(cache_dir, '{}.{}.{}.pkl'.format(name, info.st_size, info.st_mtime_ns))
+
+
+
+# All daily CSVs in one zip archive, parsed as streams straight
+# from the archive in member name order.  With cache_dir the
+# parsed frame is saved there and reused on the next call.
+def read_archive(zip_path, cache_dir=None):
+    if cache_dir != None:
+        cache = _cache_path(cache_dir, zip_path)
+        if os.path.exists(cache):
+            return pd.read_pickle(cache)
+
+    dfs = []
+    with zipfile.ZipFile(zip_path) as zf:
+        names = sorted(n for n in zf.namelist() if n.endswith('.csv') and '_OLD' not in n)
+        for name in names:
+            with zf.open(name) as member:
+                dfs.append(_read_daily(member))
+    assert(len(dfs) > 0), "No daily CSVs in {}".format(zip_path)
+    df = pd.concat(dfs, ignore_index=True)
+
+    if cache_dir != None:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_pickle(cache)
+    return df
+
+
+
+# All daily files of several archives in one frame, in archive
+# order, each archive parsed by its own thread.  Nothing is
+# extracted to disk.
+def read_archives(zip_paths, n_workers=None, cache_dir=None):
+    if n_workers == None:
+        n_workers = min(32, 4 * (os.cpu_count() or 1))
+    assert(len(zip_paths) > 0), "No archives to read"
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        dfs = list(pool.map(lambda f: read_archive(f, cache_dir), zip_paths))
+    return pd.concat(dfs, ignore_index=True)
+
+
+
+# All daily files in one frame, in file order, read in parallel
+def read_daily_files(files, n_workers=None):
+    if n_workers == None:
+        n_workers = min(32, 4 * (os.cpu_count() or 1))
+    assert(len(files) > 0), "No files to read"
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        dfs = list(pool.map(_read_daily, files))
+    return pd.concat(dfs, ignore_index=True)
+
+
+
+# UTC datetime64[ns] for NYISO local time stamps ('%m/%d/%Y %H:%M:%S')
+# and their EST / EDT tags, in one vectorized pass.  The tag decides
+# the offset, which is what resolves the repeated hour in the Fall.
+def to_utc(time_stamps, time_zones):
+    time_zones = pd.Series(time_zones).values
+    unknown = ~np.isin(time_zones, list(UTC_OFFSETS.keys()))
+    assert(not np.any(unknown)), "Unknown Time Zone tags {}".format(set(time_zones[unknown]))
+    local = pd.to_datetime(pd.Series(time_stamps).values, format='%m/%d/%Y %H:%M:%S').values
+    offsets = np.where(time_zones == 'EDT', UTC_OFFSETS['EDT'], UTC_OFFSETS['EST'])
+    return local + offsets.astype('timedelta64[h]')
+
+
+
+# Combine multiple entries for one region and hour.  Zero
+# values are treated as placeholders: the non-zero values are
+# averaged, and the hour is 0 only if every entry is 0.
+def _resolve_duplicates(raw):
+    load = raw['Integrated Load']
+    nonzero = load.where(load != 0)
+    keys = [raw['date_time'], raw['Name']]
+    resolved = nonzero.groupby(keys, sort=False).mean()
+    n_entries = load.groupby(keys, sort=False).size()
+    n_nonzero = (load != 0).groupby(keys, sort=False).sum()
+    resolved[n_nonzero == 0] = 0.
+    # Entries which are NaN keep the hour NaN
+    resolved[load.isna().groupby(keys, sort=False).any()] = np.nan
+
+    n_dup = int((n_entries > 1).sum())
+    if n_dup > 0:
+        print("Resolved {} duplicate region entries".format(n_dup))
+    return resolved
+
+
+
+# Linearly interpolate NaN gaps between two valid values,
+# leading and trailing gaps are left NaN.  Only gaps of at most
+# max_gap values are filled if max_gap is given.
+def interpolate_gaps(values, max_gap=None):
+    values = np.array(values, dtype=np.float64)
+    missing = np.isnan(values)
+    valid = np.nonzero(~missing)[0]
+    if len(valid) < 2 or not np.any(missing):
+        return values
+
+    idx = np.arange(len(values))
+    inside = missing & (idx > valid[0]) & (idx < valid[-1])
+    if max_gap != None:
+        # Length of the gap each missing value belongs to
+        after = np.searchsorted(valid, idx)
+        gap_length = valid[np.minimum(after, len(valid) - 1)] - valid[np.maximum(after - 1, 0)] - 1
+        inside &= gap_length <= max_gap
+    values[inside] = np.interp(idx[inside], valid, values[valid])
+    return values
+
+
+
+# Hourly state wide demand from the combined daily rows.
+# Columns: date_time (UTC), old_date_time, time_zone, DEMAND
+def hourly_demand(raw, max_gap=None):
+    raw = raw.assign(date_time=to_utc(raw['Time Stamp'], raw['Time Zone']))
+
+    # One value per region and hour, then sum the regions.
+    # Hours missing a region are NaN.
+    loads = _resolve_duplicates(raw).unstack('Name')
+    demand = loads.sum(axis=1, min_count=loads.shape[1])
+
+    # Original local stamp of each hour, from its first entry
+    first = raw.drop_duplicates('date_time').set_index('date_time')
+
+    # Insert empty rows for missing hours
+    hours = pd.date_range(demand.index.min(), demand.index.max(), freq='h')
+    n_added = len(hours) - len(demand.index)
+    if n_added > 0:
+        print("Added {} missing hours".format(n_added))
+    demand = demand.reindex(hours)
+
+    # Zero demand is missing data
+    values = demand.values.copy()
+    values[values == 0.] = np.nan
+    n_missing = int(np.isnan(values).sum())
+    values = interpolate_gaps(values, max_gap)
+    print("Interpolated {} of {} missing hours".format(n_missing - int(np.isnan(values).sum()), n_missing))
+
+    return pd.DataFrame({
+        'date_time' : hours.tz_localize('UTC'),
+        'old_date_time' : first['Time Stamp'].reindex(hours).values,
+        'time_zone' : first['Time Zone'].reindex(hours).values,
+        DEMAND : values,
+    })
+
+
+
+# Read all daily files for start_year through end_year and write
+# the hourly master file in one go.  Returns the master frame.
+# With archives=True the monthly zip archives are read instead
+# of the extracted directories, cache_dir caches each archive.
+def build_master_file(base_dir, start_year, end_year, out_path, n_workers=None, max_gap=None,
+        archives=False, cache_dir=None):
+    if archives:
+        files = archive_files(base_dir, start_year, end_year)
+        assert(len(files) > 0), "No NYISO archives found in {} for {} - {}".format(base_dir, start_year, end_year)
+        print("Reading {} monthly archives".format(len(files)))
+        raw = read_archives(files, n_workers, cache_dir)
+    else:
+        files = daily_files(base_dir, start_year, end_year)
+        assert(len(files) > 0), "No NYISO daily files found in {} for {} - {}".format(base_dir, start_year, end_year)
+        print("Reading {} daily files".format(len(files)))
+        raw = read_daily_files(files, n_workers)
+    master = hourly_demand(raw, max_gap)
+    master.to_csv(out_path, index=False, na_rep='NA')
+    print("Outfile: '{}', {} hours".format(out_path, len(master.index)))
+    return master
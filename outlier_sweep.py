@@ -0,0 +1,163 @@
+import itertools
+import numpy as np
+import helpers as helpers
+import hourly_store
+
+
+# Sweep of the outlier screening thresholds of a DemandData.
+#
+# Every setting of the grid (lower and upper delta percentile, IQR
+# multiplier, demand estimate cut) is what find_hourly_outliers() and
+# set_24_hourly_demand() would flag with those values, but the shared
+# pieces are computed once: the delta percentiles in one call, the
+# centered averages and the 24 hour profiles of all hours.  Settings
+# are then evaluated in blocks as broadcast comparisons, a profile of
+# a setting being the shared one less the few hours it screens.
+# The DemandData itself is not changed.
+#
+# Only the four DemandData thresholds are swept.  The knobs of the
+# anomaly notebook's filter chain (global_dem_cut, local_dem_cut_up /
+# down, delta_multiplier, rel_multiplier, anomalous_pct) act on its
+# own pandas columns, each filter feeding the next, and are not
+# covered here.
+#
+# Example:
+#   result = sweep_outliers(dem, lower_pcts=[1, 5, 10], upper_pcts=[90, 95, 99],
+#           multipliers=[1., 1.5, 2., 3.], estimate_cuts=[0.3, 0.5])
+#   result.to_frame().sort_values('outlier')
+
+
+
+SETTINGS = ['lower_pct', 'upper_pct', 'multiplier', 'estimate_cut']
+CATEGORIES = ['missing', 'outlier', 'estimate_outlier']
+
+
+
+class SweepResult :
+    """ Flag counts and overlaps of every setting of a sweep.
+    settings : n_settings x 4, columns SETTINGS
+    counts   : n_settings x 3, hours flagged per CATEGORIES
+    overlaps : n_settings x 3 x 3, hours flagged in both categories,
+               the diagonal equals counts """
+
+    def __init__(self, settings, counts, overlaps, n_hours):
+        self.settings = settings
+        self.counts = counts
+        self.overlaps = overlaps
+        self.n_hours = n_hours
+
+    def __len__(self):
+        return len(self.settings)
+
+    # Index of a setting, the values as passed to sweep_outliers()
+    def index(self, lower_pct, upper_pct, multiplier, estimate_cut):
+        match = np.all(np.isclose(self.settings, [lower_pct, upper_pct, multiplier, estimate_cut]), axis=1)
+        assert(np.any(match)), "Setting {} not in the sweep".format([lower_pct, upper_pct, multiplier, estimate_cut])
+        return int(np.argmax(match))
+
+    # One row per setting with its counts and the pairwise overlaps
+    def to_frame(self):
+        import pandas as pd
+        df = pd.DataFrame(self.settings, columns=SETTINGS)
+        for i, name in enumerate(CATEGORIES):
+            df[name] = self.counts[:, i]
+        for i, j in itertools.combinations(range(len(CATEGORIES)), 2):
+            df['{}_and_{}'.format(CATEGORIES[i], CATEGORIES[j])] = self.overlaps[:, i, j]
+        return df
+
+
+
+# Evaluate the grid product(lower_pcts, upper_pcts, multipliers,
+# estimate_cuts) for demand_data with its time slice and
+# include_outliers settings.  block_size delta settings are evaluated
+# together, the float32 category masks and float64 relative differences
+# of a block take about
+#   block_size x n_hours x (13 x len(estimate_cuts) + 24) bytes.
+# Returns a SweepResult.
+def sweep_outliers(demand_data, lower_pcts=(5,), upper_pcts=(95,), multipliers=(1.5,),
+        estimate_cuts=(0.5,), block_size=64):
+    demand_data.ensure('deltas', 'centered_averages')
+    store = demand_data.store
+    n_hours = len(store)
+    demand = store['value']
+    missing = store.flag(hourly_store.MISSING)
+    valid = store.flag(hourly_store.DELTAS_VALID)
+    delta_previous = store['delta_previous']
+    delta_following = store['delta_following']
+
+    # Bounds of every delta setting, from one percentile call
+    x = delta_previous[~missing]
+    x = x[np.isfinite(x)]
+    deltas = np.array(list(itertools.product(lower_pcts, upper_pcts, multipliers)), dtype=np.float64).reshape(-1, 3)
+    cuts = np.asarray(estimate_cuts, dtype=np.float64)
+    if len(x) > 0:
+        pcts = np.unique(deltas[:, :2])
+        values = np.percentile(x, pcts)
+        lo = values[np.searchsorted(pcts, deltas[:, 0])]
+        hi = values[np.searchsorted(pcts, deltas[:, 1])]
+        cut_off = (hi - lo) * deltas[:, 2]
+        lower = lo - cut_off
+        upper = hi + cut_off
+    else:
+        # find_hourly_outliers() flags nothing
+        lower = np.full(len(deltas), -np.inf)
+        upper = np.full(len(deltas), np.inf)
+
+    # Time slices and each hour's slice and profile hour, as in set_hourly_demand()
+    time_slices = helpers.get_time_slice_thresholds(demand_data.time_slice_choice)
+    names = list(time_slices.keys())
+    time_slice_map = helpers.get_time_slice_map(names)
+    months = hourly_store.stamps_to_months(store['stamp'])
+    hour_index = (hourly_store.stamps_to_hours(store['stamp']) - 1) % 24
+    slot = np.array([names.index(time_slice_map[m]) for m in range(1, 13)])[months - 1]
+    in_slice = np.array([(months >= time_slices[name][0]) & (months <= time_slices[name][1]) for name in names])
+
+    # Profile sums and entries before removing any outliers
+    use = ~missing
+    totals = np.array([np.bincount(hour_index[use & s], weights=demand[use & s], minlength=24) for s in in_slice])
+    entries = np.array([np.bincount(hour_index[use & s], minlength=24) for s in in_slice])
+
+    base = demand - store['centered_iqr_average']
+    scored = demand_data._scored_hours()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        inv_demand = 1. / demand
+    n_slices = len(names)
+
+    counts = np.zeros((len(deltas), len(cuts), len(CATEGORIES)), dtype=np.int64)
+    overlaps = np.zeros((len(deltas), len(cuts), len(CATEGORIES), len(CATEGORIES)), dtype=np.int64)
+    for first in range(0, len(deltas), block_size):
+        block = slice(first, min(first + block_size, len(deltas)))
+        n_block = block.stop - block.start
+        lo_b = lower[block, None]
+        hi_b = upper[block, None]
+        outlier = (((delta_previous < lo_b) | (delta_previous > hi_b)) &
+                ((delta_following < lo_b) | (delta_following > hi_b)) & valid)
+
+        # Remove each setting's outliers from the shared profile sums
+        block_totals = np.broadcast_to(totals, (n_block, n_slices, 24)).copy()
+        block_entries = np.broadcast_to(entries, (n_block, n_slices, 24)).copy()
+        if not demand_data.include_outliers:
+            for s in range(n_slices):
+                b, i = np.nonzero(outlier & (use & in_slice[s]))
+                key = b * 24 + hour_index[i]
+                block_totals[:, s] -= np.bincount(key, weights=demand[i], minlength=n_block * 24).reshape(n_block, 24)
+                block_entries[:, s] -= np.bincount(key, minlength=n_block * 24).reshape(n_block, 24)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            profiles = block_totals / block_entries
+        profiles -= np.average(profiles, axis=2)[:, :, None]
+
+        # (demand - estimate) / demand for every setting and hour
+        rel = (base - profiles[:, slot, hour_index]) * inv_demand
+        rel = np.abs(rel)
+        estimate_outlier = (rel[:, None, :] > cuts[None, :, None]) & scored
+
+        masks = np.empty((n_block, len(cuts), len(CATEGORIES), n_hours), dtype=np.float32)
+        masks[:, :, 0] = missing
+        masks[:, :, 1] = outlier[:, None, :]
+        masks[:, :, 2] = estimate_outlier
+        overlaps[block] = np.rint(np.matmul(masks, masks.swapaxes(-1, -2))).astype(np.int64)
+        counts[block] = np.diagonal(overlaps[block], axis1=-2, axis2=-1)
+
+    settings = np.array([list(d) + [c] for d in deltas for c in cuts], dtype=np.float64).reshape(-1, 4)
+    return SweepResult(settings, counts.reshape(-1, len(CATEGORIES)),
+            overlaps.reshape(-1, len(CATEGORIES), len(CATEGORIES)), n_hours)
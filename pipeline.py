@@ -0,0 +1,272 @@
+import os
+import csv
+import json
+import pickle
+import hashlib
+import argparse
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import helpers as helpers
+import mem_format
+import normalizations
+from demand_data import DemandData
+
+
+# Resumable batch pipeline taking every region from its EIA csv
+# to the screened, normalized MEM input file:
+#   load -> deltas -> outliers -> rolling -> profiles -> estimates
+#        -> normalizations -> export
+#
+# Each entry of STAGES is: name : [function, stages it depends on,
+# parameters it uses, whether it changes the DemandData].  A stage's
+# key hashes its parameters and the keys of the stages it depends
+# on (and the input file for 'load'), so changing a parameter only
+# re-runs the stages downstream of it.
+#
+# After every stage the region's manifest records its key and
+# output files, and stages changing the data checkpoint the
+# DemandData.  A new run starts from the last stage still up to
+# date, so an interrupted run resumes where it stopped.  Regions run
+# in parallel worker processes.
+#
+# Example:
+#   python pipeline.py --regions CISO ERCO --iqr-val 25 --workers 4
+#   python pipeline.py  # all helpers.return_good_regions()
+
+
+
+DEFAULTS = OrderedDict([
+    ('data_dir', 'data'),
+    ('work_dir', 'pipeline_work'),
+    ('out_dir', 'pipeline_output'),
+    ('norm_dir', 'normalizations'),
+    ('iqr_val', 25),
+    ('time_slice_choice', 0),
+    ('include_outliers', False),
+])
+
+
+
+def _input_path(region, params):
+    return os.path.join(params['data_dir'], '{}.csv'.format(region))
+
+
+# (time, demand) records of a region csv, the DemandData input
+def _read_records(path):
+    with open(path, 'r') as f:
+        reader = csv.reader(f, delimiter=",")
+        header = next(reader)
+        assert('time' in header and 'demand (MW)' in header), "{} needs 'time' and 'demand (MW)' columns".format(path)
+        i_time = header.index('time')
+        i_demand = header.index('demand (MW)')
+        return [(line[i_time], line[i_demand]) for line in reader]
+
+
+def _load(region, data, params):
+    return DemandData(region, _read_records(_input_path(region, params))), []
+
+def _deltas(region, data, params):
+    data.ensure('deltas')
+    return data, []
+
+def _outliers(region, data, params):
+    data.find_hourly_outliers()
+    return data, []
+
+def _rolling(region, data, params):
+    data.compute_daily_averages()
+    data.compute_hour_centered_averages(params['iqr_val'])
+    return data, []
+
+def _profiles(region, data, params):
+    data.set_hourly_demand(params['time_slice_choice'], params['include_outliers'])
+    return data, []
+
+def _estimates(region, data, params):
+    data.set_24_hourly_demand()
+    return data, []
+
+def _normalizations(region, data, params):
+    return data, normalizations.registry(params['norm_dir']).compute(data.hourly_data, 'demand', region)
+
+def _export(region, data, params):
+    os.makedirs(params['out_dir'], exist_ok=True)
+    path = os.path.join(params['out_dir'], '{}_for_MEM.csv'.format(region))
+    mem_format.export_mem(data, path)
+    return data, [path]
+
+
+STAGES = OrderedDict([
+    ('load',           [_load,           [],             ['data_dir'],                                 True]),
+    ('deltas',         [_deltas,         ['load'],       [],                                           True]),
+    ('outliers',       [_outliers,       ['deltas'],     [],                                           True]),
+    ('rolling',        [_rolling,        ['outliers'],   ['iqr_val'],                                  True]),
+    ('profiles',       [_profiles,       ['outliers'],   ['time_slice_choice', 'include_outliers'],    True]),
+    ('estimates',      [_estimates,      ['rolling', 'profiles'], [],                                  True]),
+    ('normalizations', [_normalizations, ['load'],       ['norm_dir'],                                 False]),
+    ('export',         [_export,         ['estimates'],  ['out_dir'],                                  False]),
+])
+
+
+
+# Key of every stage for a region, in STAGES order
+def stage_keys(region, params):
+    keys = OrderedDict()
+    for name, (function, dependencies, used, changes_data) in STAGES.items():
+        info = [name, [[p, params[p]] for p in used], [keys[d] for d in dependencies]]
+        if name == 'load':
+            stat = os.stat(_input_path(region, params))
+            info.append([stat.st_size, stat.st_mtime_ns])
+        keys[name] = hashlib.sha1(json.dumps(info).encode()).hexdigest()
+    return keys
+
+
+
+# Write via a temporary file so an interrupted write never
+# leaves a truncated checkpoint or manifest
+def _atomic_write(path, write):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+
+class RegionRun :
+    """ Checkpoints and manifest of one region in work_dir/region/. """
+
+    def __init__(self, region, work_dir):
+        self.region = region
+        self.directory = os.path.join(work_dir, region)
+        os.makedirs(self.directory, exist_ok=True)
+        self.manifest_path = os.path.join(self.directory, 'manifest.json')
+        self.manifest = OrderedDict()
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f, object_pairs_hook=OrderedDict)
+
+    def checkpoint_path(self, stage):
+        return os.path.join(self.directory, '{}.pkl'.format(stage))
+
+    def is_current(self, stage, key):
+        info = self.manifest.get(stage)
+        if info == None or info['key'] != key:
+            return False
+        if STAGES[stage][3] and not os.path.exists(self.checkpoint_path(stage)):
+            return False
+        return all(os.path.exists(p) for p in info['outputs'])
+
+    def load(self, stage):
+        with open(self.checkpoint_path(stage), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, stage, key, data, outputs):
+        if STAGES[stage][3]:
+            _atomic_write(self.checkpoint_path(stage), lambda f: pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL))
+        self.manifest[stage] = OrderedDict([('key', key), ('outputs', outputs)])
+        _atomic_write(self.manifest_path, lambda f: f.write(json.dumps(self.manifest, indent=1).encode()))
+
+
+
+# Run every stage of one region which is not up to date.
+# Returns the names of the stages run.
+def run_region(region, params, force=False):
+    run = RegionRun(region, params['work_dir'])
+    keys = stage_keys(region, params)
+
+    # Stages are in dependency order, the first stale one and
+    # everything after it that depends on it are re-run
+    stale = set()
+    for name, (function, dependencies, used, changes_data) in STAGES.items():
+        if force or not run.is_current(name, keys[name]) or any(d in stale for d in dependencies):
+            stale.add(name)
+    if len(stale) == 0:
+        return []
+
+    # Start from the latest checkpoint before the first stale stage.
+    # The data is passed along the stages, so every stage changing it
+    # from there on is re-run, up to date or not.
+    data = None
+    names = list(STAGES.keys())
+    first = min(names.index(name) for name in stale)
+    stale.update(name for name in names[first:] if STAGES[name][3])
+    for name in reversed(names[:first]):
+        if STAGES[name][3]:
+            data = run.load(name)
+            break
+
+    ran = []
+    for name in names[first:]:
+        if name not in stale:
+            continue
+        function = STAGES[name][0]
+        data, outputs = function(region, data, params)
+        run.save(name, keys[name], data, outputs)
+        ran.append(name)
+    return ran
+
+
+
+# run_region catching errors so one bad region does not stop the batch
+def _run_region_safe(args):
+    region, params, force = args
+    try:
+        return region, run_region(region, params, force), None
+    except Exception:
+        return region, [], traceback.format_exc()
+
+
+
+# Run the pipeline for every region with n_workers processes
+# (None for one per CPU, 1 runs in this process).
+# Returns an OrderedDict region -> [stages run, traceback or None].
+def run_pipeline(regions, params=None, n_workers=None, force=False):
+    full = OrderedDict(DEFAULTS)
+    full.update(params or {})
+    if n_workers == None:
+        n_workers = os.cpu_count() or 1
+    tasks = [(region, full, force) for region in regions]
+
+    if n_workers == 1 or len(tasks) <= 1:
+        results = [_run_region_safe(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_run_region_safe, tasks))
+
+    summary = OrderedDict()
+    for region, ran, error in results:
+        summary[region] = [ran, error]
+        if error != None:
+            print("pipeline: {} failed\n{}".format(region, error))
+        else:
+            print("pipeline: {} ran {}".format(region, ', '.join(ran) if len(ran) > 0 else 'nothing, up to date'))
+    return summary
+
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Resumable demand screening and MEM export pipeline')
+    parser.add_argument('--regions', nargs='+', default=helpers.return_good_regions())
+    parser.add_argument('--data-dir', default=DEFAULTS['data_dir'])
+    parser.add_argument('--work-dir', default=DEFAULTS['work_dir'])
+    parser.add_argument('--out-dir', default=DEFAULTS['out_dir'])
+    parser.add_argument('--norm-dir', default=DEFAULTS['norm_dir'])
+    parser.add_argument('--iqr-val', type=float, default=DEFAULTS['iqr_val'])
+    parser.add_argument('--time-slice-choice', type=int, choices=[0, 1, 2, 3], default=DEFAULTS['time_slice_choice'])
+    parser.add_argument('--include-outliers', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help='re-run every stage')
+    return parser.parse_args(argv)
+
+
+
+if '__main__' in __name__:
+
+    args = parse_args()
+    params = OrderedDict((name, getattr(args, name)) for name in DEFAULTS.keys())
+    summary = run_pipeline(args.regions, params, args.workers, args.force)
+    failed = [region for region, (ran, error) in summary.items() if error != None]
+    if len(failed) > 0:
+        print("Failed regions: {}".format(', '.join(failed)))
+        exit(1)
@@ -6,6 +6,18 @@ from collections import OrderedDict
 import helpers as helpers
 import matplotlib.dates as mdates # For date formatting
 from mpl_toolkits.mplot3d import Axes3D
+import downsampling
+import spectral_tools
+
+
+# Optional visual downsampling applied before handing a series to
+# matplotlib.  n_pixels=None plots every point, otherwise the series
+# is reduced to roughly n_pixels points with
+# downsample_method = 'lttb' or 'minmax', see downsampling.py
+def _visual_downsample(x, y, n_pixels=None, downsample_method='lttb'):
+    if n_pixels == None or len(y) <= n_pixels:
+        return x, y
+    return downsampling.downsample(x, y, n_pixels, downsample_method)
 
 
 def plot_24_hour_avg(hourly_demand, names, x_label, y_label, title, save):
@@ -68,7 +80,8 @@ def plot_hist(x, x_label, y_label, title, save, n_bins=100, logY=False, logX=Fal
     return n, bins, patches
 
 
-def plot_demand(hourly_data_sets, names, x_label, y_label, title, save, ylim=[]):
+def plot_demand(hourly_data_sets, names, x_label, y_label, title, save, ylim=[],
+        n_pixels=None, downsample_method='lttb'):
 
     matplotlib.rcParams['figure.figsize'] = (14.0, 6.0)
     months = mdates.MonthLocator()  # every month
@@ -81,9 +94,10 @@ def plot_demand(hourly_data_sets, names, x_label, y_label, title, save, ylim=[])
     for hourly_data_set, name in zip(hourly_data_sets, names):
         x = [hour_data.datetime for hour_data in hourly_data_set]
         y = [hour_data.value for hour_data in hourly_data_set]
-        this_max = max(y) if len(y) > 0 else 0
+        this_max = np.nanmax(y) if len(y) > 0 else 0
         if this_max > y_max:
             y_max = this_max
+        x, y = _visual_downsample(x, y, n_pixels, downsample_method)
         ax.plot(x, y, 'o', label=name)
 
     if ylim != []:
@@ -153,7 +167,8 @@ def plot_demand_with_daily(fig, ax, daily_x, daily_y, save, title='24 Hour Avg')
     plt.savefig("plots/"+save+".png")
     return fig, ax
 
-def plot_demand_comparisons(x_val_vec, y_val_vec, title_vec, name):
+def plot_demand_comparisons(x_val_vec, y_val_vec, title_vec, name,
+        n_pixels=None, downsample_method='lttb'):
     assert(len(x_val_vec) == len(y_val_vec) and len(y_val_vec) == len(title_vec))
     matplotlib.rcParams['figure.figsize'] = (14.0, 6.0)
     fig, ax = plt.subplots()
@@ -162,6 +177,7 @@ def plot_demand_comparisons(x_val_vec, y_val_vec, title_vec, name):
     plt.title('48 Hr Avg Comparisons')
     
     for x, y, title in zip(x_val_vec, y_val_vec, title_vec):
+        x, y = _visual_downsample(x, y, n_pixels, downsample_method)
         ax.plot(x, y, 'o', label=title)
     plt.legend()
     plt.grid()
@@ -176,7 +192,7 @@ def histogram_gaps( vals, title, save, n_bins=100, logY=False, logX=False):
     previous_entry_was_gap = False
     running_gap_length = 0
     for val in vals:
-        if val == -99.99: # Gap detected
+        if val == -99.99 or val != val: # Gap detected, -99.99 or NaN
             running_gap_length += 1
             previous_entry_was_gap = True
         elif previous_entry_was_gap == True: # Gap is finished, fill entry
@@ -265,25 +281,44 @@ def plot_daily_over_weeks_surface(hourly_info, save, angle_z=30, angle_plane=50)
 
     plt.savefig("plots/"+save+".png")
 
-def simple_autocorrelation_plot(hourly_data, save, n_lags, y_lim=[-0.05, 0.3]):
+def simple_autocorrelation_plot(hourly_data, save, n_lags, y_lim=[-0.05, 0.3],
+        n_pixels=None, downsample_method='lttb'):
 
     print("\n\nsimple_autocorrelation_plot: assuming data has been normalized to '1', subtracting 1 from each value.\nAlso, requiring that values were originally positive.")
 
     #y = [d.value - 1 for d in hourly_data if d.value > 0.]
     #x = [d.datetime for d in hourly_data if d.value > 0.]
-    y = [d.value - 1 for d in hourly_data]
+    y = spectral_tools.values_from_hourly_data(hourly_data) - 1
     x = [d.datetime for d in hourly_data]
 
     fig, ax = plt.subplots()
-    ax.plot(x, y, 'o', label='demand')
-    fig = plt.gcf()
-    plt.show()
+    x_plot, y_plot = _visual_downsample(x, list(y), n_pixels, downsample_method)
+    ax.plot(x_plot, y_plot, 'o', label='demand')
     fig.savefig("plots/"+save+"_values.png")
+    plt.close(fig)
+
+    lags, acfs = spectral_tools.fft_autocorrelation(y, n_lags)
+    plot_autocorrelations(lags, acfs, save+"_autocorr", y_lim)
 
 
+# Plot the output of spectral_tools.fft_autocorrelation().
+# acfs is an OrderedDict name -> autocorrelation array.
+# A single series is drawn symmetric in lag with vertical lines
+# like plt.acorr, multiple series are overlaid as lines.
+def plot_autocorrelations(lags, acfs, save, y_lim=[-0.05, 0.3]):
 
-    plt.acorr(y, maxlags=n_lags)
-    plt.ylim(y_lim[0], y_lim[1])
-    fig = plt.gcf()
-    plt.show()
-    fig.savefig("plots/"+save+"_autocorr.png")
+    fig, ax = plt.subplots()
+    if len(acfs) == 1:
+        acf = list(acfs.values())[0]
+        ax.vlines(np.concatenate((-lags[:0:-1], lags)), 0,
+                np.concatenate((acf[:0:-1], acf)))
+        ax.axhline(0, color='k')
+    else:
+        for name, acf in acfs.items():
+            ax.plot(lags, acf, '-', label=name)
+        plt.legend()
+    ax.set_xlabel('Lag (hours)')
+    ax.set_ylabel('Autocorrelation')
+    ax.set_ylim(y_lim[0], y_lim[1])
+    fig.savefig("plots/"+save+".png")
+    plt.close(fig)
@@ -0,0 +1,187 @@
+import numpy as np
+
+
+# Mergeable streaming quantile sketch (KLL, Karnin, Lang and Liberty
+# 2016) for percentiles of series which do not fit in memory or keep
+# growing, e.g. all regions over decades or a live feed.
+#
+# Values are kept in levels, an item of level h standing for 2**h
+# values.  When a level is over its capacity it is sorted and every
+# other item, from a random start, moves up a level.  Capacities
+# shrink by 2/3 per level below the top, so at most about 3 k items are kept
+# whatever the number of values, an update costs amortized O(1) and
+# percentiles are within about 1.7 / k of the true rank (1% of the
+# values for the default k = 200).  Until the first compaction the
+# sketch holds every value and percentiles are exactly np.percentile().
+#
+# Sketches of chunks, years or regions merge into the sketch of the
+# combined values, and pickle for use across processes.
+#
+# Example:
+#   sketch = QuantileSketch()
+#   for region in regions:
+#       sketch.update(deltas[region])
+#   q05, q95 = sketch.percentile([5, 95])
+#   helpers.check_avgs(sketch, 25)
+
+
+
+class QuantileSketch :
+    """ KLL quantile sketch, see the module description.
+    k sets the accuracy and the memory, seed the compaction choices. """
+
+    def __init__(self, k=200, seed=None):
+        assert(k >= 8), "k={} is too small for a useful sketch".format(k)
+        self.k = k
+        self.n = 0
+        self.total = 0.
+        self.min = np.inf
+        self.max = -np.inf
+        self.levels = [np.zeros(0)]
+        self._buffer = [] # single values not yet in levels[0]
+        self._rng = np.random.default_rng(seed)
+        self._sorted = None
+
+
+    def __len__(self):
+        return self.n
+
+
+    # Capacity of level h
+    def _capacity(self, h):
+        depth = len(self.levels) - 1 - h
+        return max(2, int(np.ceil(self.k * (2. / 3.) ** depth)))
+
+
+    # Add one value, NaN and inf are skipped
+    def add(self, value):
+        if not np.isfinite(value):
+            return
+        self._buffer.append(value)
+        self.n += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self._sorted = None
+        if len(self._buffer) + len(self.levels[0]) > self._capacity(0):
+            self._compress()
+
+
+    # Add an array of values, NaN and inf are skipped
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.total += values.sum()
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self._sorted = None
+        self._compress()
+        return self
+
+
+    # Add the values of other into this sketch
+    def merge(self, other):
+        other._flush()
+        self._flush()
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.zeros(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate((self.levels[h], items))
+        self.n += other.n
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._sorted = None
+        self._compress()
+        return self
+
+
+    def _flush(self):
+        if len(self._buffer) > 0:
+            self.levels[0] = np.concatenate((self.levels[0], self._buffer))
+            self._buffer = []
+
+
+    # Compact the lowest level over capacity until none is
+    def _compress(self):
+        self._flush()
+        while True:
+            for h in range(len(self.levels)):
+                if len(self.levels[h]) > self._capacity(h):
+                    break
+            else:
+                return
+            if h + 1 == len(self.levels):
+                self.levels.append(np.zeros(0))
+            items = np.sort(self.levels[h])
+            # An odd item out stays, the rest halve into the next level
+            keep = items[len(items) - len(items) % 2:]
+            start = self._rng.integers(2)
+            self.levels[h + 1] = np.concatenate((self.levels[h + 1], items[start:len(items) - len(keep):2]))
+            self.levels[h] = keep
+
+
+    # Sorted items and their weights, cached until the next change
+    def _weighted(self):
+        if self._sorted == None:
+            self._flush()
+            values = np.concatenate(self.levels)
+            weights = np.concatenate([np.full(len(items), 2. ** h) for h, items in enumerate(self.levels)])
+            order = np.argsort(values, kind='stable')
+            self._sorted = (values[order], weights[order])
+        return self._sorted
+
+
+    # Percentiles (0 - 100, a number or an array) interpolated like
+    # np.percentile(), NaN if the sketch is empty
+    def percentile(self, q):
+        q = np.asarray(q, dtype=np.float64)
+        assert(np.all((q >= 0) & (q <= 100))), "Percentiles must be within 0 - 100"
+        if self.n == 0:
+            return np.full(q.shape, np.nan)[()]
+        values, weights = self._weighted()
+        # Rank of the middle value each item stands for, the index
+        # when every weight is 1
+        ranks = np.cumsum(weights) - (weights + 1.) / 2.
+        if ranks[0] > 0:
+            ranks = np.concatenate(([0.], ranks))
+            values = np.concatenate(([self.min], values))
+        if ranks[-1] < self.n - 1:
+            ranks = np.concatenate((ranks, [self.n - 1.]))
+            values = np.concatenate((values, [self.max]))
+        return np.interp(q / 100. * (self.n - 1), ranks, values)[()]
+
+
+    def quantile(self, q):
+        return self.percentile(np.asarray(q) * 100.)
+
+
+    # Mean of all values, or of the values strictly between lo and
+    # hi (estimated from the sketch items), NaN if there are none
+    def mean(self, lo=None, hi=None):
+        if lo == None and hi == None:
+            return self.total / self.n if self.n > 0 else np.nan
+        values, weights = self._weighted()
+        inside = np.ones(len(values), dtype=bool)
+        if lo != None:
+            inside &= values > lo
+        if hi != None:
+            inside &= values < hi
+        if not inside.any():
+            return np.nan
+        return np.average(values[inside], weights=weights[inside])
+
+
+
+# One sketch of the values of several sketches, which are not changed
+def merge_sketches(sketches, k=200, seed=None):
+    merged = QuantileSketch(k, seed)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
@@ -1,32 +1,137 @@
-from hourly_data_container import HourlyDataContainer
 import csv
 import numpy as np
 import helpers as helpers
+import hourly_store
+import mem_format
+from hourly_store import HourlyStore, HourlyRecords
 from collections import OrderedDict
 from simple_container import SimpleContainer
 
 
+TIME_COLUMNS = ['year', 'month', 'day', 'hour']
+
+
+
+class SiteStatistics :
+    """ Count, sum, sum of squares, min and max of every site (or
+    grid cell) of a capacity factor table, accumulated one chunk of
+    hours at a time so the table never has to fit in memory.
+    NaN hours are skipped. """
+
+    def __init__(self, sites):
+        self.sites = list(sites)
+        n = len(self.sites)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.sum = np.zeros(n)
+        self.sum_sq = np.zeros(n)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+
+
+    # values : hours x sites
+    def update(self, values):
+        valid = np.isfinite(values)
+        zeroed = np.where(valid, values, 0.)
+        self.count += valid.sum(axis=0)
+        self.sum += zeroed.sum(axis=0)
+        self.sum_sq += (zeroed * zeroed).sum(axis=0)
+        self.min = np.minimum(self.min, np.where(valid, values, np.inf).min(axis=0))
+        self.max = np.maximum(self.max, np.where(valid, values, -np.inf).max(axis=0))
+
+
+    @property
+    def mean(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sum / self.count
+
+
+    @property
+    def std(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(np.maximum(self.sum_sq / self.count - self.mean**2, 0.))
+
+
+    # The top fraction of sites by mean capacity factor, e.g. 0.25
+    # for the '25pctTop' files, in table order
+    def top(self, fraction):
+        assert(0. < fraction <= 1.), "fraction must be in (0, 1], you gave {}".format(fraction)
+        n_keep = int(np.ceil(len(self.sites) * fraction))
+        means = np.nan_to_num(self.mean, nan=-np.inf)
+        keep = np.sort(np.argsort(-means, kind='stable')[:n_keep])
+        return [self.sites[i] for i in keep]
+
+
+
+# Site (grid cell) columns of a MEM format capacity factor table:
+# year, month, day, hour, then one column per site
+def site_columns(path):
+    return [c for c in mem_format.mem_columns(path) if c not in TIME_COLUMNS]
+
+
+
+# SiteStatistics of every site of a table, reading chunk_rows hours at a time
+def site_statistics(path, chunk_rows=2000):
+    stats = SiteStatistics(site_columns(path))
+    for chunk in mem_format.read_mem_chunks(path, chunk_rows):
+        stats.update(chunk[stats.sites].values.astype(np.float64))
+    return stats
+
+
+
+# Hourly weighted mean capacity factor of sites, reading chunk_rows
+# hours and only the needed columns at a time.
+# weights : None for equal weights, or a dict site -> weight
+#           (e.g. cell area or installed capacity)
+# Hours where some sites are NaN average the valid ones.
+# Returns hour start datetime64[h] times and the values.
+def mean_capacity_factors(path, sites, weights=None, chunk_rows=2000):
+    assert(len(sites) > 0), "No sites to average"
+    w = np.ones(len(sites)) if weights == None else np.array([weights[site] for site in sites], dtype=np.float64)
+    times, means = [], []
+    for chunk in mem_format.read_mem_chunks(path, chunk_rows, usecols=sites):
+        values = chunk[sites].values.astype(np.float64)
+        valid = np.isfinite(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means.append(np.where(valid, values, 0.) @ w / (valid @ w))
+        times.append(mem_format.mem_datetimes(chunk, hour_ending=False))
+    return np.concatenate(times), np.concatenate(means)
+
+
+
 class RenewablesData :
     """ A class to store the hour-by-hour info for 
     renewable energy capacity factors. """
 
+    # Stamps label the start of each hour, and the value column
+    # name, for mem_format.export_mem
+    HOUR_ENDING = False
+    MEM_VALUE_NAME = '{source.energy} capacity'
+
 
-    def __init__(self, energy):
+    # With sites_path the series is built from a per site (or grid
+    # cell) MERRA-2 capacity factor table instead of the aggregated
+    # data/{energy}_series_Lei_unnormalized.csv, see load_sites().
+    def __init__(self, energy, sites_path=None, top_fraction=0.25, weights=None, chunk_rows=2000):
 
         assert(energy == 'solar' or energy == 'solarSmall' or energy == 'wind' or energy == 'windSmall'), "Choose 'solar' or 'wind' energy to load"
 
-        self.hourly_data = []
+        self.energy = energy
+        self.store = HourlyStore(hourly_store.SIMPLE_COLUMNS)
         self.demand_position = 2 # Position of reported demand use
         self.uct_time_position = 1 # Position of UCT time in Dan's current EIA930_BALANCE_[year]_[monts].csv data 
+        self.site_stats = None
+        self.sites = None
+
+        if sites_path != None:
+            self.load_sites(sites_path, top_fraction, weights, chunk_rows)
+            return
 
         print ("Loading {}".format(energy))
 
         with open("data/{}_series_Lei_unnormalized.csv".format(energy), 'r') as f:
             info = list(csv.reader(f, delimiter=","))
 
-        # Continue the hour notation at previous entry
-        # and increment by 1 unless it's the first entry
-        hour = 0
+        rows = []
         for line in info:
 
             # Ensure demand is listed in expected column and
@@ -38,11 +143,46 @@ class RenewablesData :
                     break
                 continue
 
+            rows.append(line[:5])
+
+        # csv hours are 1-24, stamps mark the start of the hour
+        rows = np.array(rows, dtype=np.float64).reshape(-1, 5)
+        times = mem_format.from_mem(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3], hour_ending=False)
+        self.store.append(times.astype(np.int64), rows[:, 4])
+
+
+    # Build the series from a per site capacity factor table, out of
+    # core: a first pass accumulates the SiteStatistics, the sites
+    # in the top_fraction by mean capacity factor are kept (the top
+    # 25% by default like the "25pctTop" inputs, all if None), and a
+    # second pass reads only their columns and averages them,
+    # weighted by weights if given.
+    def load_sites(self, sites_path, top_fraction=0.25, weights=None, chunk_rows=2000):
+        print ("Loading {} sites from {}".format(self.energy, sites_path))
+        if top_fraction == None:
+            self.sites = site_columns(sites_path)
+        else:
+            self.site_stats = site_statistics(sites_path, chunk_rows)
+            self.sites = self.site_stats.top(top_fraction)
+        print ("Averaging {} sites".format(len(self.sites)))
+
+        times, values = mean_capacity_factors(sites_path, self.sites, weights, chunk_rows)
+        self.store.append(times.astype(np.int64), values)
+
+
+    # One SimpleContainer per hour, created when accessed
+    @property
+    def hourly_data(self):
+        return HourlyRecords(self.store, SimpleContainer)
+
+
+    # Time lookups on the hours, binary searches returning views,
+    # see HourlyRecords.slice(), year() and loc()
+    def slice(self, start=None, end=None):
+        return self.hourly_data.slice(start, end)
+
+    def year(self, y):
+        return self.hourly_data.year(y)
 
-            # Initialize an HourlyDataContainer for this hour
-            # Need to switch csv hour from 1-24 to 0-23
-            uct_time = "{year:04d}{month:02d}{day:02d}T{hour:02d}Z".format(
-                    year=int(line[0]), month=int(line[1]), day=int(line[2]), hour=int(line[3])-1)
-            self.hourly_data.append( SimpleContainer(
-                uct_time, float(line[4])) )
-            hour += 1
+    def loc(self, ts):
+        return self.hourly_data.loc(ts)
@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import tempfile
+import contextlib
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import util
+try:
+    import fcntl
+except ImportError: # Windows, reference counts are then not locked
+    fcntl = None
+
+
+# All regions' hourly arrays loaded once into one shared memory
+# block, so worker processes attach by name and get zero copy numpy
+# views instead of each re-reading and parsing the data.
+#
+# The block starts with a reference count and a JSON layout of the
+# arrays.  Every SharedRegionStore, the creator's and each attached
+# one, holds one reference and close() releases it; the last one
+# unlinks the block.  Needs Python 3.8+ (multiprocessing.shared_memory).
+#
+# Example:
+#   store = SharedRegionStore.create(columnar.read_regions('results'))
+#   results = map_regions(plot_region, store.name, store.regions, n_workers=16)
+#   store.close()
+
+
+
+HEADER = 16 # int64 reference count, int64 layout length
+ALIGN = 64
+
+
+
+def _shared_memory():
+    from multiprocessing import shared_memory
+    return shared_memory
+
+
+
+# Attach to an existing block without the resource tracker claiming
+# it, which would unlink it when this process exits
+def _attach_block(name):
+    shared_memory = _shared_memory()
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+
+class SharedRegionStore :
+    """ Read only views of region -> column -> array data held in one
+    shared memory block, see the module description.  Use create()
+    in the parent and attach() in the workers. """
+
+    def __init__(self, block, owner):
+        self.block = block
+        self.name = block.name
+        self.owner = owner
+        self._closed = False
+        self._lock_path = os.path.join(tempfile.gettempdir(), '{}.lock'.format(self.name.lstrip('/')))
+
+        length = int(np.frombuffer(block.buf, dtype=np.int64, count=2)[1])
+        self.layout = json.loads(bytes(block.buf[HEADER:HEADER + length]).decode(), object_pairs_hook=OrderedDict)
+        self._views = self._make_views()
+
+
+    # Read only views of every column.  frombuffer views hold the
+    # buffer, so block.close() refuses to unmap it while one is alive
+    def _make_views(self):
+        views = OrderedDict()
+        for region, columns in self.layout.items():
+            views[region] = OrderedDict()
+            for column, (dtype, shape, offset) in columns.items():
+                view = np.frombuffer(self.block.buf, dtype=np.dtype(dtype), count=int(np.prod(shape)), offset=offset).reshape(shape)
+                view.flags.writeable = False
+                views[region][column] = view
+        return views
+
+
+    # Pack regions (OrderedDict region -> OrderedDict column -> array)
+    # into a new block, name=None lets the system pick one
+    @classmethod
+    def create(cls, regions, name=None):
+        layout = OrderedDict()
+        arrays = []
+        offset = 0
+        for region, columns in regions.items():
+            layout[region] = OrderedDict()
+            for column, values in columns.items():
+                values = np.ascontiguousarray(values)
+                layout[region][column] = [values.dtype.str, list(values.shape), offset]
+                arrays.append((offset, values))
+                offset += (values.nbytes + ALIGN - 1) // ALIGN * ALIGN
+
+        # Data starts after the layout, whose length depends on the
+        # offsets it lists, so grow the start until the layout fits
+        start = 0
+        while True:
+            text = json.dumps(OrderedDict((region, OrderedDict((c, [d, s, o + start]) for c, (d, s, o) in columns.items()))
+                    for region, columns in layout.items())).encode()
+            needed = (HEADER + len(text) + ALIGN - 1) // ALIGN * ALIGN
+            if needed <= start:
+                break
+            start = needed
+
+        block = _shared_memory().SharedMemory(name=name, create=True, size=max(start + offset, 1))
+        header = np.ndarray(2, dtype=np.int64, buffer=block.buf)
+        header[:] = [1, len(text)]
+        block.buf[HEADER:HEADER + len(text)] = text
+        for rel, values in arrays:
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf, offset=start + rel)[...] = values
+        del header
+        return cls(block, owner=True)
+
+
+    # Attach to the block of another process's store
+    @classmethod
+    def attach(cls, name):
+        store = cls(_attach_block(name), owner=False)
+        store._add_reference(1)
+        return store
+
+
+    # Hold the lock of the reference count
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(self._lock_path, 'a') as lock:
+            if fcntl != None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+
+    # Change the reference count, returning the new count.
+    # Call with the lock held.
+    def _change_count(self, change):
+        count = np.ndarray(1, dtype=np.int64, buffer=self.block.buf)
+        count[0] += change
+        value = int(count[0])
+        del count
+        return value
+
+
+    def _add_reference(self, change):
+        with self._locked():
+            return self._change_count(change)
+
+
+    @property
+    def regions(self):
+        return list(self._views.keys())
+
+    @property
+    def references(self):
+        return int(np.frombuffer(self.block.buf, dtype=np.int64, count=1)[0])
+
+    def __getitem__(self, region):
+        return self._views[region]
+
+    def __contains__(self, region):
+        return region in self._views
+
+
+    # Release this reference, the last one unlinks the block.
+    # Raises BufferError, keeping the reference, while views from
+    # this store are still held elsewhere.
+    def close(self):
+        if self._closed:
+            return
+        self._views = OrderedDict()
+        with self._locked():
+            # The count is read through the block, so it is released
+            # before unmapping and restored if that fails, all under
+            # the lock so no other process sees the released count
+            remaining = self._change_count(-1)
+            try:
+                self.block.close()
+            except BufferError:
+                # SharedMemory.close() drops its memoryview before
+                # finding the mmap still exported, wrap it again
+                if self.block._buf == None:
+                    self.block._buf = memoryview(self.block._mmap)
+                self._change_count(1)
+                self._views = self._make_views()
+                raise
+        self._closed = True
+        if remaining <= 0:
+            if self.owner:
+                self.block.unlink()
+            else:
+                _shared_memory().SharedMemory(name=self.name).unlink()
+            if os.path.exists(self._lock_path):
+                os.remove(self._lock_path)
+        elif self.owner:
+            # An attached store unlinks it, stop this process's
+            # resource tracker from unlinking it at exit
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.block._name, 'shared_memory')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+# Columns of several DemandData (or RenewablesData) stores,
+# region -> column -> array, for create()
+def store_columns(datas, columns=('stamp', 'value', 'flags')):
+    return OrderedDict((getattr(d, 'region', getattr(d, 'energy', None)),
+            OrderedDict((c, d.store[c]) for c in columns)) for d in datas)
+
+
+
+# The store attached in each worker process
+_WORKER_STORE = None
+
+def _init_worker(name):
+    global _WORKER_STORE
+    _WORKER_STORE = SharedRegionStore.attach(name)
+    # Pool workers skip atexit, multiprocessing finalizers still run
+    util.Finalize(_WORKER_STORE, _WORKER_STORE.close, exitpriority=10)
+
+
+def _call(args):
+    function, region = args
+    return function(region, _WORKER_STORE[region])
+
+
+
+# Call function(region, columns) for every region on n_workers
+# processes attached to the store name, columns being the zero copy
+# views.  function must be picklable (defined at module level).
+# Returns the results in regions order.
+def map_regions(function, name, regions, n_workers=None):
+    if n_workers == None:
+        n_workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(name,)) as pool:
+        return list(pool.map(_call, [(function, region) for region in regions]))
@@ -1,4 +1,5 @@
-import datetime
+import numpy as np
+import hourly_store
 
 
 
@@ -6,17 +7,131 @@ class SimpleContainer:
     """ Class that for a given time slice contains
     a single demand or power factor value
 
+    Constructing one directly keeps the hour's scalars in slots:
+    the stamp, value and flag bits, plus _extra for the columns
+    which differ from their defaults (original_value equal to value,
+    derived values NaN) once set.  Series loaded by DemandData and
+    RenewablesData share one hourly_store.HourlyStore and view()
+    returns a RowView record onto a row of it on access.
+
     # Info
+    self.stamp # integer hours since 1970-01-01T00Z
     self.datetime
-    self.demand
+    self.month
+    self.value
+    self.original_value
     """
 
+    __slots__ = ('_stamp', '_value', '_flags', '_extra')
+    COLUMNS = hourly_store.SIMPLE_COLUMNS
+
     def __init__(self, uct_time, val):
 
-        self.datetime = datetime.datetime.strptime(uct_time, '%Y%m%dT%HZ')
-        self.month = self.datetime.month
-        self.value = val
-        self.original_value = val
+        self._stamp = hourly_store.uct_to_stamp(uct_time)
+        self._value = float(val)
+        self._flags = 0
+        self._extra = None
+
+    # Record for row i of store, without copying it
+    @classmethod
+    def view(cls, store, i):
+        record = cls.VIEW.__new__(cls.VIEW)
+        record._store = store
+        record._i = i
+        return record
+
+    # Value of a column, see hourly_store for the names
+    def _get(self, name):
+        if name == 'stamp':
+            return self._stamp
+        if name == 'value':
+            return self._value
+        if name == 'flags':
+            return self._flags
+        if self._extra != None and name in self._extra:
+            return self._extra[name]
+        if name == 'original_value':
+            return self._value
+        return np.nan
+
+    def _put(self, name, val):
+        if name == 'value':
+            # The first value is the original one
+            if self._extra == None or 'original_value' not in self._extra:
+                self._put('original_value', self._value)
+            self._value = val
+        elif name == 'flags':
+            self._flags = int(val)
+        else:
+            if self._extra == None:
+                self._extra = {}
+            self._extra[name] = val
+
+    @property
+    def stamp(self):
+        return int(self._get('stamp'))
+
+    @property
+    def datetime(self):
+        return hourly_store.stamp_to_datetime(self._get('stamp'))
+
+    @property
+    def uct_string(self):
+        return hourly_store.stamp_to_uct(self._get('stamp'))
+
+    @property
+    def month(self):
+        return self.datetime.month
+
+    @property
+    def value(self):
+        return self._get('value')
+
+    @property
+    def original_value(self):
+        return self._get('original_value')
 
     def set_value(self, new_val):
-        self.value = new_val
+        self._put('value', new_val)
+
+    # Flag bits, see hourly_store
+    def _get_flag(self, bit):
+        return bool(self._get('flags') & bit)
+
+    def _set_flag(self, bit, on):
+        if on:
+            self._put('flags', self._get('flags') | bit)
+        else:
+            self._put('flags', self._get('flags') & (~bit & 0xFF))
+
+    @property
+    def missing(self):
+        return self._get_flag(hourly_store.MISSING)
+
+    @missing.setter
+    def missing(self, is_missing):
+        self._set_flag(hourly_store.MISSING, is_missing)
+
+
+
+class RowView :
+    """ Mixin making a record a view onto row _i of the HourlyStore
+    _store, changes go to the store.  Only the view classes use it. """
+
+    __slots__ = ()
+
+    def _get(self, name):
+        return self._store._data[name][self._i]
+
+    def _put(self, name, val):
+        self._store._data[name][self._i] = val
+
+
+
+class SimpleView(RowView, SimpleContainer):
+    """ SimpleContainer viewing a store row, see SimpleContainer.view() """
+
+    __slots__ = ('_store', '_i')
+
+
+SimpleContainer.VIEW = SimpleView
@@ -0,0 +1,244 @@
+import os
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Headless autocorrelation and power spectrum tools.
+# Everything is done with FFTs so full length autocorrelations
+# of decades of hourly data are O(n log n).  Missing hours
+# (NaN or the -99.99 placeholder) are masked out instead of
+# being treated as real values.
+#
+# The continuous wavelet transform (Ricker wavelet, like the
+# scipy.signal.cwt default) of many series and widths is done with
+# one FFT per series and one per width, see cwt() and wavelet_power().
+
+
+
+# Return an array of values from a list of SimpleContainers or
+# HourlyDataContainers with missing hours set to NaN
+def values_from_hourly_data(hourly_data):
+    vals = np.array([d.value for d in hourly_data], dtype=np.float64)
+    missing = [getattr(d, 'missing', False) for d in hourly_data]
+    vals[np.array(missing, dtype=bool)] = np.nan
+    vals[vals == -99.99] = np.nan
+    return vals
+
+
+# Stack a dict of series (or a single 1D series) into a 2D array
+# padded with NaN so all series are transformed in one batch.
+def _stack_series(series):
+    if isinstance(series, dict):
+        names = list(series.keys())
+        vals = [np.asarray(v, dtype=np.float64) for v in series.values()]
+    else:
+        arr = np.asarray(series, dtype=np.float64)
+        if arr.ndim == 1:
+            arr = arr.reshape(1, -1)
+        names = list(range(arr.shape[0]))
+        vals = list(arr)
+
+    n = max(len(v) for v in vals) if len(vals) > 0 else 0
+    stacked = np.full((len(vals), n), np.nan)
+    for i, v in enumerate(vals):
+        stacked[i, :len(v)] = v
+    return names, stacked
+
+
+# Smallest power of 2 >= n
+def _fft_length(n):
+    return 1 << int(max(n - 1, 0)).bit_length()
+
+
+# Autocorrelation for lags 0 ... n_lags of every series in one FFT pass.
+#
+# series: a 1D array, a 2D array (n_series x n_hours) or a dict of
+#         name -> 1D array.  NaN values are treated as missing.
+# n_lags: maximum lag in hours, None for the full series length - 1
+# adjusted: if False (default) each lag is divided by the lag 0 sum.
+#         If True each lag is divided by the number of valid pairs at
+#         that lag before normalizing, which removes the bias towards
+#         zero at long lags.
+# Unlike plt.acorr the series are demeaned first, so the values differ
+# from the old plt.acorr plot.
+#
+# Returns the lags array and an OrderedDict name -> autocorrelation array.
+# Names are the dict keys, or the row numbers for array inputs.
+def fft_autocorrelation(series, n_lags=None, adjusted=False):
+    names, x = _stack_series(series)
+    n = x.shape[1]
+    if n_lags == None or n_lags > n - 1:
+        n_lags = n - 1
+
+    mask = np.isfinite(x)
+    counts = mask.sum(axis=1)
+    means = np.where(counts > 0,
+            np.nansum(x, axis=1) / np.maximum(counts, 1), 0.)
+    x = np.where(mask, x - means[:, np.newaxis], 0.)
+
+    # Zero padding to >= 2n - 1 makes the circular correlation linear
+    n_fft = _fft_length(2 * n - 1)
+    f = np.fft.rfft(x, n_fft, axis=1)
+    acov = np.fft.irfft(f * np.conj(f), n_fft, axis=1)[:, :n_lags+1]
+
+    if adjusted:
+        fm = np.fft.rfft(mask.astype(np.float64), n_fft, axis=1)
+        pairs = np.rint(np.fft.irfft(fm * np.conj(fm), n_fft, axis=1)[:, :n_lags+1])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            acov = np.where(pairs > 0, acov / pairs, np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        acf = acov / acov[:, :1]
+
+    results = OrderedDict()
+    for i, name in enumerate(names):
+        results[name] = acf[i]
+    return np.arange(n_lags + 1), results
+
+
+# One sided power spectrum (periodogram) of every series.
+# The series mean is removed if detrend, then missing values are set
+# to 0 and the power is rescaled by the fraction of valid hours.  Frequencies are returned
+# in cycles per hour, so 1/24. is the daily cycle.
+#
+# Returns the frequency array and an OrderedDict name -> power array.
+def power_spectrum(series, detrend=True):
+    names, x = _stack_series(series)
+    n = x.shape[1]
+
+    mask = np.isfinite(x)
+    frac_valid = mask.sum(axis=1) / float(max(n, 1))
+    if detrend:
+        means = np.nansum(x, axis=1) / np.maximum(mask.sum(axis=1), 1)
+        x = x - means[:, np.newaxis]
+    x = np.where(mask, x, 0.)
+
+    power = np.abs(np.fft.rfft(x, axis=1))**2 / max(n, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        power = power / frac_valid[:, np.newaxis]
+
+    results = OrderedDict()
+    for i, name in enumerate(names):
+        results[name] = power[i]
+    return np.fft.rfftfreq(n, d=1.), results
+
+
+
+# Ricker ("Mexican hat") wavelet of width a sampled at points
+# values, the same as the former scipy.signal.ricker
+def ricker(points, a):
+    norm = 2 / (np.sqrt(3 * a) * (np.pi**0.25))
+    x = np.arange(0, points) - (points - 1.0) / 2
+    xsq = x**2
+    wsq = a**2
+    return norm * (1 - xsq / wsq) * np.exp(-xsq / (2 * wsq))
+
+
+
+# Wavelet length used for a width, like scipy.signal.cwt
+def _wavelet_length(width, n):
+    return int(min(10 * width, n))
+
+
+
+# Series stacked for the CWT with missing hours set to the series
+# mean, plus their rfft and the FFT length fitting every width
+def _cwt_setup(series, widths):
+    names, x = _stack_series(series)
+    n = x.shape[1]
+    mask = np.isfinite(x)
+    means = np.nansum(x, axis=1) / np.maximum(mask.sum(axis=1), 1)
+    x = np.where(mask, x, means[:, np.newaxis])
+    n_fft = _fft_length(n + _wavelet_length(max(widths), n) - 1)
+    return names, mask, n, n_fft, np.fft.rfft(x, n_fft, axis=1)
+
+
+
+# CWT coefficients of every series for one width, the 'same'
+# part of the full convolution
+def _cwt_width(f, n, n_fft, width):
+    m = _wavelet_length(width, n)
+    wavelet = np.conj(ricker(m, width)[::-1])
+    full = np.fft.irfft(f * np.fft.rfft(wavelet, n_fft), n_fft, axis=1)
+    start = (m - 1) // 2
+    return full[:, start:start + n]
+
+
+
+# Run fn(i, width) for every width, on n_workers threads
+# (None for one per CPU).  numpy's FFTs release the GIL.
+def _map_widths(fn, widths, n_workers):
+    if n_workers == None:
+        n_workers = os.cpu_count() or 1
+    if n_workers == 1:
+        return [fn(i, w) for i, w in enumerate(widths)]
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(fn, range(len(widths)), widths))
+
+
+
+# Continuous wavelet transform of every series with the Ricker
+# wavelet, matching scipy.signal.cwt(x, ricker, widths).
+# series  : as for fft_autocorrelation(), missing hours are set to the mean
+# widths  : wavelet widths in hours, ~1/4 of the period resolved
+# Returns an OrderedDict name -> n_widths x n_hours array.
+def cwt(series, widths, n_workers=1):
+    widths = np.asarray(widths)
+    names, mask, n, n_fft, f = _cwt_setup(series, widths)
+    out = np.empty((len(names), len(widths), n))
+    def fill(i, width):
+        out[:, i, :] = _cwt_width(f, n, n_fft, width)
+    _map_widths(fill, widths, n_workers)
+    return OrderedDict((name, out[i]) for i, name in enumerate(names))
+
+
+
+# Cache file for the wavelet power of one series
+def _power_cache_path(cache_dir, values, widths, trim):
+    key = hashlib.sha1(np.ascontiguousarray(values).tobytes())
+    key.update(np.asarray(widths, dtype=np.float64).tobytes())
+    key.update(str(trim).encode())
+    return os.path.join(cache_dir, 'cwt_power_{}.npy'.format(key.hexdigest()))
+
+
+
+# Wavelet power spectrum: the mean squared CWT coefficient of every
+# series at every width, over the valid hours, skipping trim hours
+# at both ends to drop edge effects.  Only one width of
+# coefficients is in memory per thread, so decades of hourly
+# data for many regions (demand, wind, solar, net load...) fit.
+# With cache_dir each series' spectrum is saved there and reused
+# while the series, widths and trim are unchanged.
+# Returns the widths and an OrderedDict name -> power array.
+def wavelet_power(series, widths, trim=0, n_workers=1, cache_dir=None):
+    widths = np.asarray(widths)
+    names, stacked = _stack_series(series)
+    results = OrderedDict((name, None) for name in names)
+
+    todo = list(range(len(names)))
+    if cache_dir != None:
+        os.makedirs(cache_dir, exist_ok=True)
+        paths = [_power_cache_path(cache_dir, stacked[i], widths, trim) for i in todo]
+        for i in list(todo):
+            if os.path.exists(paths[i]):
+                results[names[i]] = np.load(paths[i])
+                todo.remove(i)
+
+    if len(todo) > 0:
+        _, mask, n, n_fft, f = _cwt_setup(stacked[todo], widths)
+        mask[:, :trim] = False
+        mask[:, max(n - trim, 0):] = False
+        power = np.empty((len(todo), len(widths)))
+        def fill(i, width):
+            coefs = _cwt_width(f, n, n_fft, width)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                power[:, i] = np.where(mask, coefs**2, 0.).sum(axis=1) / mask.sum(axis=1)
+        _map_widths(fill, widths, n_workers)
+        for j, i in enumerate(todo):
+            results[names[i]] = power[j]
+            if cache_dir != None:
+                np.save(paths[i], power[j])
+
+    return widths, results
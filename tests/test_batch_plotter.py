@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import os
+import numpy as np
+import pytest
+matplotlib = pytest.importorskip('matplotlib')
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from batch_plotter import make_spec, render_figures
+
+
+def hist_spec(name):
+    x = np.random.RandomState(0).normal(size=500)
+    return make_spec('plot_hist', x, 'x', 'Counts', name, name)
+
+
+def test_render_figures(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    specs = [hist_spec('hist_a'), make_spec('nope'), hist_spec('hist_b')]
+    results = render_figures(specs, n_workers=2)
+    assert(results[0] == None and results[2] == None)
+    assert('AttributeError' in results[1])
+    assert(os.path.exists('plots/hist_a.png') and os.path.exists('plots/hist_b.png'))
+
+
+def test_serial_keeps_caller_figures(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fig = plt.figure()
+    try:
+        assert(render_figures([hist_spec('hist_c')], n_workers=1) == [None])
+        assert(os.path.exists('plots/hist_c.png'))
+        assert(fig.number in plt.get_fignums())
+    finally:
+        plt.close(fig)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import datetime
+import numpy as np
+import calendar_cube
+import hourly_store
+import time_helpers
+from hourly_store import HourlyStore, HourlyRecords
+from simple_container import SimpleContainer
+
+
+def make_stamps(start, stop):
+    return np.arange(hourly_store.datetime_to_stamp(start),
+            hourly_store.datetime_to_stamp(stop))
+
+
+def test_calendar_matches_datetime():
+    stamps = make_stamps(datetime.datetime(2003, 12, 25), datetime.datetime(2011, 1, 8))
+    calendar = calendar_cube.CalendarIndex(stamps)
+    for i in range(0, len(stamps), 37):
+        dt = hourly_store.stamp_to_datetime(stamps[i])
+        iso = dt.isocalendar()
+        assert((calendar.year[i], calendar.month[i], calendar.day[i], calendar.hour[i]) == \
+                (dt.year, dt.month, dt.day, dt.hour))
+        assert((calendar.iso_year[i], calendar.week[i]) == (iso[0], iso[1]))
+        assert(calendar.season[i] == (dt.month - 1) // 3)
+
+
+def test_aggregate_stats():
+    stamps = make_stamps(datetime.datetime(2015, 1, 1), datetime.datetime(2017, 1, 1))
+    values = np.random.RandomState(0).normal(size=len(stamps))
+    values[::7] = np.nan
+    cube = calendar_cube.aggregate(stamps, values, ('year', 'month'), quantiles=[0., 0.25, 0.5, 1.])
+    assert(len(cube) == 24)
+
+    calendar = calendar_cube.CalendarIndex(stamps)
+    sel = (calendar.year == 2016) & (calendar.month == 2)
+    vals = values[sel][np.isfinite(values[sel])]
+    assert(cube.to_dict('n_hours')[(2016, 2)] == 29 * 24)
+    assert(cube.to_dict('count')[(2016, 2)] == len(vals))
+    assert(np.isclose(cube.to_dict('mean')[(2016, 2)], vals.mean()))
+    for q in [0., 0.25, 0.5, 1.]:
+        assert(np.isclose(cube.to_dict(q)[(2016, 2)], np.percentile(vals, 100 * q)))
+    assert(np.isclose(cube.per_hour('sum')[np.argmax(sel)], vals.sum()))
+
+
+def test_time_helpers_on_records_and_lists():
+    stamps = make_stamps(datetime.datetime(2015, 1, 1), datetime.datetime(2016, 1, 1))
+    store = HourlyStore(hourly_store.SIMPLE_COLUMNS)
+    store.append(stamps, 1. + (stamps % 24) / 24.)
+    records = HourlyRecords(store, SimpleContainer)
+    as_list = [SimpleContainer.view(store, i) for i in range(0, len(store), 5)]
+
+    annual = time_helpers.calculate_annaul_averages(records)
+    assert(annual[2015][0] == 8760)
+    assert(np.isclose(annual[2015][2], np.mean(store['value'])))
+    monthly = time_helpers.calculate_monthly_averages(records)
+    assert(list(monthly[2015].keys()) == calendar_cube.MONTHS)
+    seasonal = time_helpers.calculate_seasonal_averages(as_list)
+    assert(list(seasonal[2015].keys()) == calendar_cube.SEASONS)
+
+    time_helpers.normalize_to_annual_averages(annual, records)
+    assert(np.isclose(np.mean(store['value']), 1.))
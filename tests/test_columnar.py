@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import columnar
+from collections import OrderedDict
+
+
+def make_columns(n_hours=1000):
+    r = np.random.RandomState(5)
+    demand = 1000. + r.normal(size=n_hours) * 50.
+    demand[::97] = np.nan
+    return OrderedDict([
+        ('stamp', np.arange(n_hours, dtype=np.int64) + 400000),
+        ('demand', demand),
+        ('outlier', r.rand(n_hours) < 0.01),
+    ])
+
+
+def test_projection_time_and_value_ranges(tmp_path):
+    columns = make_columns()
+    columnar.write_region(str(tmp_path), 'TEST', columns, chunk_hours=100)
+    meta = columnar.read_meta(str(tmp_path), 'TEST')
+    assert(len(meta['chunks']) == 10)
+
+    full = columnar.read_region(str(tmp_path), 'TEST')
+    for name, values in columns.items():
+        assert(np.array_equal(full[name], values, equal_nan=True))
+
+    part = columnar.read_region(str(tmp_path), 'TEST', ['demand'], start=400150, end=np.datetime64(400420, 'h'))
+    assert(list(part.keys()) == ['stamp', 'demand'])
+    assert(np.array_equal(part['stamp'], columns['stamp'][150:420]))
+    assert(np.array_equal(part['demand'], columns['demand'][150:420], equal_nan=True))
+
+    flagged = columnar.read_region(str(tmp_path), 'TEST', ['outlier'], value_range={'outlier': (True, None)})
+    assert(np.array_equal(flagged['stamp'], columns['stamp'][columns['outlier']]))
+    assert(columnar.read_regions(str(tmp_path), columns=['demand']).keys() == {'TEST'})
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import correlations
+
+
+# Direct pairwise-complete Pearson correlation of two series
+def pairwise(x, y):
+    ok = np.isfinite(x) & np.isfinite(y)
+    return np.corrcoef(x[ok], y[ok])[0, 1]
+
+
+def make_data(n_hours=1000, n_regions=4, seed=1):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(n_hours, n_regions)).cumsum(axis=0) + 1000.
+    data[rng.random(data.shape) < 0.1] = np.nan
+    return data
+
+
+def test_pairwise_complete_with_lags():
+    data = make_data()
+    corrs = correlations.correlation_matrix(data, lags=[0, 3], block_hours=128, n_workers=2)
+    for lag, corr in corrs.items():
+        for i in range(data.shape[1]):
+            for j in range(data.shape[1]):
+                expected = pairwise(data[:len(data)-lag, i], data[lag:, j])
+                assert(np.isclose(corr[i, j], expected))
+
+
+def test_streaming_matches_single_pass():
+    data = make_data()
+    full = correlations.correlation_matrix(data, lags=[0, 1, 24])
+    acc = correlations.CorrelationAccumulator(data.shape[1], lags=[0, 1, 24])
+    for start in range(0, len(data), 300):
+        acc.update(data[start:start+300])
+    for lag, corr in acc.result().items():
+        assert(np.allclose(corr, full[lag]))
+
+
+def test_spearman_ranks():
+    data = np.array([[1., 10.], [2., 30.], [2., 20.], [5., np.nan], [4., 40.]])
+    ranks = correlations.rank_columns(data)
+    assert(np.array_equal(ranks[:, 0], [1., 2.5, 2.5, 5., 4.]))
+    assert(np.isnan(ranks[3, 1]))
+    corr = correlations.correlation_matrix(data, method='spearman')[0]
+    assert(np.isclose(corr[0, 0], 1.))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import datetime
+import numpy as np
+import pytest
+from demand_data import DemandData
+
+
+# Two weeks of a noisy daily cycle with a few missing hours and spikes
+def make_rows(n_hours=24*14):
+    r = np.random.RandomState(0)
+    base = datetime.datetime(2016, 1, 1)
+    rows = []
+    for i in range(n_hours):
+        v = 1000 + 200 * np.sin(2 * np.pi * i / 24) + r.normal() * 10
+        if i % 100 == 7:
+            v = 'MISSING'
+        elif i % 77 == 5:
+            v = '%.2f' % (v * 3)
+        else:
+            v = '%.2f' % v
+        rows.append(((base + datetime.timedelta(hours=i)).strftime('%Y%m%dT%HZ'), v))
+    return rows
+
+
+@pytest.fixture
+def rows(tmp_path, monkeypatch):
+    rows = make_rows()
+    (tmp_path / 'data').mkdir()
+    with open(tmp_path / 'data' / 'TEST.csv', 'w') as f:
+        f.write('series_id,time,demand (MW),forecast demand (MW)\n')
+        for t, v in rows:
+            f.write('EBA.TEST,{},{},\n'.format(t, v))
+    monkeypatch.chdir(tmp_path)
+    return rows
+
+
+def full_chain(dem):
+    dem.find_hourly_outliers()
+    dem.compute_daily_averages()
+    dem.compute_hour_centered_averages()
+    dem.set_hourly_demand(0)
+    dem.set_24_hourly_demand()
+
+
+def test_records_match_csv(rows):
+    from_csv = DemandData('TEST')
+    from_records = DemandData('TEST', rows)
+    assert(np.array_equal(from_csv.get_hourly_values('demand'),
+            from_records.get_hourly_values('demand'), equal_nan=True))
+    assert(np.array_equal(from_csv.store['stamp'], from_records.store['stamp']))
+
+
+def test_append_matches_full_computation(rows):
+    full = DemandData('TEST')
+    full_chain(full)
+
+    part = DemandData('TEST', rows[:200])
+    full_chain(part)
+    # Use the same thresholds and profiles as the full series
+    part.outlier_bounds = full.outlier_bounds
+    part.hourly_demand = full.hourly_demand
+    part.hourly_demand_avgs = full.hourly_demand_avgs
+    for d in part.hourly_data:
+        d.outlier = False
+    part._flag_outliers(0)
+    part.compute_daily_averages()
+    part.set_24_hourly_demand()
+
+    for row in rows[200:]:
+        assert(part.append([row]) == 1)
+    # Overlapping pulls are skipped
+    assert(part.append(rows[-5:]) == 0)
+
+    for field in ['deltas_valid', 'delta_previous', 'delta_following',
+            'outlier', 'daily_avg', 'centered_average', 'centered_iqr_average',
+            'demand_estimate', 'demand_estimate_outlier']:
+        assert(np.array_equal(full.get_hourly_values(field),
+                part.get_hourly_values(field), equal_nan=True)), field
+
+
+def test_lazy_profile_skips_centered_averages(rows):
+    dem = DemandData('TEST', rows)
+    assert(len(dem.hourly_demand['Annual']) == 24)
+    assert('outliers' in dem._valid)
+    assert('centered_averages' not in dem._valid)
+    assert('demand_estimates' not in dem._valid)
+
+
+def test_lazy_fields_invalidate(rows):
+    lazy = DemandData('TEST', rows)
+    estimates = lazy.get_hourly_values('demand_estimate')
+
+    eager = DemandData('TEST', rows)
+    full_chain(eager)
+    assert(np.allclose(estimates, eager.get_hourly_values('demand_estimate')))
+
+    # Changing demand makes everything stale
+    lazy.set_demand(100, 5000.)
+    assert(lazy._valid == set())
+    lazy.ensure('demand_estimates')
+    assert(lazy.hourly_data[100].outlier)
+
+    # New settings only invalidate what is downstream
+    lazy.compute_hour_centered_averages(10)
+    assert('hourly_demand' in lazy._valid)
+    assert('demand_estimates' not in lazy._valid)
+
+
+def test_remove_partial_years(rows):
+    rows = [('20151231T23Z', '1000.0')] + make_rows(24*366) + \
+            [('20170101T{:02d}Z'.format(h), '1000.0') for h in range(5)]
+    dem = DemandData('TEST', rows)
+    assert(len(dem.year(2017)) == 5)
+    dem.remove_partial_years()
+    assert(len(dem.hourly_data) == 24*366)
+    assert(len(dem.year(2016)) == 24*366)
+
+
+def test_estimates_scored_every_year():
+    rows = make_rows(24*365*2)
+    dem = DemandData('TEST', rows)
+    dem.set_24_hourly_demand(0.01)
+    flagged = dem.get_hourly_values('demand_estimate_outlier')
+    assert(flagged[24*366:].sum() > 0)
+    n = dem.n_hours_surrounding
+    assert(not flagged[:n].any() and not flagged[-n+1:].any())
+
+    # Streaming scoring against the fitted profiles matches the series
+    last = slice(-200, -n)
+    estimates, outliers = dem.score_demand(dem.store['stamp'][last], dem.store['value'][last],
+            dem.store['centered_iqr_average'][last])
+    assert(np.allclose(estimates, dem.get_hourly_values('demand_estimate')[last]))
+    assert(np.array_equal(outliers, flagged[last]))
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import downsampling
+
+
+def test_lttb_keeps_end_points_and_budget():
+    x = np.arange(10000)
+    y = np.sin(x / 50.)
+    idx = downsampling.lttb_indices(x, y, 500)
+    assert(len(idx) == 500)
+    assert(idx[0] == 0 and idx[-1] == 9999)
+    assert(np.all(np.diff(idx) > 0))
+
+
+def test_lttb_keeps_spike():
+    y = np.zeros(1000)
+    y[321] = 100.
+    idx = downsampling.lttb_indices(np.arange(1000), y, 50)
+    assert(321 in idx)
+
+
+def test_lttb_skips_missing():
+    y = np.ones(100)
+    y[10:20] = np.nan
+    idx = downsampling.lttb_indices(np.arange(100), y, 10)
+    assert(not np.any((idx >= 10) & (idx < 20)))
+
+
+def test_min_max_keeps_extremes():
+    y = np.random.RandomState(1).normal(size=5000)
+    idx = downsampling.min_max_indices(y, 100)
+    assert(len(idx) <= 200)
+    assert(np.argmax(y) in idx and np.argmin(y) in idx)
+
+
+def test_short_series_untouched():
+    idx = downsampling.lttb_indices([0, 1, 2], [1., 2., 3.], 100)
+    assert(list(idx) == [0, 1, 2])
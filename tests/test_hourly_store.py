@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import sys
+import datetime
+import tracemalloc
+import numpy as np
+import hourly_store
+from hourly_store import HourlyStore, HourlyRecords
+from hourly_data_container import HourlyDataContainer
+
+
+def test_stamps_round_trip():
+    stamps = hourly_store.uct_to_stamps(['20150701T05Z', '20160229T23Z'])
+    assert(hourly_store.stamp_to_uct(stamps[0]) == '20150701T05Z')
+    assert(hourly_store.stamp_to_datetime(stamps[1]) == datetime.datetime(2016, 2, 29, 23))
+    assert(list(hourly_store.stamps_to_months(stamps)) == [7, 2])
+    assert(list(hourly_store.stamps_to_hours(stamps)) == [5, 23])
+    assert(list(hourly_store.stamps_to_years(stamps)) == [2015, 2016])
+
+
+def test_records_are_views():
+    store = HourlyStore()
+    for i in range(100):
+        store.append([400000 + i], [float(i)])
+    store.append([400100], [np.nan])
+    assert(len(store) == 101)
+    assert(store.nbytes() / len(store) < 100)
+
+    records = HourlyRecords(store, HourlyDataContainer)
+    records[10].outlier = True
+    records[10].set_demand(5.)
+    assert(store.flag(hourly_store.OUTLIER)[10])
+    assert(store['value'][10] == 5. and store['original_value'][10] == 10.)
+    assert(records[-1].missing and np.isnan(records[-1].demand))
+    assert(np.isnan(records[0].daily_avg))
+
+    window = records[20:30]
+    assert(len(window) == 10 and window[0].hour == 20)
+
+
+def test_standalone_container():
+    d = HourlyDataContainer(3, '20150101T05Z', 'EMPTY')
+    assert(d.missing and not d.outlier and d.hour == 3 and d.daily_hour == 5)
+    assert(d.month == 1 and d.uct_string == '20150101T05Z')
+    assert(not hasattr(d, '__dict__'))
+
+    d.set_demand(7.)
+    d.set_centered_average(6.)
+    assert(d.demand == 7. and np.isnan(d.original_value) and d.centered_average == 6.)
+    assert(np.isnan(d.demand_estimate))
+
+
+# The containers with a __dict__ took about 680 bytes an hour,
+# standalone ones should take at most a fifth of that
+def test_standalone_container_size():
+    n = 2000
+    start = hourly_store.uct_to_stamp('20160101T00Z')
+    times = [hourly_store.stamp_to_uct(start + i) for i in range(n)]
+    demands = ['{:.1f}'.format(10000 + i * 1.3) for i in range(n)]
+    hour_numbers = list(range(10000, 10000 + n))
+    HourlyDataContainer(1, times[0], demands[0])
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    hours = [HourlyDataContainer(h, t, d) for h, t, d in zip(hour_numbers, times, demands)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(s.size_diff for s in after.compare_to(before, 'filename')) - sys.getsizeof(hours)
+    assert(used / n < 680 / 5), "{:.0f} bytes per container".format(used / n)
+
+
+def test_time_lookups():
+    start = hourly_store.datetime_to_stamp(datetime.datetime(2015, 12, 31, 20))
+    store = HourlyStore()
+    store.append(np.arange(start, start + 3 * 8784), np.arange(3 * 8784, dtype=np.float64))
+    records = HourlyRecords(store, HourlyDataContainer)
+
+    year = records.year(2016)
+    assert(len(year) == 8784)
+    assert(year[0].datetime == datetime.datetime(2016, 1, 1))
+    assert(year[-1].datetime == datetime.datetime(2016, 12, 31, 23))
+    assert(year.store is store)
+
+    window = records.slice('20160301T00Z', datetime.datetime(2016, 3, 2))
+    assert(len(window) == 24)
+    assert(window.loc('20160301T05Z').value == records.loc(np.datetime64('2016-03-01T05')).value)
+    assert(len(window.slice(None, '20160301T06Z')) == 6)
+    try:
+        window.loc('20160302T00Z')
+        assert(False), "hour outside the window should not be found"
+    except KeyError:
+        pass
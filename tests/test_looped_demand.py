@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pytest
+from datetime import datetime
+pd = pytest.importorskip('pandas')
+import looped_demand
+
+
+def make_frame(start, end):
+    times = pd.date_range(start, end, freq='h', inclusive='left')
+    return pd.DataFrame({'year': times.year, 'month': times.month, 'day': times.day,
+            'hour': times.hour + 1, 'demand': np.arange(len(times), dtype=np.float64)})
+
+
+@pytest.mark.parametrize('n_years', [1, 3, 4])
+def test_looped_file_is_continuous(tmp_path, n_years):
+    df = make_frame('2015-06-01', '2020-01-01')
+    window = looped_demand.cut_years(df, datetime(2015, 8, 1), n_years)
+    assert(len(window.index) == (datetime(2015 + n_years, 8, 1) - datetime(2015, 8, 1)).days * 24)
+
+    path = tmp_path / 'looped.csv'
+    n_rows = looped_demand.write_looped_file(window, str(path), 1999, 2021, chunk_rows=5000)
+    looped = pd.read_csv(path)
+    assert(n_rows == len(looped.index) == (datetime(2022, 1, 1) - datetime(1999, 1, 1)).days * 24)
+    assert(len(looped_demand.find_gaps(looped)) == 0)
+    assert(list(looped.columns) == list(df.columns))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pytest
+import mem_format
+from collections import OrderedDict
+
+
+def test_mem_hours_round_trip():
+    times = np.array(['2015-07-02T23', '2015-07-03T00', '2015-07-03T01', '2016-03-01T00'], dtype='datetime64[h]')
+    year, month, day, hour = mem_format.to_mem(times)
+    assert(list(zip(year, month, day, hour)) == [(2015, 7, 2, 23), (2015, 7, 2, 24), (2015, 7, 3, 1), (2016, 2, 29, 24)])
+    assert(np.array_equal(mem_format.from_mem(year, month, day, hour), times))
+    starts = mem_format.from_mem(year, month, day, hour, hour_ending=False)
+    assert(np.array_equal(starts, times - 1))
+    assert(np.array_equal(mem_format.sem_strings_to_datetimes(['20150702T23Z', '20150702T24Z']), starts[:2]))
+
+
+def test_write_mem_csv(tmp_path):
+    times = np.arange(np.datetime64('2015-12-31T20'), np.datetime64('2016-01-01T04'))
+    values = np.linspace(0., 1., len(times))
+    values[3] = np.nan
+    path = str(tmp_path / 'mem.csv')
+    mem_format.write_mem_csv(path, times, OrderedDict([('demand (MW)', values)]),
+            comments=['Test file'], chunk_rows=3)
+    lines = open(path).read().splitlines()
+    assert(lines[:3] == ['Test file', 'BEGIN_DATA', 'year,month,day,hour,demand (MW)'])
+    assert(lines[3] == '2015,12,31,20,0')
+    assert(lines[6] == '2015,12,31,23,NA')
+    assert(lines[7].startswith('2015,12,31,24,'))
+    assert(len(lines) == 3 + len(times))
+
+
+def test_demand_data_round_trip(tmp_path, monkeypatch):
+    pytest.importorskip('pandas')
+    from demand_data import DemandData
+    records = [('201601{:02d}T{:02d}Z'.format(1 + i // 24, i % 24), str(1000. + i)) for i in range(72)]
+    records[5] = (records[5][0], 'MISSING')
+    dem = DemandData('TEST', records)
+    path = str(tmp_path / 'TEST_for_MEM.csv')
+    mem_format.export_mem(dem, path)
+
+    df = mem_format.read_mem_csv(path)
+    assert(list(df.iloc[0][['year', 'month', 'day', 'hour']]) == [2015, 12, 31, 24])
+    again = DemandData('TEST', mem_format.read_mem_records(path, 'demand (MW)'))
+    assert(np.array_equal(again.store['stamp'], dem.store['stamp']))
+    assert(np.array_equal(again.store['value'], dem.store['value'], equal_nan=True))
+
+
+def test_sem_time():
+    pytest.importorskip('pandas')
+    from uncertainty_tools import sem_time
+    assert(sem_time('20150702T24Z') == '20150702T23Z')
+    assert(sem_time('20150702T01Z') == '20150702T00Z')
+    assert(sem_time('20150702T00Z') == '20150702T00Z')
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pytest
+pd = pytest.importorskip('pandas')
+import mice_tools
+
+
+def test_split_chains_matches_filtering(tmp_path):
+    n, chains = 500, 6
+    df = pd.DataFrame({'date_time': np.tile(pd.date_range('2019-01-01', periods=n, freq='h').astype(str), chains),
+            'x': np.random.RandomState(0).rand(n * chains).round(6),
+            'imp_index': np.repeat(np.arange(1, chains + 1), n)})
+    df.loc[::7, 'x'] = np.nan
+    master = tmp_path / 'master.csv'
+    df.to_csv(master, index=False, na_rep='NA')
+
+    counts = mice_tools.split_chains(str(master), str(tmp_path / 'chain_{chain}.csv'), chunk_rows=700, n_writers=3)
+    assert(list(counts.keys()) == [str(i) for i in range(1, chains + 1)])
+    assert(all(count == n for count in counts.values()))
+    for i in range(1, chains + 1):
+        chain = pd.read_csv(tmp_path / 'chain_{}.csv'.format(i), na_values=['NA'])
+        expected = df.loc[df['imp_index'] == i].reset_index(drop=True)
+        assert(list(chain['date_time']) == list(expected['date_time']))
+        assert(np.array_equal(chain['x'].values, expected['x'].values, equal_nan=True))
+
+
+def test_lag_frame_pads_instead_of_wrapping():
+    df = pd.DataFrame({'CISO': [1., 2., 3., 4.], 'TIDC': [10., np.nan, 30., 40.]})
+    lagged = mice_tools.lag_frame(df, lags=[0, 1, -2], dtype=np.float32)
+    assert(list(lagged.columns) == ['CISO', 'CISO_Lag1', 'CISO_Lead2', 'TIDC', 'TIDC_Lag1', 'TIDC_Lead2'])
+    assert(lagged.values.dtype == np.float32)
+    assert(np.array_equal(lagged['CISO_Lag1'].values, [np.nan, 1., 2., 3.], equal_nan=True))
+    assert(np.array_equal(lagged['TIDC_Lead2'].values, [30., 40., np.nan, np.nan], equal_nan=True))
+    assert(np.array_equal(lagged['TIDC'].values, df['TIDC'].values, equal_nan=True))
+
+    views = mice_tools.lag_views(df.values, [0, 1, 24])
+    assert(all(view.base is views[0].base for view in views.values()))
+
+
+def test_impute_chains_fill_and_reproduce(tmp_path):
+    rng = np.random.default_rng(3)
+    base = np.sin(np.arange(2000) * 2 * np.pi / 24)
+    values = np.stack([100. + 10. * base, 50. + 4. * base, 20. - 3. * base], axis=1)
+    values += rng.normal(scale=0.2, size=values.shape)
+    truth = values.copy()
+    values[rng.random(values.shape) < 0.05] = np.nan
+    screened = np.zeros(values.shape, dtype=bool)
+    screened[100:110, 0] = True
+
+    chains = mice_tools.impute_chains(values, screened, n_chains=3, n_iter=3, seed=7,
+            n_workers=2, out_path=str(tmp_path / 'chains.npy'))
+    assert(chains.shape == (3,) + values.shape)
+    assert(not np.any(np.isnan(chains)))
+    observed = ~np.isnan(values) & ~screened
+    assert(np.allclose(chains[:, observed], values[observed].astype(np.float32)))
+    filled = ~observed
+    assert(np.abs(chains[:, filled] - truth[filled]).max() < 5.)
+    assert(not np.array_equal(chains[0], chains[1]))
+
+    again = mice_tools.impute_chains(values, screened, n_chains=3, n_iter=3, seed=7, n_workers=1)
+    assert(np.array_equal(again, np.load(tmp_path / 'chains.npy')))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import datetime
+import numpy as np
+import hourly_store
+import normalizations
+import time_helpers
+from collections import OrderedDict
+from hourly_store import HourlyStore, HourlyRecords
+from simple_container import SimpleContainer
+
+
+def make_records():
+    stamps = np.arange(hourly_store.datetime_to_stamp(datetime.datetime(2015, 1, 1)),
+            hourly_store.datetime_to_stamp(datetime.datetime(2017, 1, 1)))
+    store = HourlyStore(hourly_store.SIMPLE_COLUMNS)
+    store.append(stamps, np.random.RandomState(2).rand(len(stamps)) + 1.)
+    return HourlyRecords(store, SimpleContainer)
+
+
+def test_registry_round_trip(tmp_path):
+    records = make_records()
+    norms = normalizations.NormalizationRegistry(str(tmp_path))
+    norms.compute(records, 'wind', 'ERCO')
+
+    annual = time_helpers.calculate_annaul_averages(records)
+    loaded = norms.load('annual', 'wind', 'ERCO')
+    assert(isinstance(loaded, np.memmap))
+    assert(normalizations.annual_dict(loaded) == annual)
+    assert(norms.load('annual', 'wind', 'ERCO') is loaded)
+
+    means = norms.annual_means('wind', [2016, 2015, 1999], 'ERCO')
+    assert(means[0] == annual[2016][2] and means[1] == annual[2015][2] and np.isnan(means[2]))
+    monthly = time_helpers.calculate_monthly_averages(records)
+    assert(norms.monthly_means('wind', [2016], [7], 'ERCO')[0] == monthly[2016]['July'])
+    assert(np.array_equal(norms.table('wind', 'ERCO'),
+            time_helpers.get_24hr_x_52week_info(records, 'wind'), equal_nan=True))
+
+
+def test_pickled_files_are_converted(tmp_path):
+    norms = normalizations.NormalizationRegistry(str(tmp_path))
+    legacy = OrderedDict([(2015, [8760, 8760., 1.]), (2016, [8784, 17568., 2.])])
+    np.save(norms.path('annual', 'solar'), legacy)
+    assert(list(norms.annual_means('solar', [2016, 2015])) == [2., 1.])
+    assert(np.load(norms.path('annual', 'solar'), allow_pickle=False).dtype == normalizations.ANNUAL_DTYPE)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pytest
+pd = pytest.importorskip('pandas')
+import nyiso_tools
+
+
+def test_to_utc_uses_dst_tag():
+    stamps = ['11/02/2008 00:00:00', '11/02/2008 01:00:00', '11/02/2008 01:00:00', '11/02/2008 02:00:00', '07/01/2008 12:00:00']
+    zones = ['EDT', 'EDT', 'EST', 'EST', 'EDT']
+    utc = nyiso_tools.to_utc(stamps, zones)
+    expected = np.array(['2008-11-02T04', '2008-11-02T05', '2008-11-02T06', '2008-11-02T07', '2008-07-01T16'], dtype='datetime64[ns]')
+    assert(np.array_equal(utc, expected))
+
+
+def test_interpolate_gaps():
+    values = np.array([np.nan, 1., np.nan, 3., np.nan, np.nan, np.nan, 7., np.nan])
+    filled = nyiso_tools.interpolate_gaps(values)
+    assert(np.array_equal(filled, [np.nan, 1., 2., 3., 4., 5., 6., 7., np.nan], equal_nan=True))
+    short = nyiso_tools.interpolate_gaps(values, max_gap=2)
+    assert(np.array_equal(short, [np.nan, 1., 2., 3., np.nan, np.nan, np.nan, 7., np.nan], equal_nan=True))
+
+
+def test_read_archive_without_extracting(tmp_path):
+    import os, zipfile
+    days = []
+    for day in range(1, 4):
+        days.append(pd.DataFrame({'Time Stamp': ['01/{:02d}/2008 {:02d}:00:00'.format(day, h) for h in range(24)],
+                'Time Zone': 'EST', 'Name': 'WEST', 'PTID': 1, 'Integrated Load': np.arange(24.) + day}))
+    archive = tmp_path / 'nyiso_200801.zip'
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for day, df in enumerate(days):
+            zf.writestr('200801{:02d}palIntegrated.csv'.format(day + 1), df.to_csv(index=False))
+        zf.writestr('20080101palIntegrated_OLD.csv', days[0].to_csv(index=False))
+
+    cache = tmp_path / 'cache'
+    df = nyiso_tools.read_archive(str(archive), str(cache))
+    assert(len(df.index) == 72)
+    assert(list(df['Integrated Load'][24:48]) == list(np.arange(24.) + 2))
+    assert(len(os.listdir(cache)) == 1)
+    assert(sorted(os.listdir(tmp_path)) == ['cache', 'nyiso_200801.zip'])
+    assert(nyiso_tools.read_archives([str(archive)], cache_dir=str(cache)).equals(df))
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+
+from demand_data import DemandData
+from outlier_sweep import sweep_outliers
+from test_demand_data import make_rows
+
+
+def test_sweep_matches_demand_data():
+    rows = make_rows(24*60)
+    dem = DemandData('TEST', rows)
+    result = sweep_outliers(dem, lower_pcts=[5, 10], upper_pcts=[90, 95],
+            multipliers=[0.5, 1.5], estimate_cuts=[0.02, 0.05, 0.5], block_size=3)
+    assert(len(result) == 2 * 2 * 2 * 3)
+
+    for setting in [(5, 95, 1.5, 0.5), (10, 90, 0.5, 0.02), (5, 90, 0.5, 0.05)]:
+        i = result.index(*setting)
+        check = DemandData('TEST', rows)
+        check.find_hourly_outliers(setting[:2], setting[2])
+        check.set_24_hourly_demand(setting[3])
+        flags = [check.get_hourly_values(name) for name in ['missing', 'outlier', 'demand_estimate_outlier']]
+        assert(list(result.counts[i]) == [f.sum() for f in flags])
+        assert(result.overlaps[i, 1, 2] == (flags[1] & flags[2]).sum())
+    assert(result.counts[:, 2].max() > 0)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import os
+import datetime
+import numpy as np
+import pipeline
+
+
+def write_region(path, n_hours=24*14):
+    r = np.random.RandomState(0)
+    base = datetime.datetime(2016, 1, 1)
+    with open(path, 'w') as f:
+        f.write('series_id,time,demand (MW),forecast demand (MW)\n')
+        for i in range(n_hours):
+            v = 1000 + 200 * np.sin(2 * np.pi * i / 24) + r.normal() * 10
+            v = 'MISSING' if i % 100 == 7 else '%.2f' % v
+            t = (base + datetime.timedelta(hours=i)).strftime('%Y%m%dT%HZ')
+            f.write('EBA.TEST,{},{},\n'.format(t, v))
+
+
+def test_pipeline_resumes_and_reruns_changed_stages(tmp_path):
+    (tmp_path / 'data').mkdir()
+    write_region(str(tmp_path / 'data' / 'TEST.csv'))
+    params = {name: str(tmp_path / name) for name in ['work_dir', 'out_dir', 'norm_dir']}
+    params['data_dir'] = str(tmp_path / 'data')
+
+    summary = pipeline.run_pipeline(['TEST'], params, n_workers=1)
+    assert(summary['TEST'] == [list(pipeline.STAGES.keys()), None])
+    assert(os.path.exists(str(tmp_path / 'out_dir' / 'TEST_for_MEM.csv')))
+    assert(os.path.exists(str(tmp_path / 'norm_dir' / 'normalization_annual_demand_TEST.npy')))
+
+    assert(pipeline.run_pipeline(['TEST'], params, n_workers=1)['TEST'] == [[], None])
+
+    # A new rolling average setting re-runs rolling and what follows from it
+    params['iqr_val'] = 10
+    ran = pipeline.run_pipeline(['TEST'], params, n_workers=1)['TEST'][0]
+    assert(ran == ['rolling', 'profiles', 'estimates', 'export'])
+
+    # A lost output is rebuilt on its own
+    os.remove(str(tmp_path / 'out_dir' / 'TEST_for_MEM.csv'))
+    assert(pipeline.run_pipeline(['TEST'], params, n_workers=1)['TEST'][0] == ['export'])
+
+    run = pipeline.RegionRun('TEST', params['work_dir'])
+    assert(run.load('estimates').iqr_val == 10)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import helpers
+from quantile_sketch import QuantileSketch, merge_sketches
+from demand_data import DemandData
+from test_demand_data import make_rows
+
+
+# Fraction of x below each estimate compared to the requested percentiles
+def rank_error(x, estimates, pcts):
+    x = np.sort(x)
+    return np.max(np.abs(np.searchsorted(x, estimates) / len(x) - np.asarray(pcts) / 100.))
+
+
+def test_small_sketch_is_exact():
+    x = np.random.RandomState(0).normal(size=150)
+    sketch = QuantileSketch()
+    for v in x:
+        sketch.add(v)
+    assert(np.allclose(sketch.percentile([0, 5, 50, 95, 100]), np.percentile(x, [0, 5, 50, 95, 100])))
+    assert(np.allclose(helpers.check_avgs(sketch, 25), helpers.check_avgs(x, 25)))
+
+
+def test_streamed_and_merged_error():
+    r = np.random.RandomState(1)
+    chunks = [r.lognormal(size=50000) for i in range(4)]
+    x = np.concatenate(chunks)
+    pcts = [1, 5, 25, 50, 75, 95, 99]
+
+    streamed = QuantileSketch(seed=0)
+    for chunk in chunks:
+        streamed.update(chunk)
+    merged = merge_sketches([QuantileSketch(seed=i).update(chunk) for i, chunk in enumerate(chunks)])
+    for sketch in [streamed, merged]:
+        assert(len(sketch) == len(x))
+        assert(sum(len(items) for items in sketch.levels) < 4 * sketch.k)
+        assert(rank_error(x, sketch.percentile(pcts), pcts) < 0.015)
+        assert(sketch.percentile(100) == x.max())
+
+
+def test_outlier_sketch_backend():
+    rows = make_rows(24*60)
+    exact = DemandData('TEST', rows)
+    exact.find_hourly_outliers()
+
+    dem = DemandData('TEST', rows[:24*30])
+    dem.quantile_backend = 'sketch'
+    dem.find_hourly_outliers()
+    for row in rows[24*30:]:
+        dem.append([row])
+    assert(len(dem.delta_sketch) == np.isfinite(exact.get_hourly_values('delta_previous')).sum())
+    dem.find_hourly_outliers()
+    spread = exact.outlier_bounds[1] - exact.outlier_bounds[0]
+    assert(np.allclose(dem.outlier_bounds, exact.outlier_bounds, atol=0.02 * spread))
+
+
+def test_add_skips_inf_and_seeded_backend():
+    sketch = QuantileSketch()
+    for v in [1., np.inf, -np.inf, np.nan, 3.]:
+        sketch.add(v)
+    assert(len(sketch) == 2 and sketch.mean() == 2. and sketch.max == 3.)
+
+    rows = make_rows(24*60)
+    bounds = []
+    for i in range(2):
+        dem = DemandData('TEST', rows)
+        dem.quantile_backend = 'sketch'
+        dem.find_hourly_outliers()
+        bounds.append(dem.outlier_bounds)
+    assert(bounds[0] == bounds[1])
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pytest
+from collections import OrderedDict
+pd = pytest.importorskip('pandas')
+import mem_format
+import renewables_data
+
+
+def write_sites(path, n_hours=500, n_sites=12):
+    rng = np.random.RandomState(4)
+    times = np.datetime64('2015-01-01T00', 'h') + np.arange(n_hours)
+    cfs = rng.rand(n_hours, n_sites) * np.linspace(0.2, 1., n_sites)
+    cfs[rng.rand(n_hours, n_sites) < 0.02] = np.nan
+    columns = OrderedDict(('cell{}'.format(i), cfs[:, i]) for i in range(n_sites))
+    mem_format.write_mem_csv(str(path), times, columns, hour_ending=False, comments=['MERRA-2 cells'])
+    return times, cfs
+
+
+def test_top_sites_weighted_mean(tmp_path):
+    path = tmp_path / 'sites.csv'
+    times, cfs = write_sites(path)
+    stats = renewables_data.site_statistics(str(path), chunk_rows=64)
+    assert(np.allclose(stats.mean, np.nanmean(cfs, axis=0)))
+    assert(np.allclose(stats.std, np.nanstd(cfs, axis=0)))
+    assert(np.allclose(stats.max, np.nanmax(cfs, axis=0)))
+    assert(stats.top(0.25) == ['cell9', 'cell10', 'cell11'])
+
+    weights = {'cell9': 1., 'cell10': 2., 'cell11': 3.}
+    wind = renewables_data.RenewablesData('wind', sites_path=str(path), top_fraction=0.25,
+            weights=weights, chunk_rows=64)
+    top = cfs[:, 9:]
+    w = np.isfinite(top) * np.array([1., 2., 3.])
+    expected = np.nansum(top * w, axis=1) / w.sum(axis=1)
+    assert(np.allclose(wind.store['value'], expected))
+    assert(np.array_equal(wind.store['stamp'].astype('datetime64[h]'), times))
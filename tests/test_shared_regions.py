@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pytest
+from collections import OrderedDict
+pytest.importorskip('multiprocessing.shared_memory')
+import shared_regions
+
+
+def region_sum(region, columns):
+    return float(np.nansum(columns['value'])), columns['value'].flags.writeable
+
+
+def test_workers_share_one_copy():
+    regions = OrderedDict((r, OrderedDict([('stamp', np.arange(100, dtype=np.int64) + i),
+            ('value', np.random.RandomState(i).rand(100)), ('flags', np.zeros(100, dtype=np.uint8))]))
+            for i, r in enumerate(['CISO', 'ERCO', 'PJM']))
+    store = shared_regions.SharedRegionStore.create(regions)
+    assert(store.regions == ['CISO', 'ERCO', 'PJM'])
+    assert(np.array_equal(store['ERCO']['value'], regions['ERCO']['value']))
+    assert(store['PJM']['stamp'][0] == 2)
+
+    results = shared_regions.map_regions(region_sum, store.name, store.regions, n_workers=2)
+    assert(results == [(float(np.nansum(regions[r]['value'])), False) for r in store.regions])
+    assert(store.references == 1)
+
+    worker = shared_regions.SharedRegionStore.attach(store.name)
+    assert(store.references == 2)
+    store.close()
+    assert(np.array_equal(worker['CISO']['value'], regions['CISO']['value']))
+    name = worker.name
+    worker.close()
+    with pytest.raises(FileNotFoundError):
+        shared_regions.SharedRegionStore.attach(name)
+
+
+def test_close_with_view_held():
+    regions = OrderedDict([('CISO', OrderedDict([('value', np.arange(10.))]))])
+    store = shared_regions.SharedRegionStore.create(regions)
+    value = store['CISO']['value']
+    with pytest.raises(BufferError):
+        store.close()
+    assert(store.references == 1)
+    assert(value[3] == 3. and store['CISO']['value'][9] == 9.)
+
+    name = store.name
+    del value
+    store.close()
+    with pytest.raises(FileNotFoundError):
+        shared_regions.SharedRegionStore.attach(name)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import spectral_tools
+
+
+def test_fft_autocorrelation_matches_direct():
+    x = np.random.RandomState(0).normal(size=400)
+    xd = x - x.mean()
+    direct = np.correlate(xd, xd, 'full')[len(x)-1:]
+    direct = direct / direct[0]
+    lags, acfs = spectral_tools.fft_autocorrelation(x, 30)
+    assert(len(lags) == 31)
+    assert(np.allclose(acfs[0], direct[:31]))
+
+
+def test_fft_autocorrelation_masks_missing():
+    x = np.tile([1., -1.], 200)
+    x[::10] = np.nan
+    x[1::10] = np.nan
+    lags, acfs = spectral_tools.fft_autocorrelation({'alt': x}, 4, adjusted=True)
+    assert(np.allclose(acfs['alt'], [1., -1., 1., -1., 1.]))
+
+
+def test_power_spectrum_daily_peak():
+    x = np.sin(2 * np.pi * np.arange(24 * 100) / 24.)
+    freqs, power = spectral_tools.power_spectrum(x)
+    assert(np.isclose(freqs[np.argmax(power[0])], 1 / 24.))
+
+
+def test_cwt_matches_direct_convolution():
+    x = np.random.RandomState(1).normal(size=300)
+    widths = [1, 3, 8, 40]
+    coefs = spectral_tools.cwt({'x': x}, widths, n_workers=2)['x']
+    for i, w in enumerate(widths):
+        wavelet = spectral_tools.ricker(min(10 * w, len(x)), w)[::-1]
+        assert(np.allclose(coefs[i], np.convolve(x, wavelet, mode='same')))
+
+
+def test_wavelet_power_daily_peak_and_cache(tmp_path):
+    x = np.sin(2 * np.pi * np.arange(24 * 60) / 24.)
+    x[100:110] = np.nan
+    widths = np.arange(1, 16)
+    w, power = spectral_tools.wavelet_power({'solar': x, 'flat': np.ones(len(x))}, widths,
+            trim=240, cache_dir=str(tmp_path))
+    assert(3 <= w[np.argmax(power['solar'])] <= 6)
+    assert(power['flat'].max() < 1e-6 * power['solar'].max())
+    w, cached = spectral_tools.wavelet_power({'solar': x}, widths, trim=240, cache_dir=str(tmp_path))
+    assert(np.array_equal(cached['solar'], power['solar']))
@@ -1,39 +1,50 @@
 import numpy as np
 import helpers
+import hourly_store
+import calendar_cube
+import normalizations
 from collections import OrderedDict
 
 # Calculate the annaul averages for each year in our data.
-# Some means will not include a full year
-def calculate_annaul_averages(hourly_data, save=False, energy=''):
+# Some means will not include a full year.
+# Returns OrderedDict year -> [n_hours, sum, mean], NaN values
+# are skipped in the sum and mean.  save=True stores them in the
+# normalizations registry.
+def calculate_annaul_averages(hourly_data, save=False, energy='', region=''):
+    calendar, values = calendar_cube.series_arrays(hourly_data)
+    cube = calendar_cube.aggregate(calendar, values, ('year',))
+
     years = OrderedDict()
-    # Get list of all years
-    # First value in list tracks number of hours for that year
-    # in the data
-    for hour in hourly_data:
-        if not hour.datetime.year in years.keys():
-            years[hour.datetime.year] = [1, hour.value]
-        else:
-            years[hour.datetime.year][0] += 1
-            years[hour.datetime.year][1] += hour.value
-
-
-    # Add mean values
-    for year, vals in years.items():
-        vals.append(vals[1]/vals[0])
-        if vals[0] < 8760:
+    for i, year in enumerate(cube.groups['year']):
+        years[int(year)] = [int(cube.n_hours[i]), float(cube.sum[i]), float(cube.mean[i])]
+        if cube.n_hours[i] < 8760:
             print("WARNING: you are using calculate_annaul_averages with \
                     partial data for year {}".format(year))
 
     if save:
-        np.save('normalization_annual_{}'.format(energy), years)
+        normalizations.registry().save('annual', energy, normalizations.annual_array(years), region)
     
     return years
 
+
+# Replace the values of hourly_data, in place in the store
+# for HourlyRecords and through set_value() otherwise
+def set_series_values(hourly_data, new_values):
+    if isinstance(hourly_data, hourly_store.HourlyRecords):
+        start = hourly_data.start
+        hourly_data.store['value'][start:start+len(hourly_data)] = new_values
+        return
+    for hour, val in zip(hourly_data, new_values):
+        hour.set_value(val)
+
+
 # Adjust demand based on annual averages derived from
 # calculate_annaul_averages()
 def normalize_to_annual_averages(annual_info, hourly_data):
-    for hour in hourly_data:
-        hour.set_value(hour.value / annual_info[hour.datetime.year][2])
+    calendar, values = calendar_cube.series_arrays(hourly_data)
+    years = np.unique(calendar.year)
+    means = np.array([annual_info[int(year)][2] for year in years], dtype=np.float64)
+    set_series_values(hourly_data, values / means[np.searchsorted(years, calendar.year)])
 
 
 # Scale demand based on monthly averages derived from
@@ -51,14 +62,24 @@ def normalize_to_monthly_averages(monthly_vals, hourly_data):
             monthly_means[helpers.month_str_to_month_num(month)][1] += val
 
     for month, vals in monthly_means.items():
-        vals.append(vals[1]/vals[0])
+        vals.append(vals[1]/vals[0] if vals[0] > 0 else np.nan)
         print(month, vals)
 
     # Normalize based on monthly mean across all years
-    for hour in hourly_data:
-        hour.set_value(hour.value / monthly_means[hour.datetime.month][2])
+    calendar, values = calendar_cube.series_arrays(hourly_data)
+    lookup = np.array([np.nan,] + [monthly_means[month][2] for month in range(1, 13)])
+    set_series_values(hourly_data, values / lookup[calendar.month])
+
 
 
+# Row and column in the 52 x 24 tables for ISO weeks and hours of
+# the day.  Week 53 is folded into week 52 and the column is
+# hour - 1, so hour 0 lands in the last column.
+def _week_hour_cells(weeks, hours):
+    week_to_use = np.minimum(weeks, 52) - 1
+    hour_to_use = (hours - 1) % 24
+    return week_to_use, hour_to_use
+
 
 # Scale demand based on 24hr x 52week averages derived from
 # get_24hr_x_52week_info()
@@ -67,79 +88,43 @@ def normalize_to_24hr_x_52week_averages(normalization_info, hourly_data, energy)
     # If solar add 1.0 to all CFs
     offset = 1.0 if 'solar' in energy else 0.0
 
-    for hour in hourly_data:
-        week_to_use = hour.datetime.isocalendar()[1] - 1
-        if week_to_use > 51:
-            week_to_use = 51
-        norm_value = normalization_info[week_to_use][hour.datetime.hour - 1]
-        # Prevent division by zero
-        if norm_value == 0.0:
-            norm_value = 1e-5
-        hour.set_value( (hour.value + offset) / norm_value)
+    calendar, values = calendar_cube.series_arrays(hourly_data)
+    weeks, hours = _week_hour_cells(calendar.week, calendar.hour)
+    norm_values = np.asarray(normalization_info)[weeks, hours]
+    # Prevent division by zero
+    norm_values = np.where(norm_values == 0.0, 1e-5, norm_values)
+    set_series_values(hourly_data, (values + offset) / norm_values)
+
+
 
+# Nested OrderedDict year -> name -> mean of a grouping by
+# ('year', key), names[i] is the name of key value i + first_key.
+# Groups with no values are NaN.
+def _yearly_means_by(hourly_data, key, names, first_key, mask=None):
+    calendar, values = calendar_cube.series_arrays(hourly_data)
+    cube = calendar_cube.aggregate(calendar, values, ('year', key), mask=mask)
+    means = cube.to_dict('mean')
+
+    data_dict = OrderedDict()
+    for year in np.unique(calendar.year):
+        data_dict[int(year)] = OrderedDict()
+        for i, name in enumerate(names):
+            data_dict[int(year)][name] = float(means.get((int(year), i + first_key), np.nan))
+    return data_dict
 
 
 # Calculate the seasonal averages for the whole data range
 def calculate_seasonal_averages(hourly_data):
-    seasons = OrderedDict()
-    seasons['Winter'] = [1, 2, 3]
-    seasons['Spring'] = [4, 5, 6]
-    seasons['Summer'] = [7, 8, 9]
-    seasons['Fall'] = [10, 11, 12]
-
-    data_dict = helpers.get_years_in_data(hourly_data)
-    for year in data_dict.keys():
-        data_dict[year] = OrderedDict()
-        for season in seasons.keys():
-            data_dict[year][season] = []
-
-    # Loop over all hours and add their demand to the appropriate year and season
-    for hour in hourly_data:
-        for season, months in seasons.items():
-            if hour.month in months:
-                data_dict[hour.datetime.year][season].append(hour.value)
-                break
-    
-    # Replace lists with mean value before returning
-    for year, seasons in data_dict.items():
-        for season in seasons.keys():
-            data_dict[year][season] = float(np.mean(data_dict[year][season]))
-    return data_dict
+    return _yearly_means_by(hourly_data, 'season', calendar_cube.SEASONS, 0)
+
 
 # Calculate the monthly averages for the whole data range
 def calculate_monthly_averages(hourly_data, skip_zeros=False):
-    months = OrderedDict()
-    months[1] = 'January'
-    months[2] = 'February'
-    months[3] = 'March'
-    months[4] = 'April'
-    months[5] = 'May'
-    months[6] = 'June'
-    months[7] = 'July'
-    months[8] = 'August'
-    months[9] = 'September'
-    months[10] = 'October'
-    months[11] = 'November'
-    months[12] = 'December'
-
-    data_dict = helpers.get_years_in_data(hourly_data)
-    for year in data_dict.keys():
-        data_dict[year] = OrderedDict()
-        for month, name in months.items():
-            data_dict[year][name] = []
-
-    # Loop over all hours and add their demand to the appropriate year and season
-    for hour in hourly_data:
-        if skip_zeros and hour.value == 0.0:
-            continue
-        else:
-            data_dict[hour.datetime.year][months[hour.datetime.month]].append(hour.value)
-    
-    # Replace lists with mean value before returning
-    for year, months_names in data_dict.items():
-        for month in months_names.keys():
-            data_dict[year][month] = float(np.mean(data_dict[year][month]))
-    return data_dict
+    mask = None
+    if skip_zeros:
+        _, values = calendar_cube.series_arrays(hourly_data)
+        mask = values != 0.0
+    return _yearly_means_by(hourly_data, 'month', calendar_cube.MONTHS, 1, mask)
 
 
 # Preps the variance plot info based on output from
@@ -165,35 +150,28 @@ def info_for_monthly_variance(monthly_vals):
 
 
 # Create average 24 hour demand curves for each week
-# averaged over multiple years
-def get_24hr_x_52week_info(hourly_data, energy, save=False):
+# averaged over multiple years.  save=True stores the table in
+# the normalizations registry.
+def get_24hr_x_52week_info(hourly_data, energy, save=False, region=''):
 
     # If solar add 1.0 to all CFs
     offset = 1.0 if 'solar' in energy else 0.0
 
-    # Need both for averaging
+    # Group by ISO week and hour of day, then fold the
+    # cube into the 52 x 24 table
+    calendar, values = calendar_cube.series_arrays(hourly_data)
+    cube = calendar_cube.aggregate(calendar, values + offset, ('week', 'hour'))
+    weeks, hours = _week_hour_cells(cube.groups['week'], cube.groups['hour'])
     hourly_demand_values = np.zeros((52,24))
     hourly_demand_entries = np.zeros((52,24))
-
-    # Fill and get number of entries
-    for hour in hourly_data:
-        try:
-            hourly_demand_values[hour.datetime.isocalendar()[1] - 1][hour.datetime.hour - 1] += hour.value + offset
-            hourly_demand_entries[hour.datetime.isocalendar()[1] - 1][hour.datetime.hour - 1] += 1
-        except IndexError:
-            if hour.datetime.isocalendar()[1] == 53:
-                hourly_demand_values[51][hour.datetime.hour - 1] += hour.value + offset
-                hourly_demand_entries[51][hour.datetime.hour - 1] += 1
+    np.add.at(hourly_demand_values, (weeks, hours), cube.sum)
+    np.add.at(hourly_demand_entries, (weeks, hours), cube.count)
 
     # Average
-    for week in range(52):
-        for hour in range(24):
-            hourly_demand_values[week][hour] = hourly_demand_values[week][hour] / hourly_demand_entries[week][hour]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hourly_demand_values = hourly_demand_values / hourly_demand_entries
 
     if save:
-        np.save('normalization_24hr_x_52week_{}'.format(energy), hourly_demand_values)
+        normalizations.registry().save('24hr_x_52week', energy, hourly_demand_values, region)
 
     return hourly_demand_values
-
-
-
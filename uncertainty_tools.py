@@ -8,6 +8,9 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import copy
+import calendar_cube
+import mem_format
+import normalizations
 
 
 # returns pandas df of renewable info, start_year defaults to prior to our records
@@ -26,56 +29,23 @@ def return_renewable_df(file_path, is_wind, is_solar, start_year=1900, end_year=
                        dtype={'{} capacity'.format(energy):np.float64},
                       parse_dates=True, na_values=['MISSING', 'EMPTY'])
     
-    # FIXME only have wind normalizations now, so load them for solar as well
-    tmp = 'wind'
-    annual = np.load('normalization_annual_{}.npy'.format(tmp))
-    hour_and_weeks = np.load('normalization_24hr_x_52week_{}.npy'.format(tmp))
-    
+    # Normalizations of this energy, computed once with
+    # normalizations.registry().compute()
+    norms = normalizations.registry()
+
 
-    # skip this loop if all data is to be included
+    # skip this if all data is to be included
     if not (start_year == 1900 and end_year == 2020):
-        to_remove = []
-        for index, row in dta.iterrows():
-            uct_time = row['time']
-            uct_time = sem_time(uct_time)
-        
-            date = datetime.strptime(uct_time, '%Y%m%dT%HZ')
-            # Filter unwanted entries by year
-            if date.year < start_year: to_remove.append(index)
-            if date.year > end_year: to_remove.append(index)
-        dta = dta.drop(to_remove)
+        dta = select_years(dta, start_year, end_year)
 
 
-    dates = []
-    years = []
-    weeks = []
-    hours = []
-    
-    annual_norm = []
-    weekly_norm = []
-    full_norm = []
-    normalized = []
-    
-    for index, row in dta.iterrows():
-    
-        uct_time = row['time']
-        uct_time = sem_time(uct_time)
-        
-        date = datetime.strptime(uct_time, '%Y%m%dT%HZ')
-
-        years.append(date.year)
-        weeks.append(date.isocalendar()[1] - 1)
-        if weeks[-1] == 52:
-            weeks[-1] = 51
-        hours.append(date.hour)
-        dates.append(date)
-        
-    
-        #Use filled time info arrays to access the normalization values needed
-        annual_norm.append(annual.item().get(years[-1])[2])
-        weekly_norm.append(hour_and_weeks[weeks[-1]][hours[-1]])
-        full_norm.append(annual_norm[-1] * weekly_norm[-1])
-        normalized.append( (row['{} capacity'.format(energy)] - full_norm[-1]) / full_norm[-1])
+    dates, years, weeks, hours = sem_time_columns(dta['time'])
+
+    #Use time info arrays to access the normalization values needed
+    annual_norm = norms.annual_means(energy, years)
+    weekly_norm = norms.table(energy)[weeks, hours]
+    full_norm = annual_norm * weekly_norm
+    normalized = (dta['{} capacity'.format(energy)].values - full_norm) / full_norm
         
     dta = dta.assign(date=dates)
     dta = dta.assign(year=years)
@@ -102,37 +72,12 @@ def return_demand_df(file_path, start_year=1900, end_year=2020):
                       parse_dates=True, na_values=['MISSING', 'EMPTY'])
     
 
-    # skip this loop if all data is to be included
+    # skip this if all data is to be included
     if not (start_year == 1900 and end_year == 2020):
-        to_remove = []
-        for index, row in dta.iterrows():
-            uct_time = row['time']
-            uct_time = sem_time(uct_time)
-        
-            date = datetime.strptime(uct_time, '%Y%m%dT%HZ')
-            # Filter unwanted entries by year
-            if date.year < start_year: to_remove.append(index)
-            if date.year > end_year: to_remove.append(index)
-        dta = dta.drop(to_remove)
+        dta = select_years(dta, start_year, end_year)
     
 
-    dates = []
-    years = []
-    weeks = []
-    hours = []
-    
-    for index, row in dta.iterrows():
-    
-        uct_time = row['time']
-        uct_time = sem_time(uct_time)
-
-        date = datetime.strptime(uct_time, '%Y%m%dT%HZ')
-        years.append(date.year)
-        weeks.append(date.isocalendar()[1] - 1)
-        if weeks[-1] == 52:
-            weeks[-1] = 51
-        hours.append(date.hour)
-        dates.append(date)
+    dates, years, weeks, hours = sem_time_columns(dta['time'])
         
 
     # Once all data/time stuff is handled
@@ -157,34 +102,39 @@ def return_demand_df(file_path, start_year=1900, end_year=2020):
 
 
 
+# Rows of df with a 'time' column (UCT strings) in years
+# start_year through end_year.  sem_time only shifts the hour,
+# so the year is the first 4 characters.  Time ordered files are
+# cut with a binary search, anything else with a mask.
+def select_years(df, start_year, end_year):
+    years = df['time'].str.slice(0, 4).astype(np.int64).values
+    if np.all(years[1:] >= years[:-1]):
+        lo = np.searchsorted(years, start_year, 'left')
+        hi = np.searchsorted(years, end_year, 'right')
+        return df.iloc[lo:hi]
+    return df[(years >= start_year) & (years <= end_year)]
+
+
+
+
 # This takes an erroneous UCT time with hours 1 - 24
-# and shiftes them to 0 - 23
+# and shiftes them to 0 - 23, T00Z is left as it is
 def sem_time(uct_time):
-    uct_time = uct_time.replace('T01Z', 'T00Z')
-    uct_time = uct_time.replace('T02Z', 'T01Z')
-    uct_time = uct_time.replace('T03Z', 'T02Z')
-    uct_time = uct_time.replace('T04Z', 'T03Z')
-    uct_time = uct_time.replace('T05Z', 'T04Z')
-    uct_time = uct_time.replace('T06Z', 'T05Z')
-    uct_time = uct_time.replace('T07Z', 'T06Z')
-    uct_time = uct_time.replace('T08Z', 'T07Z')
-    uct_time = uct_time.replace('T09Z', 'T08Z')
-    uct_time = uct_time.replace('T10Z', 'T09Z')
-    uct_time = uct_time.replace('T11Z', 'T10Z')
-    uct_time = uct_time.replace('T12Z', 'T11Z')
-    uct_time = uct_time.replace('T13Z', 'T12Z')
-    uct_time = uct_time.replace('T14Z', 'T13Z')
-    uct_time = uct_time.replace('T15Z', 'T14Z')
-    uct_time = uct_time.replace('T16Z', 'T15Z')
-    uct_time = uct_time.replace('T17Z', 'T16Z')
-    uct_time = uct_time.replace('T18Z', 'T17Z')
-    uct_time = uct_time.replace('T19Z', 'T18Z')
-    uct_time = uct_time.replace('T20Z', 'T19Z')
-    uct_time = uct_time.replace('T21Z', 'T20Z')
-    uct_time = uct_time.replace('T22Z', 'T21Z')
-    uct_time = uct_time.replace('T23Z', 'T22Z')
-    uct_time = uct_time.replace('T24Z', 'T23Z')
-    return uct_time
+    hour = int(uct_time[9:11])
+    if hour == 0:
+        return uct_time
+    return '{}T{:02d}Z'.format(uct_time[:8], hour - 1)
+
+
+
+# Time columns for an array of erroneous UCT times with hours 1 - 24:
+# dates (datetime64), years, weeks (ISO week - 1, capped at 51) and
+# hours (0 - 23), all computed on the whole array
+def sem_time_columns(uct_times):
+    dates = mem_format.sem_strings_to_datetimes(np.asarray(uct_times, dtype=str))
+    calendar = calendar_cube.CalendarIndex(dates.astype(np.int64))
+    weeks = np.minimum(calendar.week - 1, 51)
+    return dates.astype('datetime64[ns]'), calendar.year, weeks, calendar.hour
 
 
 